@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Auto-Save
+Non-blocking session saves triggered by the Claude Code Stop hook
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger
+from utils import atomic_write_text, file_lock
+
+log = setup_logger("claudememv2.autosave")
+
+# A pending request whose worker has not claimed it for this long is
+# assumed to be orphaned (worker killed, machine rebooted) and respawned
+STALE_REQUEST_SECONDS = 600
+
+# The request lock only guards reading and replacing the pending request
+REQUEST_LOCK_TIMEOUT = 5
+
+
+def _safe_id(session_id: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+
+
+class AutoSaver:
+    """Queue session saves from the Stop hook and run them in a detached worker.
+
+    The hook only records a pending request in state/autosave/ and, unless
+    a worker is already responsible for the session, starts one; it returns
+    in milliseconds. The worker waits until no Stop event arrived for
+    `debounceSeconds`, claims the request and saves the session. A per-session
+    lock keeps a single worker saving at a time; the worker keeps saving
+    while new requests arrive, and a request that finds no pending one
+    starts a worker that waits for the lock.
+
+    Config (hooks.autoSave): enabled (default true), minMessages (default 5),
+    debounceSeconds (default 30), silent (default true).
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.hook_config = config.get("hooks", {}).get("autoSave", {})
+        data_dir = Path(config.get("memory", {}).get("dataDir", "~/.claude/Claudememv2-data")).expanduser()
+        self.state_dir = data_dir / "state" / "autosave"
+        self.debounce = max(0.0, float(self.hook_config.get("debounceSeconds", 30)))
+        self.min_messages = int(self.hook_config.get("minMessages", 5))
+        self.lock_timeout = STALE_REQUEST_SECONDS
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hook_config.get("enabled", True))
+
+    def _paths(self, session_id: str) -> tuple:
+        """Pending request, claimed request, session lock and request lock file of a session."""
+        base = self.state_dir / _safe_id(session_id)
+        return (base.with_suffix(".pending.json"), base.with_suffix(".claimed.json"), base.with_suffix(".lock"),
+                base.with_suffix(".request.lock"))
+
+    @staticmethod
+    def _load(path: Path) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def request(self, hook_input: dict) -> Optional[str]:
+        """Record a save request for the session of a Stop hook event.
+
+        Args:
+            hook_input: Stop hook JSON (session_id, transcript_path, cwd)
+
+        Returns:
+            The session ID the request was recorded for, or None if there
+            was nothing to save
+        """
+        session_id = hook_input.get("session_id")
+        transcript_path = hook_input.get("transcript_path")
+        cwd = hook_input.get("cwd") or os.getcwd()
+
+        if not transcript_path:
+            # Older Claude Code versions: fall back to the session lookup
+            from session_parser import SessionParser
+            found = SessionParser(self.config).find_current_session(cwd)
+            if found is None:
+                return None
+            transcript_path = str(found)
+        if not session_id:
+            session_id = Path(transcript_path).stem
+
+        pending_path, _, _, request_lock_path = self._paths(session_id)
+        request = {
+            "session_id": session_id,
+            "transcript_path": transcript_path,
+            "cwd": cwd,
+        }
+        try:
+            # Under the request lock the worker can neither claim the pending
+            # request nor find none left between our read and our write
+            with file_lock(request_lock_path, timeout=REQUEST_LOCK_TIMEOUT):
+                spawn = self._queue(pending_path, request)
+        except TimeoutError:
+            log.info("Auto-save request lock for %s is busy, starting another worker", session_id)
+            self._queue(pending_path, request)
+            spawn = True
+
+        if spawn:
+            self._spawn_worker(session_id)
+        return session_id
+
+    def _queue(self, pending_path: Path, request: dict) -> bool:
+        """Write the pending request. Returns True if no worker is waiting for it."""
+        now = time.time()
+        previous = self._load(pending_path)
+        # A pending request means a worker is already waiting for this session
+        spawn = previous is None or now - previous.get("spawned_at", 0) > STALE_REQUEST_SECONDS
+        request = dict(request, requested_at=now,
+                       spawned_at=now if spawn else previous.get("spawned_at", now))
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(pending_path, json.dumps(request, ensure_ascii=False))
+        return spawn
+
+    def _spawn_worker(self, session_id: str):
+        """Start `memory_core.py auto-save --worker` fully detached from the hook."""
+        command = [sys.executable, str(Path(__file__).with_name("memory_core.py")), "auto-save", "--worker", session_id]
+        kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL,
+                  "close_fds": True}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen(command, **kwargs)
+        log.debug("Started auto-save worker for session %s", session_id)
+
+    def run_worker(self, session_id: str) -> Optional[dict]:
+        """Debounce, claim and save the pending request of a session.
+
+        Requests queued while a save runs are saved by the same worker
+        before it releases the lock. The worker claims a request and decides
+        that none is left under the request lock, so a Stop event either
+        sees no pending request and starts a worker, or its request is
+        saved by this one.
+
+        Returns:
+            Result of the last save_session, or None if nothing was saved
+        """
+        pending_path, claimed_path, lock_path, request_lock_path = self._paths(session_id)
+        result = None
+        try:
+            with file_lock(lock_path, timeout=self.lock_timeout):
+                # A Stop event that found the pending request queues a new one
+                # without starting a worker, so keep saving until none is left
+                while True:
+                    # Wait until Stop events for the session have settled, then
+                    # claim the request; any Stop event from here on queues a new one
+                    with file_lock(request_lock_path, timeout=self.lock_timeout):
+                        request = self._load(pending_path)
+                        if request is None:
+                            return result
+                        wait = request["requested_at"] + self.debounce - time.time()
+                        if wait <= 0:
+                            os.replace(pending_path, claimed_path)
+                    if wait > 0:
+                        time.sleep(min(wait, self.debounce))
+                        continue
+                    request = self._load(claimed_path) or request
+                    try:
+                        result = self._save(request)
+                    finally:
+                        try:
+                            os.unlink(claimed_path)
+                        except FileNotFoundError:
+                            pass
+        except TimeoutError:
+            log.info("Auto-save worker for %s gave up waiting for the session lock", session_id)
+            return result
+
+    def _save(self, request: dict) -> Optional[dict]:
+        """Save and index the session of a claimed request."""
+        from session_parser import SessionParser
+        from search_engine import SearchEngine
+
+        session_path = Path(request["transcript_path"])
+        if not session_path.exists():
+            log.info("Auto-save skipped, session file is gone: %s", session_path)
+            return None
+
+        parser = SessionParser(self.config)
+        messages = parser.parse_session_file(session_path, resume=True)
+        if len(messages) < self.min_messages:
+            log.info("Auto-save skipped, %d messages < minMessages %d: %s",
+                     len(messages), self.min_messages, session_path)
+            return None
+
+        result = parser.save_session(session_path=session_path, working_dir=request.get("cwd"))
+        log.info("Auto-saved session %s: %s (%s)", request["session_id"], result["file_path"], result["status"])
+
+        if result["status"] != "unchanged":
+            paths = [result["file_path"]]
+            if result.get("full_file_path"):
+                paths.append(result["full_file_path"])
+            SearchEngine(self.config).index_paths(paths, removed=result.get("removed_paths"))
+        return result
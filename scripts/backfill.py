@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Backfill
+Bulk import of historical Claude Code sessions into memory
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger, write_directly
+from session_parser import SESSION_LOCK_TIMEOUT, SessionParser
+from storage import full_file_name, resolve_codec
+from utils import atomic_write_text, file_lock
+
+log = setup_logger("claudememv2.backfill")
+
+
+class RateLimiter:
+    """Space out calls so that at most `rate` start per second across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO timestamp from a session entry into local time."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone().replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _prepare_session(config: dict, session_path: str) -> Optional[dict]:
+    """Parse and render one session. Runs in a worker process.
+
+    Returns:
+        Dict with the parsed summary messages, the staged full transcript and
+        session metadata, or None if the session has no valid content
+    """
+    parser = SessionParser(config)
+    info = parser.read_session_info(session_path)
+
+    messages = parser.parse_session_file(session_path)
+    if not messages:
+        return None
+
+    working_dir = info["cwd"] or str(Path(session_path).parent.name)
+    project = Path(info["cwd"]).name if info["cwd"] else Path(session_path).parent.name
+    stat = os.stat(session_path)
+    created = _parse_timestamp(info["started"]) or datetime.fromtimestamp(stat.st_mtime)
+
+    # Stream the full transcript to a staging file; it is moved into place
+    # once the slug (and therefore the final filename) is known
+    full_staging = None
+    codec = None
+    if parser.memory_config.get("saveFull", True):
+        staging_dir = parser.data_dir / "state" / "backfill-staging"
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        codec = resolve_codec(parser.memory_config.get("fullCompression", "none"))
+        staging_name = full_file_name(f"{Path(session_path).parent.name}-{Path(session_path).stem}.md", codec)
+        staging_path = staging_dir / staging_name
+        if parser.write_full_transcript(Path(session_path), staging_path, project, working_dir, created,
+                                        session_id=Path(session_path).stem):
+            full_staging = str(staging_path)
+
+    return {
+        "session_path": session_path,
+        "project": project,
+        "working_dir": working_dir,
+        "created": created,
+        "messages": messages,
+        "content_hash": parser.content_hash(messages),
+        "session_size": stat.st_size,
+        "full_staging": full_staging,
+        "full_codec": codec,
+    }
+
+
+class Backfiller:
+    """Import every historical session under ~/.claude/projects into memory.
+
+    Parsing and rendering run in a process pool; slug and summary API calls
+    run in a small thread pool behind a shared rate limiter. Progress is
+    recorded in state/backfill.json so an interrupted run picks up where it
+    stopped.
+    """
+
+    def __init__(self, config: dict, workers: Optional[int] = None,
+                 api_concurrency: int = 4, api_rate: float = 2.0):
+        self.config = config
+        self.parser = SessionParser(config)
+        self.workers = workers or max(1, min(8, (os.cpu_count() or 2) - 1))
+        self.api_concurrency = max(1, api_concurrency)
+        self.rate_limiter = RateLimiter(api_rate)
+        self.state_path = self.parser.data_dir / "state" / "backfill.json"
+        self._write_lock = threading.Lock()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"done": {}}
+
+    def _save_state(self, state: dict):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.state_path, json.dumps(state, ensure_ascii=False))
+
+    def find_sessions(self, project_filter: Optional[str] = None) -> list:
+        """List session files, optionally limited to project directories matching a filter.
+
+        Args:
+            project_filter: Case-insensitive substring of the Claude Code project
+                directory name (the encoded working directory path)
+        """
+        projects_dir = self.parser.get_claude_projects_dir()
+        if not projects_dir.exists():
+            return []
+
+        sessions = []
+        for project_dir in sorted(projects_dir.iterdir()):
+            if not project_dir.is_dir():
+                continue
+            if project_filter and project_filter.lower() not in project_dir.name.lower():
+                continue
+            sessions.extend(sorted(project_dir.glob("*.jsonl")))
+
+        return sessions
+
+    def run(self, project_filter: Optional[str] = None, limit: Optional[int] = None,
+            dry_run: bool = False) -> dict:
+        """Backfill sessions and index the result in one pass.
+
+        Returns:
+            Dict with 'found', 'skipped', 'saved', 'empty', 'failed' counts
+            and, unless dry_run, the 'index' result
+        """
+        state = self._load_state()
+        done = state.setdefault("done", {})
+
+        pending = []
+        skipped = 0
+        for session_path in self.find_sessions(project_filter):
+            stat = session_path.stat()
+            record = done.get(str(session_path))
+            if record and record.get("size") == stat.st_size:
+                skipped += 1
+                continue
+            pending.append(str(session_path))
+
+        stats = {"found": len(pending) + skipped, "skipped": skipped, "saved": 0, "empty": 0, "failed": 0}
+        if limit:
+            pending = pending[:limit]
+        if dry_run or not pending:
+            return stats
+
+        log.info("Backfilling %d sessions (%d workers, %d API threads)", len(pending), self.workers, self.api_concurrency)
+
+        # Workers log directly: under the spawn start method they would otherwise
+        # start their own listener thread and lose its queue on shutdown
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=write_directly) as process_pool, \
+                ThreadPoolExecutor(max_workers=self.api_concurrency) as api_pool:
+            parse_futures = {process_pool.submit(_prepare_session, self.config, path): path for path in pending}
+            save_futures = {}
+
+            for future in as_completed(parse_futures):
+                path = parse_futures[future]
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    log.warning("Failed to parse %s: %s", path, e)
+                    stats["failed"] += 1
+                    continue
+
+                if prepared is None:
+                    stats["empty"] += 1
+                    done[path] = {"size": os.stat(path).st_size, "file": None}
+                    continue
+
+                save_futures[api_pool.submit(self._save_prepared, prepared)] = path
+
+            for count, future in enumerate(as_completed(save_futures), 1):
+                path = save_futures[future]
+                try:
+                    file_path = future.result()
+                    done[path] = {"size": os.stat(path).st_size, "file": file_path}
+                    stats["saved"] += 1
+                except Exception as e:
+                    log.warning("Failed to save %s: %s", path, e)
+                    stats["failed"] += 1
+
+                # Checkpoint progress periodically so an interrupted run can resume
+                if count % 20 == 0:
+                    self._save_state(state)
+
+        self._save_state(state)
+
+        # One bulk index pass at the end instead of one per session
+        from search_engine import SearchEngine
+        stats["index"] = SearchEngine(self.config).index()
+
+        return stats
+
+    def _save_prepared(self, prepared: dict) -> str:
+        """Generate slug and summary for a parsed session and write its memory files.
+
+        Sessions that were saved before are updated in place; unchanged ones
+        are left alone without any API calls.
+        """
+        session_id = Path(prepared["session_path"]).stem
+        try:
+            # A session being saved by another process right now is waited for
+            with file_lock(self.parser.sessions.lock_path(session_id), timeout=SESSION_LOCK_TIMEOUT):
+                file_path = self._save_prepared_locked(prepared, session_id)
+                self.parser.record_tool_activity(prepared["session_path"], prepared["project"], file_path)
+                return file_path
+        finally:
+            # A staged transcript is moved into place on success; drop it otherwise
+            if prepared["full_staging"]:
+                try:
+                    os.unlink(prepared["full_staging"])
+                except FileNotFoundError:
+                    pass
+
+    def _save_prepared_locked(self, prepared: dict, session_id: str) -> str:
+        messages = prepared["messages"]
+        project = prepared["project"]
+
+        record = self.parser.sessions.load(session_id)
+        if record and (record.get("project") != project or not Path(record.get("file_path", "")).exists()):
+            record = None
+
+        if record and record.get("content_hash") == prepared["content_hash"] \
+                and record.get("session_size") == prepared["session_size"]:
+            return record["file_path"]
+
+        if not record:
+            self.rate_limiter.wait()
+            slug = self.parser.generate_slug(messages)
+
+        self.rate_limiter.wait()
+        ai_summary = self.parser.generate_summary(messages, record)
+
+        created = prepared["created"]
+        summary_content = self.parser._generate_markdown(
+            messages, project, ai_summary, prepared["working_dir"], created, session_id
+        )
+
+        project_dir = self.parser.memory_dir / project
+        session_mtime = os.stat(prepared["session_path"]).st_mtime
+        full_file_path = None
+
+        # Picking a free filename and writing must not interleave between threads
+        with self._write_lock:
+            project_dir.mkdir(parents=True, exist_ok=True)
+            if record:
+                file_path = Path(record["file_path"])
+            else:
+                file_path = self.parser.reserve_memory_path(project_dir, created.strftime("%Y-%m-%d"), slug)
+            atomic_write_text(file_path, summary_content)
+            os.utime(file_path, (session_mtime, session_mtime))
+
+            if prepared["full_staging"]:
+                full_dir = project_dir / "full"
+                full_dir.mkdir(parents=True, exist_ok=True)
+                full_file_path = full_dir / full_file_name(file_path.name, prepared["full_codec"])
+                os.replace(prepared["full_staging"], full_file_path)
+                os.utime(full_file_path, (session_mtime, session_mtime))
+
+            # Drop a copy stored under another codec or tier by an earlier save
+            if record:
+                self.parser.remove_stale_full_files(project_dir / "full", file_path.name, full_file_path)
+
+        self.parser.sessions.save(session_id, {
+            "session_path": prepared["session_path"],
+            "project": project,
+            "file_path": str(file_path),
+            "full_file_path": str(full_file_path) if full_file_path else None,
+            "content_hash": prepared["content_hash"],
+            "session_size": prepared["session_size"],
+            "created": created.isoformat(),
+            "updated": datetime.now().isoformat(),
+            **self.parser._summary_state(messages, ai_summary, record),
+        })
+
+        return str(file_path)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Blob Store
+Deduplicated, content-addressed storage for large and binary tool results
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger
+from utils import atomic_open
+
+log = setup_logger("claudememv2.blobs")
+
+# Reference left in transcripts in place of a blob's content
+BLOB_REF_PATTERN = re.compile(r"\[blob sha256:([0-9a-f]{64}) (\d+) bytes ([^\]]+)\]")
+
+# Markers around the preview of a blob in a full transcript
+BLOB_PREVIEW_START = "<!-- blob-preview -->"
+BLOB_PREVIEW_END = "<!-- /blob-preview -->"
+
+
+def format_blob_ref(digest: str, size: int, media_type: str) -> str:
+    """Format the transcript reference for a stored blob."""
+    return f"[blob sha256:{digest} {size} bytes {media_type}]"
+
+
+class BlobStore:
+    """Store blobs once under data_dir/blobs/<xx>/<sha256>."""
+
+    def __init__(self, data_dir: Path):
+        self.blob_dir = Path(data_dir) / "blobs"
+
+    def path_for(self, digest: str) -> Path:
+        """Get the path of a blob by its SHA256 digest."""
+        return self.blob_dir / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        """Store a blob (if not stored already) and return its SHA256 digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if path.exists():
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(path, "wb") as f:
+            f.write(data)
+        log.debug("Stored blob %s (%d bytes)", digest, len(data))
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Read a blob by digest, or None if it is not stored."""
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            return None
+        try:
+            with open(self.path_for(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def stats(self) -> dict:
+        """Count stored blobs and their total size."""
+        count = 0
+        total = 0
+        if self.blob_dir.exists():
+            for root, _, files in os.walk(self.blob_dir):
+                for name in files:
+                    if name.startswith("."):
+                        continue
+                    count += 1
+                    total += os.path.getsize(os.path.join(root, name))
+        return {"blobs": count, "bytes": total}
+
+
+def strip_blob_previews(content: str) -> str:
+    """Blank out blob previews in transcript text, keeping line numbers intact."""
+    if BLOB_PREVIEW_START not in content:
+        return content
+
+    lines = content.split("\n")
+    inside = False
+    for i, line in enumerate(lines):
+        if line == BLOB_PREVIEW_START:
+            inside = True
+            lines[i] = ""
+        elif line == BLOB_PREVIEW_END:
+            inside = False
+            lines[i] = ""
+        elif inside:
+            lines[i] = ""
+    return "\n".join(lines)
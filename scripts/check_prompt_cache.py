@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Prompt Cache Check
+Run summaries and reranked searches against a local stand-in API client and
+check that the rerank prefix marked for prompt caching stays byte-identical
+(development tool)
+
+Usage:
+    python check_prompt_cache.py --turns 40
+
+Saves a synthetic session (a full summary, then an incremental update after
+more turns), saves a second session, and repeats a search over the same
+candidates. Summary requests carry no cache marker: their stable prefix is
+shorter than the API caches. No request leaves the machine; token counts are estimates.
+Exits with status 1 if any check fails.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+
+def _make_config(home: Path) -> dict:
+    return {
+        "model": {"source": "inherit", "customModelId": None, "fallback": "claude-3-haiku-20240307"},
+        "memory": {"dataDir": str(home / ".claude" / "Claudememv2-data"), "maxMessages": 0, "searchScope": "summary"},
+        "summary": {"enabled": True, "format": "structured", "timing": "on_save"},
+    }
+
+
+def _append_turns(session_path: Path, cwd: str, session_id: str, turns: int, tag: str):
+    """Append user/assistant turns to a synthetic session file."""
+    with open(session_path, "a", encoding="utf-8") as f:
+        for i in range(turns):
+            for role, text in (("user", f"question {tag}-{i} about module_{i}.py and its cache settings"),
+                               ("assistant", f"answer {tag}-{i}: changed module_{i}.py, the cache now keeps "
+                                             f"{i * 7} entries, and the tests pass")):
+                f.write(json.dumps({
+                    "type": role, "cwd": cwd, "sessionId": session_id,
+                    "message": {"role": role, "content": text},
+                }) + "\n")
+
+
+def _new_session(home: Path, name: str, turns: int) -> dict:
+    cwd = str(home / "work" / name)
+    session_id = str(uuid.uuid4())
+    session_dir = home / ".claude" / "projects" / cwd.replace(os.sep, "-")
+    session_dir.mkdir(parents=True, exist_ok=True)
+    session = {"id": session_id, "cwd": cwd, "path": session_dir / f"{session_id}.jsonl"}
+    _append_turns(session["path"], cwd, session_id, turns, "init")
+    return session
+
+
+def _write_notes(memory_dir: Path, files: int):
+    """Memory files for the search checks, long enough to fill the rerank window."""
+    project_dir = memory_dir / "notes"
+    project_dir.mkdir(parents=True, exist_ok=True)
+    for n in range(files):
+        lines = [f"# Cache notes {n}", ""]
+        lines += [f"- module_{n}_{i}.py: the cache keeps {i * 13 % 97} entries; eviction runs after "
+                  f"{i * 5} seconds and the hit rate was {i * 3 % 100}% in benchmark {n}-{i}" for i in range(40)]
+        (project_dir / f"2026-01-{n + 1:02d}-cache-notes.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt cache prefix check for Claudememv2")
+    parser.add_argument("--turns", type=int, default=40, help="Turns of the synthetic session (default: 40)")
+    parser.add_argument("--home", help="Home directory to use (default: a new temporary directory)")
+    args = parser.parse_args()
+
+    home = Path(args.home or tempfile.mkdtemp(prefix="claudememv2-cache-"))
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+    sys.path.insert(0, str(Path(__file__).parent))
+
+    import search_engine
+    import session_parser
+    from profiler import profiler
+    from prompt_cache import MIN_CACHEABLE_TOKENS, StandInClient
+
+    def respond(request: dict) -> str:
+        if request.get("system") == search_engine.RERANK_INSTRUCTIONS:
+            chunks = request["messages"][0]["content"][0]["text"].count("\n[") + 1
+            return json.dumps([50] * chunks)
+        if request.get("system"):
+            return "## 会话主题\n缓存设置调整\n\n## 后续待办\n- 无"
+        return "cache-check"
+
+    client = StandInClient(respond)
+    for module in (session_parser, search_engine):
+        module.HAS_ANTHROPIC = True
+        module.get_anthropic_client = lambda: client
+    profiler.enable()
+
+    config = _make_config(home)
+    print(f"[CACHE] Stand-in API client in {home}")
+
+    # Summaries: full, incremental update, and another session
+    first = _new_session(home, "project-a", args.turns)
+    saver = session_parser.SessionParser(config)
+    saver.save_session(session_path=first["path"], working_dir=first["cwd"])
+    _append_turns(first["path"], first["cwd"], first["id"], max(1, args.turns // 4), "more")
+    saver.save_session(session_path=first["path"], working_dir=first["cwd"])
+    second = _new_session(home, "project-b", args.turns)
+    saver.save_session(session_path=second["path"], working_dir=second["cwd"])
+    summary_calls = [call for call in client.calls
+                     if call["request"].get("system") not in (None, search_engine.RERANK_INSTRUCTIONS)]
+
+    # Reranks: the same search twice, a different limit, another query
+    _write_notes(Path(config["memory"]["dataDir"]) / "memory", 20)
+    engine = search_engine.SearchEngine(config)
+    engine.index()
+    start = len(client.calls)
+    for query, limit in (("cache entries", 6), ("cache entries", 6), ("cache entries", 3), ("eviction seconds", 6)):
+        engine.search(query, limit=limit, threshold=0)
+    reranks = client.calls[start:]
+
+    checks = [
+        ("summary calls carry no cache marker", len(summary_calls) == 3 and not any(call["prefixes"] for call in summary_calls)),
+        ("incremental update ran", any("已有摘要" in call["request"]["messages"][0]["content"] for call in summary_calls)),
+        ("summary instructions identical across calls", len({call["request"]["system"] for call in summary_calls}) == 1),
+        ("every search reranked", len(reranks) == 4 and all(len(call["prefixes"]) == 1 for call in reranks)),
+        ("repeated search sends identical prefixes", reranks[0]["prefixes"] == reranks[1]["prefixes"] == reranks[2]["prefixes"]),
+        ("repeated search reads the chunks from cache",
+         reranks[1]["usage"].cache_read_input_tokens == reranks[1]["prefixes"][-1][1] > 0),
+        ("rerank prefix reaches the minimum cacheable length", reranks[0]["prefixes"][0][1] >= MIN_CACHEABLE_TOKENS),
+        ("query follows the cached prefixes", all(
+            "cache_control" not in call["request"]["messages"][0]["content"][-1]
+            and call["request"]["messages"][0]["content"][-1]["text"].startswith("Query: ") for call in reranks)),
+    ]
+
+    chunk_tokens = reranks[0]["prefixes"][-1][1] if reranks and reranks[0]["prefixes"] else 0
+    print(f"  API calls: {len(client.calls)} ({len(summary_calls)} summaries, {len(reranks)} reranks)")
+    print(f"  Rerank prefix: about {chunk_tokens} tokens")
+    report = profiler.format_report()
+    if "  Prompt cache:" in report:
+        for line in report[report.index("  Prompt cache:"):]:
+            print(line)
+    for name, ok in checks:
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Chunk References
+Byte-range chunk storage (search.chunkStorage = "reference"): index chunks
+point into their memory file instead of holding a copy of its text
+"""
+
+import hashlib
+import mmap
+from itertools import groupby
+from pathlib import Path
+
+from logger import setup_logger
+
+log = setup_logger("claudememv2.chunks")
+
+# search.chunkStorage values
+STORAGE_MODES = ("inline", "reference")
+DEFAULT_STORAGE = "inline"
+
+
+def chunk_hash(data: bytes) -> str:
+    """Short content hash telling whether a byte range still holds the indexed text."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def locate_chunks(raw: bytes, chunks: list) -> list:
+    """Find the byte range of each chunk of a file.
+
+    The file must decode to exactly the text that was chunked, so line N
+    starts at the byte offset after N-1 encoded lines.
+
+    Args:
+        raw: File contents
+        chunks: Chunk dicts from SearchEngine._chunk_content
+
+    Returns:
+        (byte_start, byte_end, hash) per chunk
+    """
+    line_starts = [0]
+    for line in raw.split(b"\n"):
+        line_starts.append(line_starts[-1] + len(line) + 1)
+
+    ranges = []
+    for chunk in chunks:
+        start = line_starts[chunk["start_line"] - 1]
+        end = start + len(chunk["content"].encode("utf-8"))
+        ranges.append((start, end, chunk_hash(raw[start:end])))
+    return ranges
+
+
+def read_chunk_texts(memory_dir: Path, refs) -> dict:
+    """Read the text of byte-range chunks through mmap, mapping each file once.
+
+    Args:
+        memory_dir: Root memory directory
+        refs: (key, file_path, byte_start, byte_end, hash) tuples
+
+    Returns:
+        Dict of key -> text. Chunks whose file is gone or whose range no
+        longer matches its hash (the file changed since it was indexed)
+        are left out.
+    """
+    texts = {}
+    for file_path, group in groupby(sorted(refs, key=lambda ref: ref[1]), key=lambda ref: ref[1]):
+        group = list(group)
+        try:
+            with open(Path(memory_dir) / file_path, "rb") as f:
+                size = f.seek(0, 2)
+                # An empty file cannot be mapped; its only chunk is empty
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+                try:
+                    for key, _, start, end, expected in group:
+                        data = view[start:end]
+                        if chunk_hash(data) == expected:
+                            texts[key] = data.decode("utf-8")
+                        else:
+                            log.debug("Stale chunk range %s:%d-%d", file_path, start, end)
+                finally:
+                    if size:
+                        view.close()
+        except OSError as e:
+            log.debug("Could not read chunks of %s: %s", file_path, e)
+    return texts
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Digest
+Per-project recall digests built from the sections of AI summaries
+"""
+
+import re
+from typing import Optional
+
+# Summary sections (see SessionParser._get_summary_instructions) and the digest field they feed
+SECTION_FIELDS = {
+    "会话主题": "topic",
+    "概述": "topic",
+    "关键决策和结论": "decisions",
+    "关键点": "decisions",
+    "完成的任务": "done",
+    "后续待办": "todos",
+}
+
+# Items longer than this are cut in the digest
+MAX_ITEM_CHARS = 200
+
+_EMPTY_ITEMS = {"无", "无。", "暂无", "none", "n/a", "..."}
+_CHECKBOX = re.compile(r"^\[[ xX]\]\s*")
+_CJK = re.compile(r"[⺀-鿿가-힯＀-￯]")
+_NORMALIZE = re.compile(r"[\W_]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: one per CJK character, one per four other characters."""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _clean_item(text: str) -> Optional[str]:
+    text = _CHECKBOX.sub("", text.strip()).strip()
+    if not text or text.lower() in _EMPTY_ITEMS or text.startswith("["):
+        return None
+    if len(text) > MAX_ITEM_CHARS:
+        text = text[:MAX_ITEM_CHARS].rstrip() + "…"
+    return text
+
+
+def extract_digest(content: str) -> Optional[dict]:
+    """Pull topic, decisions, completed tasks and TODOs out of a summary file.
+
+    Returns:
+        Dict with 'created' (ISO timestamp from the frontmatter), 'topic',
+        'decisions', 'done' and 'todos', or None if the file has no AI summary
+    """
+    lines = content.split("\n")
+    meta = {}
+    body_start = 0
+    if lines and lines[0].strip() == "---":
+        for i, line in enumerate(lines[1:], 1):
+            if line.strip() == "---":
+                body_start = i + 1
+                break
+            key, sep, value = line.partition(":")
+            if sep:
+                meta[key.strip()] = value.strip()
+
+    if meta.get("has_ai_summary") == "False":
+        return None
+
+    digest = {"created": meta.get("created", ""), "topic": "", "decisions": [], "done": [], "todos": []}
+    section = None
+    free_text = []
+    for line in lines[body_start:]:
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            title = stripped.lstrip("#").strip()
+            section = "meta" if title == "元数据" else SECTION_FIELDS.get(title)
+            continue
+        if not stripped:
+            continue
+        if section == "meta":
+            # Freeform summaries have no sections: their text follows the metadata block
+            if not stripped.startswith("- **"):
+                free_text.append(stripped)
+            continue
+        if not section:
+            continue
+
+        is_item = stripped.startswith(("- ", "* "))
+        item = _clean_item(stripped[2:] if is_item else stripped)
+        if item is None:
+            continue
+        if section == "topic":
+            digest["topic"] = f"{digest['topic']} {item}".strip() if digest["topic"] else item
+        elif is_item:
+            digest[section].append(item)
+
+    if not digest["topic"] and free_text:
+        # First sentence of a freeform summary
+        text = " ".join(free_text)
+        digest["topic"] = _clean_item(re.split(r"(?<=[。！？.!?])\s*", text, maxsplit=1)[0]) or ""
+
+    if not (digest["topic"] or digest["decisions"] or digest["todos"]):
+        return None
+    digest["topic"] = digest["topic"][:MAX_ITEM_CHARS]
+    return digest
+
+
+def _key(text: str) -> str:
+    return _NORMALIZE.sub("", text.lower())
+
+
+def render_recall(project: str, entries: list, budget: int) -> str:
+    """Assemble the recall digest of a project within a token budget.
+
+    Open TODOs come first, then recent decisions, then older session topics;
+    a TODO counts as done once the same or a later session lists it under
+    completed tasks, and repeated items are shown once.
+
+    Args:
+        project: Project name
+        entries: Digests of the project's summaries (see extract_digest), newest first
+        budget: Maximum estimated tokens of the result
+
+    Returns:
+        Markdown digest, empty if there is nothing to recall
+    """
+    if not entries:
+        return ""
+
+    done_keys = set()
+    todos, decisions, topics = [], [], []
+    seen = set()
+    for entry in entries:
+        date = entry["created"][:10]
+        done_keys.update(_key(item) for item in entry["done"])
+        for item in entry["todos"]:
+            key = _key(item)
+            if key and key not in done_keys and ("todo", key) not in seen:
+                seen.add(("todo", key))
+                todos.append(f"- [ ] {item} ({date})")
+        for item in entry["decisions"]:
+            key = _key(item)
+            if key and ("decision", key) not in seen:
+                seen.add(("decision", key))
+                decisions.append(f"- {date}: {item}")
+        if entry["topic"]:
+            topics.append(f"- {date}: {entry['topic']}")
+
+    header = [f"# 项目记忆: {project}", f"（{len(entries)} 次会话，最近一次 {entries[0]['created'][:10]}）"]
+    sections = {"topics": ("## 近期主题", []), "todos": ("## 后续待办", []), "decisions": ("## 关键决策", [])}
+    used = estimate_tokens("\n".join(header))
+
+    # The latest topic gives context for everything else, so it goes in first
+    candidates = [("topics", line) for line in topics[:1]]
+    candidates += [("todos", line) for line in todos]
+    candidates += [("decisions", line) for line in decisions]
+    candidates += [("topics", line) for line in topics[1:]]
+    for name, line in candidates:
+        title, chosen = sections[name]
+        cost = estimate_tokens(line) + 1 + (0 if chosen else estimate_tokens(title) + 2)
+        if used + cost > budget:
+            continue
+        chosen.append(line)
+        used += cost
+
+    lines = list(header)
+    for title, chosen in sections.values():
+        if chosen:
+            lines += ["", title] + chosen
+    return "\n".join(lines) if len(lines) > len(header) else ""
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Exporter
+Streaming export of memory files to Markdown, JSON or NDJSON
+"""
+
+import gzip
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger
+from storage import iter_full_files, logical_name, read_memory_text, uncompressed_size
+
+log = setup_logger("claudememv2.export")
+
+EXPORT_FORMATS = ("md", "json", "ndjson")
+
+
+def collect_export_paths(project_dirs: list, use_full: bool) -> list:
+    """List the files to export as (project, path) tuples, grouped by project.
+
+    Args:
+        project_dirs: Project directories under the memory directory
+        use_full: Export full transcripts (falls back to summaries for
+            projects without a full/ directory)
+    """
+    paths = []
+    for project_dir in project_dirs:
+        full_dir = project_dir / "full"
+        if use_full and full_dir.exists():
+            md_files = list(iter_full_files(full_dir))
+        else:
+            md_files = sorted(project_dir.glob("*.md"))
+        paths.extend((project_dir.name, md_file) for md_file in md_files)
+    return paths
+
+
+def _read_record(memory_dir: Path, project: str, md_file: Path) -> dict:
+    """Read one memory file into an export record."""
+    content = read_memory_text(md_file)
+    stat = md_file.stat()
+    data = content.encode("utf-8")
+    return {
+        "project": project,
+        "kind": "summary" if md_file.parent.name == project else "full",
+        "filename": logical_name(md_file),
+        "path": md_file.relative_to(memory_dir).as_posix(),
+        "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "content": content,
+    }
+
+
+def iter_records(memory_dir: Path, paths: list, workers: int = 4, max_ahead: int = 16,
+                 max_ahead_bytes: int = 64 * 1024 * 1024):
+    """Read memory files ahead in a small thread pool and yield records in order.
+
+    Read-ahead stops at `max_ahead` files or `max_ahead_bytes` of
+    (uncompressed) content, whichever comes first, so memory use stays
+    bounded however large the archive or its files are. Unreadable files
+    are logged and skipped.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        ahead_bytes = 0
+        paths = iter(paths)
+
+        def submit_next() -> bool:
+            nonlocal ahead_bytes
+            for project, md_file in paths:
+                try:
+                    size = uncompressed_size(md_file) or 0
+                except OSError:
+                    size = 0
+                ahead_bytes += size
+                pending.append((md_file, size, pool.submit(_read_record, memory_dir, project, md_file)))
+                return True
+            return False
+
+        while True:
+            # Always keep one read in flight; add more while within the budget
+            while not pending or (len(pending) < max_ahead and ahead_bytes < max_ahead_bytes):
+                if not submit_next():
+                    break
+            if not pending:
+                break
+
+            md_file, size, future = pending.popleft()
+            try:
+                record = future.result()
+            except (OSError, RuntimeError, UnicodeDecodeError) as e:
+                log.warning("Could not read %s: %s", md_file, e)
+                record = None
+            ahead_bytes -= size
+            if record is not None:
+                yield record
+
+
+def open_export_output(output_path: Path, compress: bool = False):
+    """Open the export file for text writing, gzip-compressed if requested."""
+    if compress:
+        return gzip.open(output_path, "wt", encoding="utf-8")
+    return open(output_path, "w", encoding="utf-8")
+
+
+def write_markdown(f, records, total: int) -> int:
+    """Write records as a single Markdown document. Returns the number written."""
+    f.write("# Claudememv2 Memory Export")
+    f.write(f"\n\n> Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    f.write(f"\n> Total files: {total}\n")
+
+    count = 0
+    current_project = None
+    for record in records:
+        if record["project"] != current_project:
+            current_project = record["project"]
+            f.write(f"\n\n---\n\n## Project: {current_project}\n")
+
+        f.write(f"\n### {record['filename']}\n")
+        f.write(f"\n*Modified: {record['modified'][:10]} | Size: {record['size']} bytes*\n")
+        f.write("\n" + record["content"])
+        f.write("\n\n")
+        count += 1
+    return count
+
+
+def write_json(f, records, total: int) -> int:
+    """Write records as one JSON object grouped by project, one record at a time.
+
+    The output matches json.dump(indent=2) of the whole export, without
+    ever holding it in memory.
+    """
+    f.write("{\n")
+    f.write(f'  "exported_at": {json.dumps(datetime.now().isoformat())},\n')
+    f.write(f'  "total_files": {total},\n')
+    f.write('  "projects": {')
+
+    count = 0
+    current_project = None
+    for record in records:
+        if record["project"] != current_project:
+            if current_project is not None:
+                f.write("\n    ],")
+            current_project = record["project"]
+            f.write(f"\n    {json.dumps(current_project, ensure_ascii=False)}: [")
+        else:
+            f.write(",")
+
+        entry = {key: record[key] for key in ("filename", "created", "modified", "size", "content")}
+        body = json.dumps(entry, indent=2, ensure_ascii=False)
+        f.write("\n      " + body.replace("\n", "\n      "))
+        count += 1
+
+    if current_project is not None:
+        f.write("\n    ]\n  }\n}")
+    else:
+        f.write("}\n}")
+    return count
+
+
+def write_ndjson(f, records, source: str) -> int:
+    """Write a header line, then one JSON record per file. Returns the number written."""
+    header = {"type": "export", "exported_at": datetime.now().isoformat(), "source": source}
+    f.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    count = 0
+    for record in records:
+        f.write(json.dumps({"type": "file", **record}, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def export_memories(memory_dir: Path, project_dirs: list, output_path: Path, fmt: str,
+                    use_full: bool = False, compress: bool = False, workers: int = 4) -> Optional[int]:
+    """Stream memory files into an export file.
+
+    Returns:
+        Number of files written, or None if there was nothing to export
+    """
+    paths = collect_export_paths(project_dirs, use_full)
+    if not paths:
+        return None
+
+    records = iter_records(memory_dir, paths, workers=workers)
+    with open_export_output(output_path, compress) as f:
+        if fmt == "json":
+            return write_json(f, records, len(paths))
+        if fmt == "ndjson":
+            return write_ndjson(f, records, "full" if use_full else "summary")
+        return write_markdown(f, records, len(paths))
+
+
+def export_changes(engine, output_path: Path, since: int, project: Optional[str] = None,
+                   compress: bool = False, workers: int = 4) -> dict:
+    """Stream the memory files changed and deleted after a watermark as NDJSON.
+
+    The output starts with an "export" header carrying the new watermark,
+    followed by one "delete" record per removed file and one "file" record
+    per added or changed file, so an importer can apply deletions first.
+
+    Args:
+        engine: SearchEngine whose catalog tracks the changes
+        output_path: Export file
+        since: Watermark of the previous export (0 for everything)
+        project: Only export this project
+        compress: gzip the output
+
+    Returns:
+        Dict with 'watermark', 'files' and 'deleted' counts
+    """
+    engine.sync_catalog()
+    changes = engine.changes_since(since)
+    files = [(p, engine.memory_dir / rel) for p, rel in changes["files"] if not project or p == project]
+    deleted = [(p, rel) for p, rel in changes["deleted"] if not project or p == project]
+
+    count = 0
+    with open_export_output(output_path, compress) as f:
+        header = {
+            "type": "export",
+            "exported_at": datetime.now().isoformat(),
+            "source": "changes",
+            "since": since,
+            "watermark": changes["watermark"],
+        }
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+        for p, rel in deleted:
+            f.write(json.dumps({"type": "delete", "project": p, "path": Path(rel).as_posix()}, ensure_ascii=False) + "\n")
+
+        for record in iter_records(engine.memory_dir, files, workers=workers):
+            f.write(json.dumps({"type": "file", **record}, ensure_ascii=False) + "\n")
+            count += 1
+
+    return {"watermark": changes["watermark"], "files": count, "deleted": len(deleted)}
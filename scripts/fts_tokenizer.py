@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 FTS Tokenizers
+Tokenizer choices for the chunks_fts full-text index (search.tokenizer)
+"""
+
+import re
+
+# search.tokenizer value -> FTS5 tokenize argument. cjk-bigram indexes text
+# rewritten by cjk_bigrams() with the unicode61 tokenizer, since Python's
+# sqlite3 cannot register a custom FTS5 tokenizer.
+TOKENIZERS = {
+    "trigram": "trigram",
+    "unicode61": "unicode61 remove_diacritics 2",
+    "cjk-bigram": "unicode61 remove_diacritics 2",
+}
+DEFAULT_TOKENIZER = "trigram"
+
+# Tokenizers whose FTS table is contentless and fed with rewritten text
+REWRITTEN = {"cjk-bigram"}
+
+# Han, kana and hangul; written without spaces between words
+_CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+_CJK_SPLIT = re.compile(f"({_CJK_RUN.pattern})")
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def _split_run(run: str) -> str:
+    # Every character starts a token, so a one-character query can match by prefix
+    if len(run) == 1:
+        return f" {run} "
+    return " " + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + f" {run[-1]} "
+
+
+def cjk_bigrams(text: str) -> str:
+    """Rewrite CJK runs as overlapping bigrams plus a final unigram ("数据库" -> "数据 据库 库").
+
+    Other text is left to the unicode61 tokenizer. Registered as an SQL
+    function, so the FTS rows can be built and deleted from chunks.content.
+    """
+    if text is None:
+        return None
+    return _CJK_RUN.sub(lambda m: _split_run(m.group()), text)
+
+
+def bigram_query(query: str) -> str:
+    """Turn a search query into an FTS5 MATCH expression for a cjk-bigram index.
+
+    Each whitespace-separated term (or "quoted phrase") must match: CJK
+    text as its bigram phrase, a single CJK character as a prefix, other
+    words as themselves.
+    """
+    terms = []
+    for match in _QUERY_TERM.finditer(query):
+        term = match.group(1) if match.group(1) is not None else match.group(2)
+        if _CJK_RUN.fullmatch(term) and len(term) == 1:
+            terms.append(f'"{term}"*')
+            continue
+        # Bigrams only: a query run ends where the indexed run may continue
+        parts = []
+        for segment in _CJK_SPLIT.split(term):
+            if _CJK_RUN.fullmatch(segment):
+                parts += [segment[i:i + 2] for i in range(len(segment) - 1)] or [segment]
+            elif segment.strip():
+                parts.append(segment)
+        if parts:
+            phrase = " ".join(parts).replace('"', '""')
+            terms.append(f'"{phrase}"')
+    return " ".join(terms)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Importer
+Apply NDJSON exports from another machine to the local memory archive
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+from logger import setup_logger
+from search_engine import SearchEngine
+from storage import COLD_DIR_NAME, is_memory_file, open_memory_writer, read_memory_text
+
+log = setup_logger("claudememv2.import")
+
+
+def open_import_input(input_path: Path):
+    """Open an NDJSON export for reading, gzip or plain (detected by content)."""
+    with open(input_path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(input_path, "rt", encoding="utf-8")
+    return open(input_path, "r", encoding="utf-8")
+
+
+def resolve_import_path(memory_dir: Path, record: dict) -> Optional[tuple]:
+    """Map the relative path of an exported record to a local memory file.
+
+    Only paths with the layout of a memory file are accepted:
+    <project>/<name>.md, <project>/full/<name>.md[.gz|.zst] and the same
+    under full/cold/.
+
+    Returns:
+        (path, rel_path, kind) tuple, or None if the path is not acceptable
+    """
+    rel = PurePosixPath(record.get("path") or "")
+    parts = rel.parts
+    if rel.is_absolute() or any(part in ("", ".", "..") for part in parts) or not is_memory_file(rel):
+        return None
+    if record.get("project") and parts[0] != record["project"]:
+        return None
+
+    if len(parts) == 2 and rel.name.endswith(".md"):
+        kind = "summary"
+    elif len(parts) == 3 and parts[1] == "full":
+        kind = "full"
+    elif len(parts) == 4 and parts[1] == "full" and parts[2] == COLD_DIR_NAME:
+        kind = "full"
+    else:
+        return None
+
+    path = memory_dir.joinpath(*parts)
+    return path, str(path.relative_to(memory_dir)), kind
+
+
+class Importer:
+    """Bulk-import an NDJSON export (full or `export --since`) into memory.
+
+    Deletions are applied as they are read. Files whose content hash is
+    already stored are skipped; the rest are written to disk and their
+    catalog and index rows are inserted in large batched transactions.
+
+    A local file with other content that changed after the last import
+    (a local edit, or another session saved under the same name) is a
+    conflict: it is neither overwritten nor deleted.
+    """
+
+    def __init__(self, config: dict, batch_size: int = 500, batch_bytes: int = 64 * 1024 * 1024):
+        self.config = config
+        self.engine = SearchEngine(config)
+        self.memory_dir = self.engine.memory_dir
+        self.batch_size = max(1, batch_size)
+        self.batch_bytes = batch_bytes
+
+    def run(self, input_path: Path, dry_run: bool = False) -> dict:
+        """Import one export file.
+
+        Returns:
+            Dict with 'files', 'imported', 'skipped', 'deleted', 'conflicts',
+            'invalid', 'indexed' counts and the source 'watermark' (if present)
+        """
+        stats = {"files": 0, "imported": 0, "skipped": 0, "deleted": 0, "conflicts": 0, "invalid": 0,
+                 "indexed": 0, "watermark": None}
+        conflicts = []
+
+        # Hashes are looked up against an up-to-date catalog
+        self.engine.sync_catalog()
+        known = self.engine.known_hashes()
+        # Files changed here since the last import (all of them before the first)
+        last_import = self.engine.get_sync_value("last_import") or 0
+        changed = {rel_path for _, rel_path in self.engine.changes_since(last_import)["files"]}
+
+        batch_files = []
+        batch_deleted = []
+        batch_bytes = 0
+
+        with open_import_input(input_path) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning("Skipping malformed line %d of %s", line_no, input_path)
+                    stats["invalid"] += 1
+                    continue
+
+                record_type = record.get("type")
+                if record_type == "export":
+                    stats["watermark"] = record.get("watermark")
+                    continue
+
+                resolved = resolve_import_path(self.memory_dir, record)
+                if resolved is None:
+                    log.warning("Skipping record with unacceptable path: %r", record.get("path"))
+                    stats["invalid"] += 1
+                    continue
+                path, rel_path, kind = resolved
+
+                if record_type == "delete":
+                    if rel_path in changed and path.exists():
+                        log.warning("Keeping %s: changed locally since the last import", rel_path)
+                        stats["conflicts"] += 1
+                        conflicts.append(rel_path)
+                        continue
+                    for paths in known.values():
+                        paths.discard(rel_path)
+                    if path.exists():
+                        stats["deleted"] += 1
+                        if not dry_run:
+                            path.unlink()
+                            batch_deleted.append(path)
+                    continue
+
+                if record_type != "file":
+                    stats["invalid"] += 1
+                    continue
+
+                stats["files"] += 1
+                content = record.get("content") or ""
+                data = content.encode("utf-8")
+                file_hash = hashlib.sha256(data).hexdigest()
+                if record.get("sha256") and record["sha256"] != file_hash:
+                    log.warning("Skipping %s: content does not match its sha256", rel_path)
+                    stats["invalid"] += 1
+                    continue
+
+                if self._is_known(known, file_hash, path, rel_path):
+                    stats["skipped"] += 1
+                    continue
+                if rel_path in changed and path.exists():
+                    log.warning("Not overwriting %s: it has other content, changed locally since the last import",
+                                rel_path)
+                    stats["conflicts"] += 1
+                    conflicts.append(rel_path)
+                    continue
+
+                stats["imported"] += 1
+                known.setdefault(file_hash, set()).add(rel_path)
+                if dry_run:
+                    continue
+
+                self._write_file(path, data, record.get("modified"))
+                batch_files.append({
+                    "path": path,
+                    "rel_path": rel_path,
+                    "project": PurePosixPath(record["path"]).parts[0],
+                    "kind": kind,
+                    "content": content,
+                    "hash": file_hash,
+                })
+                batch_bytes += len(data)
+
+                if len(batch_files) + len(batch_deleted) >= self.batch_size or batch_bytes >= self.batch_bytes:
+                    stats["indexed"] += self._flush(batch_files, batch_deleted)
+                    batch_files, batch_deleted, batch_bytes = [], [], 0
+
+        if batch_files or batch_deleted:
+            stats["indexed"] += self._flush(batch_files, batch_deleted)
+        if not dry_run:
+            # Files stamped after this are local changes the next import keeps,
+            # including the ones kept as conflicts this time
+            self.engine.set_sync_value("last_import", self.engine.get_sync_value("seq"))
+            self.engine.touch_paths(conflicts)
+
+        log.info("Import of %s finished: %s", input_path, stats)
+        return stats
+
+    def _is_known(self, known: dict, file_hash: str, path: Path, rel_path: str) -> bool:
+        """Check whether this content is already stored, here or at another path."""
+        if known.get(file_hash):
+            return True
+        # Files outside searchScope may not have a recorded hash yet
+        if path.exists():
+            try:
+                local = read_memory_text(path).encode("utf-8")
+            except (OSError, RuntimeError, UnicodeDecodeError):
+                return False
+            if hashlib.sha256(local).hexdigest() == file_hash:
+                known.setdefault(file_hash, set()).add(rel_path)
+                return True
+        return False
+
+    def _write_file(self, path: Path, data: bytes, modified: Optional[str]):
+        """Write an imported memory file atomically, keeping its original mtime."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open_memory_writer(path) as f:
+            f.write(data)
+        if modified:
+            try:
+                mtime = datetime.fromisoformat(modified).timestamp()
+                os.utime(path, (mtime, mtime))
+            except (ValueError, OSError):
+                pass
+
+    def _flush(self, files: list, deleted: list) -> int:
+        """Insert one batch into the catalog and index. Returns the number of files indexed."""
+        result = self.engine.import_batch(files, deleted)
+        log.debug("Imported batch: %d files, %d deletions", len(files), len(deleted))
+        return result["indexed"]
@@ -4,18 +4,256 @@ Claudememv2 Logger
 Centralized logging configuration for all modules.
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
 from pathlib import Path
 
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# File logging defaults, overridable by the "logging" config section
+DEFAULT_LOG_LEVEL = logging.INFO
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+
+def _parse_level(value, default: int) -> int:
+    """Turn a level name or number from config/env into a logging level."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip():
+        level = logging.getLevelName(value.strip().upper())
+        if isinstance(level, int):
+            return level
+    return default
+
+
+class _SharedFileMixin:
+    """Lazy opening and cross-process safety for handlers of the shared log file.
+
+    The CLI, the auto-save hook and its detached worker append to the same
+    file. Before each write the handler checks that the path still names
+    the file it has open and reopens it otherwise, like WatchedFileHandler,
+    so records are not written into a file another process rotated away.
+    """
+
+    def _open_shared(self) -> bool:
+        """Open the log file on first use, or reopen it after another process rotated it."""
+        if self._unavailable:
+            return False
+        try:
+            if self.stream is not None:
+                try:
+                    disk = os.stat(self.baseFilename)
+                    own = os.fstat(self.stream.fileno())
+                    if (disk.st_dev, disk.st_ino) == (own.st_dev, own.st_ino):
+                        return True
+                except FileNotFoundError:
+                    pass
+                self.stream.close()
+                self.stream = None
+            Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+            self.stream = self._open()
+            return True
+        except (OSError, ValueError):
+            # If we can't write logs, continue without file logging
+            self._unavailable = True
+            return False
+
+
+class _LazyFileHandler(_SharedFileMixin, logging.FileHandler):
+    """File handler that creates the log directory and opens the file on first use.
+
+    Setting up loggers at import time must not touch the disk, so commands
+    that never log anything start without any mkdir or open calls.
+    """
+
+    def __init__(self, filename: Path):
+        super().__init__(filename, encoding="utf-8", mode="a", delay=True)
+        self._unavailable = False
+
+    def emit(self, record):
+        if self._open_shared():
+            super().emit(record)
+
+
+class _LazyRotatingFileHandler(_SharedFileMixin, logging.handlers.RotatingFileHandler):
+    """Size-rotated log file, opened on first use like _LazyFileHandler.
+
+    RotatingFileHandler alone is not safe across processes: two processes
+    over the limit would both rename the files, shifting away records the
+    other just wrote. Rollover here runs under a lock file and only if the
+    file on disk is still over the limit once the lock is held.
+    """
+
+    def __init__(self, filename: Path, max_bytes: int, backup_count: int):
+        super().__init__(filename, mode="a", maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+        self._unavailable = False
+
+    def emit(self, record):
+        if self._open_shared():
+            super().emit(record)
+
+    def doRollover(self):
+        # Import here to avoid circular dependency
+        from utils import file_lock
+        try:
+            with file_lock(Path(self.baseFilename + ".lock"), timeout=5):
+                # Another process may have rotated while this one waited
+                if not self._open_shared() or os.fstat(self.stream.fileno()).st_size < self.maxBytes:
+                    return
+                super().doRollover()
+        except (OSError, TimeoutError):
+            # Keep appending; the next record retries the rollover
+            pass
+
+
+class _LogWriter:
+    """Process-wide writer behind the queue handlers of all loggers.
+
+    Records are queued by the logging call and written by a QueueListener
+    thread, so hot loops never wait on file I/O. The listener only starts
+    with the first record. Worker processes of a pool (backfill) do not get
+    a listener: the pool tears them down without running atexit, which
+    would drop their queue, so they write directly, without rotating, and
+    leave rotation to the parent process. Forked children are recognized
+    by their pid; spawned ones are switched with write_directly().
+    """
+
+    def __init__(self):
+        self.level = _parse_level(os.environ.get("CLAUDEMEMV2_LOG_LEVEL"), DEFAULT_LOG_LEVEL)
+        self.max_bytes = DEFAULT_MAX_BYTES
+        self.backup_count = DEFAULT_BACKUP_COUNT
+        self._lock = threading.Lock()
+        self._owner_pid = os.getpid()
+        self._direct = False
+        self._started = False
+        self._queue = None
+        self._listener = None
+        self._file_handler = None
+        self._direct_handler = None
+        atexit.register(self.stop)
+
+    def log_path(self) -> Path:
+        # Import here to avoid circular dependency
+        from utils import get_home_dir
+        return get_home_dir() / ".claude" / "Claudememv2-data" / "logs" / "memory.log"
+
+    def _formatter(self) -> logging.Formatter:
+        return logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    def put(self, record: logging.LogRecord):
+        """Hand a record to the writer of the current process."""
+        if not self._direct and os.getpid() == self._owner_pid:
+            if not self._started:
+                with self._lock:
+                    if not self._started:
+                        self._start()
+            self._queue.put_nowait(record)
+            return
+
+        if self._direct_handler is None:
+            self._direct_handler = _LazyFileHandler(self.log_path())
+            self._direct_handler.setFormatter(self._formatter())
+        self._direct_handler.handle(record)
+
+    def _start(self):
+        self._file_handler = _LazyRotatingFileHandler(self.log_path(), self.max_bytes, self.backup_count)
+        self._file_handler.setFormatter(self._formatter())
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, self._file_handler)
+        self._listener.start()
+        self._started = True
+
+    def write_directly(self):
+        """Write the records of this process directly instead of through a listener thread."""
+        self.stop()
+        self._direct = True
+
+    def configure(self, level: int, max_bytes: int, backup_count: int):
+        """Apply level and rotation settings (also to an already running writer)."""
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        if self._file_handler is not None:
+            self._file_handler.maxBytes = max_bytes
+            self._file_handler.backupCount = backup_count
+
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        with self._lock:
+            if self._started and os.getpid() == self._owner_pid:
+                self._listener.stop()
+                self._file_handler.close()
+                self._started = False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that forwards to the shared _LogWriter."""
+
+    def __init__(self, writer: _LogWriter):
+        super().__init__(None)
+        self.writer = writer
+
+    def enqueue(self, record):
+        self.writer.put(record)
+
+
+_writer = _LogWriter()
+_loggers = []
+
+
+def _apply_level(logger: logging.Logger):
+    # Console output is WARNING and above whatever the file level is; setting
+    # the logger level lets disabled debug calls return before building a record
+    logger.setLevel(min(_writer.level, logging.WARNING))
+    for handler in logger.handlers:
+        if isinstance(handler, _QueueHandler):
+            handler.setLevel(_writer.level)
+
+
+def configure_logging(config: dict):
+    """Apply the "logging" config section to all loggers.
+
+    Keys: level (default INFO), maxBytes (default 5 MB) and backupCount
+    (default 3). CLAUDEMEMV2_LOG_LEVEL overrides the configured level.
+    """
+    settings = config.get("logging") or {}
+    level = _parse_level(settings.get("level"), DEFAULT_LOG_LEVEL)
+    level = _parse_level(os.environ.get("CLAUDEMEMV2_LOG_LEVEL"), level)
+    try:
+        max_bytes = int(settings.get("maxBytes", DEFAULT_MAX_BYTES))
+        backup_count = int(settings.get("backupCount", DEFAULT_BACKUP_COUNT))
+    except (TypeError, ValueError):
+        max_bytes, backup_count = DEFAULT_MAX_BYTES, DEFAULT_BACKUP_COUNT
+
+    _writer.configure(level, max_bytes, backup_count)
+    for logger in _loggers:
+        _apply_level(logger)
+
+
+def write_directly():
+    """Switch the current process to direct, non-rotating log writes.
+
+    Used as the initializer of process pools: their workers are torn down
+    without atexit handlers, so records queued for a listener would be lost.
+    """
+    _writer.write_directly()
+
 
 def setup_logger(name: str = "claudememv2") -> logging.Logger:
     """Set up and return a logger that writes to file and stderr.
 
-    Log file: ~/.claude/Claudememv2-data/logs/memory.log
+    Log file: ~/.claude/Claudememv2-data/logs/memory.log, rotated by size
     Console: WARNING and above to stderr
-    File: DEBUG and above
+    File: INFO and above unless configured otherwise (see configure_logging),
+    written by a background thread
     """
     logger = logging.getLogger(name)
 
@@ -23,31 +261,8 @@ def setup_logger(name: str = "claudememv2") -> logging.Logger:
     if logger.handlers:
         return logger
 
-    logger.setLevel(logging.DEBUG)
-
-    # Import here to avoid circular dependency
-    from utils import get_home_dir
-
-    # Determine log directory
-    log_dir = get_home_dir() / ".claude" / "Claudememv2-data" / "logs"
-
-    try:
-        log_dir.mkdir(parents=True, exist_ok=True)
-        log_file = log_dir / "memory.log"
-
-        # File handler: DEBUG and above, with rotation-friendly append
-        file_handler = logging.FileHandler(
-            log_file, encoding="utf-8", mode="a"
-        )
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(logging.Formatter(
-            "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        ))
-        logger.addHandler(file_handler)
-    except (OSError, PermissionError):
-        # If we can't write logs, continue without file logging
-        pass
+    # File output goes through the queue; the file is only opened on the first record
+    logger.addHandler(_QueueHandler(_writer))
 
     # Console handler: WARNING and above to stderr (don't pollute stdout)
     console_handler = logging.StreamHandler(sys.stderr)
@@ -57,4 +272,7 @@ def setup_logger(name: str = "claudememv2") -> logging.Logger:
     ))
     logger.addHandler(console_handler)
 
+    _loggers.append(logger)
+    _apply_level(logger)
+
     return logger
@@ -4,13 +4,20 @@ Claudememv2 Memory Core
 Main entry point for memory operations: save, search, index, status, cleanup
 """
 
+import time
+
+# Startup timing report (--timing or CLAUDEMEMV2_TIMING=1)
+_START = time.perf_counter()
+
 import argparse
 import json
 import os
 import sys
 import shutil
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 # Fix Windows console encoding issues
 if sys.platform == "win32":
@@ -20,11 +27,11 @@ if sys.platform == "win32":
     except Exception:
         pass
 
-# Import submodules
-from session_parser import SessionParser
-from search_engine import SearchEngine
-from logger import setup_logger
-from utils import get_home_dir, get_model
+# Import submodules. session_parser, search_engine and storage are imported
+# inside the commands that use them, so light commands start quickly.
+from logger import configure_logging, setup_logger
+from profiler import profiler
+from utils import file_lock, get_home_dir, get_model
 
 log = setup_logger("claudememv2.core")
 
@@ -78,16 +85,19 @@ def load_config():
                 for key in user_config:
                     if key not in default_config:
                         default_config[key] = user_config[key]
-                return default_config
         except Exception as e:
             log.warning("Could not load config from %s: %s", config_path, e)
             print(f"Warning: Could not load config: {e}", file=sys.stderr)
 
+    configure_logging(default_config)
     return default_config
 
 
 def cmd_save(args):
     """Save current session to memory."""
+    from session_parser import SessionParser
+    from search_engine import SearchEngine
+
     config = load_config()
     parser = SessionParser(config)
 
@@ -105,25 +115,115 @@ def cmd_save(args):
 
     try:
         result = parser.save_session(args.project)
-        log.info("Session saved: %s (%d messages, project=%s)", result['file_path'], result['message_count'], result['project'])
-        print(f"[OK] Session saved to memory")
+        log.info("Session saved: %s (%d messages, project=%s, status=%s)", result['file_path'], result['message_count'], result['project'], result['status'])
+        if result["status"] == "unchanged":
+            print(f"[OK] Session unchanged since last save")
+        elif result["status"] == "updated":
+            print(f"[OK] Session memory updated")
+        else:
+            print(f"[OK] Session saved to memory")
         print(f"  File: {result['file_path']}")
         print(f"  Messages: {result['message_count']}")
         print(f"  Project: {result['project']}")
 
-        # Index the new memory
-        try:
-            SearchEngine(config).index()
-        except Exception as index_error:
-            log.warning("Failed to index after save: %s", index_error)
+        # Index just the files this save wrote
+        if result["status"] != "unchanged":
+            try:
+                paths = [result["file_path"]]
+                if result.get("full_file_path"):
+                    paths.append(result["full_file_path"])
+                with profiler.span("index"):
+                    SearchEngine(config).index_paths(paths, removed=result.get("removed_paths"))
+            except Exception as index_error:
+                log.warning("Failed to index after save: %s", index_error)
     except Exception as e:
         log.error("Error saving session: %s", e, exc_info=True)
         print(f"[ERROR] Error saving session: {e}", file=sys.stderr)
         sys.exit(1)
 
 
+def cmd_auto_save(args):
+    """Queue a save from the Claude Code Stop hook, or run a queued save (--worker)."""
+    from autosave import AutoSaver
+
+    config = load_config()
+    saver = AutoSaver(config)
+
+    if args.worker:
+        try:
+            saver.run_worker(args.worker)
+        except Exception as e:
+            log.error("Auto-save worker failed for %s: %s", args.worker, e, exc_info=True)
+            sys.exit(1)
+        return
+
+    if not saver.enabled:
+        return
+
+    # The Stop hook passes its event as JSON on stdin
+    hook_input = {}
+    try:
+        if sys.stdin is not None and not sys.stdin.isatty():
+            raw = sys.stdin.read()
+            if raw.strip():
+                hook_input = json.loads(raw)
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable hook input: %s", e)
+
+    # A failing hook must never get in the way of Claude Code
+    try:
+        session_id = saver.request(hook_input)
+    except Exception as e:
+        log.error("Could not queue auto-save: %s", e, exc_info=True)
+        return
+
+    if session_id and not saver.hook_config.get("silent", True):
+        print(f"[AUTO-SAVE] Save of session {session_id} queued")
+
+
+def cmd_backfill(args):
+    """Import historical sessions from ~/.claude/projects into memory."""
+    from backfill import Backfiller
+
+    config = load_config()
+    if args.all:
+        config["memory"]["maxMessages"] = 0
+
+    backfiller = Backfiller(
+        config,
+        workers=args.workers,
+        api_concurrency=args.api_concurrency,
+        api_rate=args.api_rate,
+    )
+
+    try:
+        result = backfiller.run(project_filter=args.filter, limit=args.limit, dry_run=args.dry_run)
+        log.info("Backfill finished: %s", result)
+        if args.dry_run:
+            print(f"[BACKFILL] Backfill preview (dry run)")
+        else:
+            print(f"[BACKFILL] Backfill complete")
+        print(f"  Sessions found: {result['found']}")
+        print(f"  Already imported: {result['skipped']}")
+        if not args.dry_run:
+            print(f"  Saved: {result['saved']}")
+            print(f"  Empty: {result['empty']}")
+            print(f"  Failed: {result['failed']}")
+            if "index" in result:
+                print(f"  Total chunks: {result['index']['chunks']}")
+    except KeyboardInterrupt:
+        print("[BACKFILL] Interrupted; run the command again to resume", file=sys.stderr)
+        sys.exit(130)
+    except Exception as e:
+        log.error("Error during backfill: %s", e, exc_info=True)
+        print(f"[ERROR] Error during backfill: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
 def cmd_search(args):
     """Search memories."""
+    from search_engine import SearchEngine
+
     config = load_config()
     engine = SearchEngine(config)
 
@@ -132,7 +232,9 @@ def cmd_search(args):
             query=args.query,
             limit=args.limit,
             project=args.project,
-            threshold=args.threshold
+            threshold=args.threshold,
+            skip_blobs=args.no_blobs,
+            fts_only=args.fts_only
         )
 
         if not results:
@@ -150,8 +252,109 @@ def cmd_search(args):
         sys.exit(1)
 
 
+def cmd_recall(args):
+    """Print the precomputed digest of a project (no API call)."""
+    from digest import render_recall
+    from search_engine import SearchEngine
+
+    config = load_config()
+    project = args.project or Path.cwd().name
+
+    try:
+        entries = SearchEngine(config).recall_entries(project, limit=args.sessions)
+    except Exception as e:
+        log.error("Error loading recall digest: %s", e, exc_info=True)
+        print(f"[ERROR] Error loading recall digest: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    digest = render_recall(project, entries, args.budget)
+    if not digest:
+        print(f"[RECALL] No digest for project: {project}")
+        return
+    print(digest)
+
+
+def cmd_activity(args):
+    """Find the sessions that read, edited or ran something (no API call)."""
+    from search_engine import SearchEngine
+
+    config = load_config()
+    engine = SearchEngine(config)
+
+    if args.sync:
+        # Scan sessions saved before the activity index existed
+        from session_parser import SESSION_LOCK_TIMEOUT, SessionParser
+
+        parser = SessionParser(config)
+        added = 0
+        for record in parser.sessions.records():
+            session_path = record.get("session_path")
+            if not session_path or not Path(session_path).exists() or not record.get("session_id"):
+                continue
+            with file_lock(parser.sessions.lock_path(record["session_id"]), timeout=SESSION_LOCK_TIMEOUT):
+                added += parser.record_tool_activity(session_path, record["project"], record.get("file_path"))
+        print(f"[ACTIVITY] Recorded {added} new tool calls")
+
+    filters = [(kind, value) for kind, value in (
+        ("path", args.path), ("command", args.shell_command), ("url", args.url), ("query", args.query), ("pattern", args.pattern)
+    ) if value]
+    if len(filters) > 1:
+        print("[ERROR] Give only one of --path, --command, --url, --query or --pattern", file=sys.stderr)
+        sys.exit(1)
+    if not filters and not args.tool:
+        if not args.sync:
+            print("[ERROR] Give --path, --command, --url, --query, --pattern or --tool", file=sys.stderr)
+            sys.exit(1)
+        return
+    kind, value = filters[0] if filters else (None, None)
+    if kind == "path" and not Path(value).is_absolute() and Path(value).exists():
+        value = str(Path(value).resolve())
+
+    try:
+        calls = engine.find_activity(kind, value, tool=args.tool, project=args.project, limit=args.limit * 50)
+    except Exception as e:
+        log.error("Error looking up tool activity: %s", e, exc_info=True)
+        print(f"[ERROR] Error looking up tool activity: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    described = f"{kind}: \"{value}\"" if kind else f"tool: {args.tool}"
+    if not calls:
+        print(f"[ACTIVITY] No recorded tool calls for {described}")
+        return
+
+    # Newest session first; calls arrive ordered by time
+    sessions = {}
+    for call in calls:
+        sessions.setdefault(call["session_id"], []).append(call)
+    print(f"[ACTIVITY] Sessions with matching tool calls ({described})\n")
+    for i, (session_id, session_calls) in enumerate(list(sessions.items())[:args.limit], 1):
+        latest = session_calls[0]
+        when = _local_time(latest["timestamp"])
+        print(f"{i}. {when}  {latest['project']}  {latest['memory_path'] or '(memory removed)'}")
+        print(f"   session: {session_id}")
+        counts = Counter((call["tool"], call["alias"] or call["target"] or "") for call in session_calls)
+        for (tool, target), count in counts.most_common(5):
+            times = f" x{count}" if count > 1 else ""
+            print(f"   {tool}{times}  {target[:100]}")
+        if len(counts) > 5:
+            print(f"   ... {len(counts) - 5} more")
+        print()
+
+
+def _local_time(timestamp: Optional[str]) -> str:
+    """Format a session ISO timestamp (UTC, 'Z' suffix) in local time."""
+    if not timestamp:
+        return "unknown time"
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).astimezone().strftime("%Y-%m-%d %H:%M")
+    except ValueError:
+        return timestamp
+
+
 def cmd_index(args):
     """Index all memory files."""
+    from search_engine import SearchEngine
+
     config = load_config()
     engine = SearchEngine(config)
 
@@ -163,6 +366,11 @@ def cmd_index(args):
         print(f"  New indexed: {result['new']}")
         print(f"  Updated: {result['updated']}")
         print(f"  Total chunks: {result['chunks']}")
+        duplicates = result.get("duplicates")
+        if duplicates and duplicates["duplicates"]:
+            share = duplicates["duplicate_chars"] / duplicates["chars"] * 100 if duplicates["chars"] else 0
+            print(f"  Near-duplicate chunks: {duplicates['duplicates']} "
+                  f"({duplicates['duplicate_chars'] / 1024:.1f} KB, {share:.1f}% of indexed text, skipped by search)")
     except Exception as e:
         log.error("Error indexing: %s", e, exc_info=True)
         print(f"[ERROR] Error indexing: {e}", file=sys.stderr)
@@ -171,34 +379,31 @@ def cmd_index(args):
 
 def cmd_status(args):
     """Show memory system status."""
+    from search_engine import SearchEngine
+    from storage import measure_read_throughput
+
     config = load_config()
-    data_dir = Path(config["memory"]["dataDir"]).expanduser()
-    memory_dir = data_dir / "memory"
+    engine = SearchEngine(config)
 
-    # Count projects and files
-    projects = 0
-    files = 0
-    total_size = 0
-    latest_update = None
-
-    if memory_dir.exists():
-        for project_dir in memory_dir.iterdir():
-            if project_dir.is_dir():
-                projects += 1
-                for md_file in project_dir.glob("*.md"):
-                    files += 1
-                    total_size += md_file.stat().st_size
-                    mtime = datetime.fromtimestamp(md_file.stat().st_mtime)
-                    if latest_update is None or mtime > latest_update:
-                        latest_update = mtime
-
-    # Format size
-    if total_size < 1024:
-        size_str = f"{total_size} B"
-    elif total_size < 1024 * 1024:
-        size_str = f"{total_size / 1024:.1f} KB"
-    else:
-        size_str = f"{total_size / (1024 * 1024):.1f} MB"
+    # Deep scan: repair the catalog from disk before reading the aggregates
+    verify = engine.verify() if args.verify else None
+
+    stats = engine.get_stats()
+    projects = stats["projects"]
+    files = stats["summary_files"]
+    total_size = stats["summary_bytes"]
+    latest_update = datetime.fromtimestamp(stats["latest_mtime"]) if stats["latest_mtime"] else None
+    full_count = stats["full_files"]
+    full_disk = stats["full_bytes"]
+    full_raw = stats["full_raw_bytes"]
+    cold_files = stats["cold_files"]
+
+    # Sample read throughput on the most recent transcripts (reads up to 32 MB)
+    throughput = None
+    if args.throughput:
+        throughput = measure_read_throughput(engine.recent_files("full", 20))
+
+    size_str = _format_size(total_size)
 
     # Get model info
     model_source = config["model"]["source"]
@@ -211,6 +416,25 @@ def cmd_status(args):
     print(f"  Files: {files}")
     print(f"  Total size: {size_str}")
     print(f"  Last updated: {latest_update.strftime('%Y-%m-%d %H:%M:%S') if latest_update else 'Never'}")
+    print(f"  Full transcripts: {full_count} (hot: {full_count - cold_files}, cold: {cold_files})")
+    if full_count:
+        ratio = full_raw / full_disk if full_disk else 1.0
+        print(f"  Full disk usage: {_format_size(full_disk)} ({_format_size(full_raw)} uncompressed, {ratio:.1f}x)")
+    if throughput:
+        print(f"  Read throughput: {throughput['mb_per_sec']:.1f} MB/s ({throughput['files']} files sampled)")
+    print(f"  Index: {stats['indexed_files']} files, {stats['chunks']} chunks"
+          f" (scope: {config['memory'].get('searchScope', 'summary')})")
+    tokenizer, storage = engine.fts_layout()
+    if tokenizer != engine.tokenizer:
+        tokenizer = f"{tokenizer} (configured: {engine.tokenizer}, applied by the next index run)"
+    print(f"  FTS tokenizer: {tokenizer}")
+    db_size = _format_size(engine.db_path.stat().st_size)
+    if storage != engine.chunk_storage:
+        storage = f"{storage} (configured: {engine.chunk_storage}, applied by the next index run)"
+    print(f"  Chunk storage: {storage}, database {db_size}")
+    cold_days = config["memory"].get("coldTierDays", 0)
+    print(f"  Full compression: {config['memory'].get('fullCompression', 'none')}"
+          f" (cold tier: {f'after {cold_days} days' if cold_days else 'disabled'})")
     print(f"  Model: {model_str}")
     print(f"  Content scope: {config['memory']['contentScope']}")
     print(f"  Max messages: {config['memory']['maxMessages'] or 'unlimited'}")
@@ -239,62 +463,77 @@ def cmd_status(args):
     else:
         print(f"  Summary: disabled")
 
+    if verify:
+        changes = verify["changes"]
+        print(f"[VERIFY] Catalog and index check")
+        print(f"  Catalog changes: {changes['added']} added, {changes['updated']} updated, {changes['removed']} removed")
+        print(f"  Projects with drifted totals: {', '.join(verify['drifted']) or 'none'}")
+        print(f"  Files not indexed: {verify['unindexed']}")
+        print(f"  Index rows without a file: {verify['orphaned']}")
+        print(f"  FTS integrity: {'ok' if verify['fts_ok'] else 'FAILED (run index --force)'}")
+
+
+def _format_size(size: int) -> str:
+    """Format a byte count for display."""
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    else:
+        return f"{size / (1024 * 1024):.1f} MB"
+
 
 def cmd_cleanup(args):
-    """Clean up old memory files."""
+    """Clean up old memory files, and enforce size quotas if configured."""
+    from search_engine import SearchEngine
+
     config = load_config()
-    data_dir = Path(config["memory"]["dataDir"]).expanduser()
-    memory_dir = data_dir / "memory"
+    memory_config = config["memory"]
+
+    days = args.days or memory_config["cleanupDays"]
+    try:
+        max_total = _parse_size(args.max_size or memory_config.get("cleanupMaxSize"))
+        max_project = _parse_size(args.project_max_size or memory_config.get("cleanupProjectMaxSize"))
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
 
-    days = args.days or config["memory"]["cleanupDays"]
-    cutoff = datetime.now().timestamp() - (days * 24 * 60 * 60)
+    # Victims come from the catalog; only their files are touched on disk
+    engine = SearchEngine(config)
+    victims = engine.select_cleanup(
+        days=days,
+        max_total_bytes=max_total,
+        max_project_bytes=max_project,
+        by_search=args.lru,
+        project=args.project,
+    )
 
     deleted = 0
     deleted_full = 0
     freed = 0
-    remaining = 0
-
-    if memory_dir.exists():
-        for project_dir in memory_dir.iterdir():
-            if project_dir.is_dir():
-                full_dir = project_dir / "full"
-                for md_file in project_dir.glob("*.md"):
-                    if md_file.stat().st_mtime < cutoff:
-                        if not args.dry_run:
-                            freed += md_file.stat().st_size
-                            md_file.unlink()
-                        deleted += 1
-
-                        # Also delete corresponding full/ file
-                        if full_dir.exists():
-                            full_file = full_dir / md_file.name
-                            if full_file.exists():
-                                if not args.dry_run:
-                                    freed += full_file.stat().st_size
-                                    full_file.unlink()
-                                deleted_full += 1
-                    else:
-                        remaining += 1
-
-    # Clean up orphaned SQLite records
-    if not args.dry_run:
-        import sqlite3
-        db_path = data_dir / "memory.sqlite"
-        if db_path.exists():
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT path FROM files")
-            orphaned = []
-            for (rel_path,) in cursor.fetchall():
-                if not (memory_dir / rel_path).exists():
-                    orphaned.append(rel_path)
-
-            if orphaned:
-                cursor.execute(f"DELETE FROM chunks WHERE file_path IN ({','.join('?' * len(orphaned))})", orphaned)
-                cursor.execute(f"DELETE FROM files WHERE path IN ({','.join('?' * len(orphaned))})", orphaned)
-                cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
-                conn.commit()
-            conn.close()
+    removed_paths = []
+
+    for victim in victims:
+        for path in victim["paths"]:
+            if path.parent == engine.memory_dir / victim["project"]:
+                deleted += 1
+            else:
+                deleted_full += 1
+            if args.dry_run:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            removed_paths.append(path)
+        freed += victim["bytes"]
+
+    # Drop the deleted files from the catalog and index, batch by batch
+    if removed_paths:
+        engine.remove_paths(removed_paths)
+
+    remaining = engine.get_stats()["summary_files"] - (deleted if args.dry_run else 0)
+    log.info("Cleanup: %d summaries, %d full files, %d bytes (dry_run=%s)", deleted, deleted_full, freed, args.dry_run)
 
     if args.dry_run:
         print(f"[CLEANUP] Memory cleanup preview (dry run)")
@@ -306,6 +545,51 @@ def cmd_cleanup(args):
     print(f"  Remaining files: {remaining}")
 
 
+def _parse_size(value) -> Optional[int]:
+    """Parse a size such as 500MB, 2G or 1048576 into bytes (None stays None)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    factor = units.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in units else text
+    try:
+        return int(float(number) * factor)
+    except ValueError:
+        raise ValueError(f"Invalid size: {value} (use e.g. 500MB or 2GB)")
+
+
+def cmd_blob(args):
+    """Print a blob-stored tool result, or show blob store usage."""
+    from blob_store import BlobStore
+
+    config = load_config()
+    store = BlobStore(Path(config["memory"]["dataDir"]).expanduser())
+
+    if args.digest is None:
+        stats = store.stats()
+        print(f"[BLOB] Blob store")
+        print(f"  Location: {store.blob_dir}")
+        print(f"  Blobs: {stats['blobs']}")
+        print(f"  Total size: {_format_size(stats['bytes'])}")
+        return
+
+    digest = args.digest.split(":", 1)[-1]
+    data = store.get(digest)
+    if data is None:
+        print(f"[ERROR] Blob not found: {args.digest}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        Path(args.output).write_bytes(data)
+        print(f"[OK] Blob written to {args.output} ({_format_size(len(data))})")
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+
+
 def cmd_config(args):
     """View or modify configuration."""
     config_path = get_config_path()
@@ -324,8 +608,12 @@ def cmd_config(args):
         "contentScope": ("memory", "contentScope"),
         "maxMessages": ("memory", "maxMessages"),
         "cleanupDays": ("memory", "cleanupDays"),
+        "cleanupMaxSize": ("memory", "cleanupMaxSize"),
+        "cleanupProjectMaxSize": ("memory", "cleanupProjectMaxSize"),
         "includeThinking": ("memory", "includeThinking"),
         "includeToolCalls": ("memory", "includeToolCalls"),
+        "fullCompression": ("memory", "fullCompression"),
+        "coldTierDays": ("memory", "coldTierDays"),
     }
 
     if args.key not in key_map:
@@ -337,11 +625,11 @@ def cmd_config(args):
 
     if args.value is None:
         # Show specific config
-        print(f"{args.key}: {config[section][key]}")
+        print(f"{args.key}: {config[section].get(key)}")
     else:
         # Set config
         # Type conversion
-        if key in ("maxMessages", "cleanupDays"):
+        if key in ("maxMessages", "cleanupDays", "coldTierDays"):
             config[section][key] = int(args.value)
         elif key in ("includeThinking", "includeToolCalls"):
             config[section][key] = args.value.lower() in ("true", "1", "yes")
@@ -356,7 +644,9 @@ def cmd_config(args):
 
 
 def cmd_export(args):
-    """Export memories to Markdown or JSON format."""
+    """Export memories to Markdown, JSON or NDJSON format."""
+    from exporter import export_memories
+
     config = load_config()
     data_dir = Path(config["memory"]["dataDir"]).expanduser()
     memory_dir = data_dir / "memory"
@@ -385,57 +675,42 @@ def cmd_export(args):
     # Determine source: summary (default) or full
     use_full = args.full
 
-    # Collect all memory files
-    memories = []
-    for project_dir in project_dirs:
-        project_name = project_dir.name
-        source_dir = project_dir / "full" if use_full else project_dir
-        if use_full and not source_dir.exists():
-            source_dir = project_dir  # fallback to summary
-
-        for md_file in sorted(source_dir.glob("*.md")):
-            try:
-                content = md_file.read_text(encoding="utf-8")
-                stat = md_file.stat()
-                memories.append({
-                    "project": project_name,
-                    "filename": md_file.name,
-                    "path": str(md_file),
-                    "content": content,
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    "size": stat.st_size,
-                })
-            except (OSError, PermissionError) as e:
-                print(f"  Warning: Could not read {md_file}: {e}", file=sys.stderr)
-
-    if not memories:
-        print("[ERROR] No memory files found to export.", file=sys.stderr)
+    # Incremental exports are always NDJSON so deletions can be expressed
+    fmt = args.format or ("ndjson" if args.since is not None else "md")
+    if args.since is not None and fmt != "ndjson":
+        print("[ERROR] --since only supports the ndjson format.", file=sys.stderr)
         sys.exit(1)
 
     # Determine output path
-    fmt = args.format
+    compress = args.gzip or bool(args.output and args.output.endswith(".gz"))
     if args.output:
         output_path = Path(args.output)
     else:
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        suffix = "full" if use_full else "summary"
+        suffix = "changes" if args.since is not None else ("full" if use_full else "summary")
+        extension = f"{fmt}.gz" if compress else fmt
         if args.project:
-            output_path = Path(f"claudememv2-export-{args.project}-{suffix}-{timestamp}.{fmt}")
+            output_path = Path(f"claudememv2-export-{args.project}-{suffix}-{timestamp}.{extension}")
         else:
-            output_path = Path(f"claudememv2-export-all-{suffix}-{timestamp}.{fmt}")
+            output_path = Path(f"claudememv2-export-all-{suffix}-{timestamp}.{extension}")
+
+    if args.since is not None:
+        _export_changes(config, args, output_path, compress)
+        return
 
     try:
-        if fmt == "json":
-            _export_json(memories, output_path)
-        else:
-            _export_markdown(memories, output_path)
+        # Files are read ahead by a small thread pool and written one by one
+        count = export_memories(memory_dir, project_dirs, output_path, fmt,
+                                use_full=use_full, compress=compress, workers=args.workers)
+        if count is None:
+            print("[ERROR] No memory files found to export.", file=sys.stderr)
+            sys.exit(1)
 
-        log.info("Export completed: format=%s, files=%d, output=%s", fmt, len(memories), output_path)
+        log.info("Export completed: format=%s, files=%d, output=%s", fmt, count, output_path)
         print(f"[OK] Memories exported successfully")
-        print(f"  Format: {fmt}")
+        print(f"  Format: {fmt}{' (gzip)' if compress else ''}")
         print(f"  Source: {'full conversations' if use_full else 'summaries'}")
-        print(f"  Files: {len(memories)}")
+        print(f"  Files: {count}")
         print(f"  Projects: {len(project_dirs)}")
         print(f"  Output: {output_path}")
     except (OSError, PermissionError) as e:
@@ -444,55 +719,86 @@ def cmd_export(args):
         sys.exit(1)
 
 
-def _export_markdown(memories, output_path):
-    """Export memories as a single Markdown document."""
-    lines = []
-    lines.append("# Claudememv2 Memory Export")
-    lines.append(f"\n> Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    lines.append(f"> Total files: {len(memories)}\n")
-
-    current_project = None
-    for mem in memories:
-        if mem["project"] != current_project:
-            current_project = mem["project"]
-            lines.append(f"\n---\n\n## Project: {current_project}\n")
+def _export_changes(config: dict, args, output_path: Path, compress: bool):
+    """Export summaries and full transcripts changed or deleted since a watermark."""
+    from exporter import export_changes
+    from search_engine import SearchEngine
 
-        lines.append(f"### {mem['filename']}\n")
-        lines.append(f"*Modified: {mem['modified'][:10]} | Size: {mem['size']} bytes*\n")
-        lines.append(mem["content"])
-        lines.append("\n")
+    engine = SearchEngine(config)
+    # A project-filtered export keeps its own watermark, so it never makes
+    # an unfiltered "--since last" skip the other projects' changes
+    watermark_key = f"last_export:{args.project}" if args.project else "last_export"
+    if args.since == "last":
+        since = int(engine.get_sync_value(watermark_key) or 0)
+    else:
+        try:
+            since = int(args.since)
+        except ValueError:
+            print(f"[ERROR] Invalid watermark: {args.since} (expected a number or 'last')", file=sys.stderr)
+            sys.exit(1)
 
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+    try:
+        result = export_changes(engine, output_path, since, project=args.project,
+                                compress=compress, workers=args.workers)
+    except (OSError, PermissionError) as e:
+        log.error("Failed to write export file: %s", e, exc_info=True)
+        print(f"[ERROR] Failed to write export file: {e}", file=sys.stderr)
+        sys.exit(1)
 
+    engine.set_sync_value(watermark_key, result["watermark"])
+    log.info("Incremental export completed: since=%d, watermark=%d, files=%d, deleted=%d, output=%s",
+             since, result["watermark"], result["files"], result["deleted"], output_path)
+    print(f"[OK] Changes exported successfully")
+    print(f"  Format: ndjson{' (gzip)' if compress else ''}")
+    print(f"  Since: {since}")
+    print(f"  Files: {result['files']}")
+    print(f"  Deleted: {result['deleted']}")
+    print(f"  Watermark: {result['watermark']}")
+    print(f"  Output: {output_path}")
+
+
+def cmd_import(args):
+    """Import an NDJSON export, skipping content that is already stored."""
+    from importer import Importer
+
+    input_path = Path(args.input)
+    if not input_path.is_file():
+        print(f"[ERROR] Import file not found: {input_path}", file=sys.stderr)
+        sys.exit(1)
 
-def _export_json(memories, output_path):
-    """Export memories as a JSON file."""
-    export_data = {
-        "exported_at": datetime.now().isoformat(),
-        "total_files": len(memories),
-        "projects": {},
-    }
+    config = load_config()
+    print(f"[IMPORT] {'Checking' if args.dry_run else 'Importing'} {input_path}")
 
-    for mem in memories:
-        project = mem["project"]
-        if project not in export_data["projects"]:
-            export_data["projects"][project] = []
-        export_data["projects"][project].append({
-            "filename": mem["filename"],
-            "created": mem["created"],
-            "modified": mem["modified"],
-            "size": mem["size"],
-            "content": mem["content"],
-        })
+    try:
+        stats = Importer(config, batch_size=args.batch_size).run(input_path, dry_run=args.dry_run)
+    except (OSError, UnicodeDecodeError) as e:
+        log.error("Failed to import %s: %s", input_path, e, exc_info=True)
+        print(f"[ERROR] Failed to import: {e}", file=sys.stderr)
+        sys.exit(1)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(export_data, f, indent=2, ensure_ascii=False)
+    print(f"  Files: {stats['files']}")
+    print(f"  Imported: {stats['imported']}")
+    print(f"  Skipped (already stored): {stats['skipped']}")
+    print(f"  Deleted: {stats['deleted']}")
+    if stats["conflicts"]:
+        print(f"  Conflicts (changed locally, kept): {stats['conflicts']}")
+    if stats["invalid"]:
+        print(f"  Invalid records: {stats['invalid']}")
+    if not args.dry_run:
+        print(f"  Indexed: {stats['indexed']}")
+    if stats["watermark"] is not None:
+        print(f"  Source watermark: {stats['watermark']}")
+    if args.dry_run:
+        print("\n[DRY RUN] No files were written.")
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Claudememv2 - Intelligent memory system for Claude Code"
     )
+    parser.add_argument("--timing", action="store_true", help="Print startup and command timings to stderr")
+    parser.add_argument("--profile", action="store_true", help="Print a per-phase time, counter and API usage breakdown to stderr")
+    parser.add_argument("--profile-out", metavar="FILE", help="Append the profile of this run as a JSON line to FILE")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # save command
@@ -504,14 +810,52 @@ def main():
     save_parser.add_argument("--project", "-p", help="Override project name")
     save_parser.set_defaults(func=cmd_save)
 
+    # auto-save command (Claude Code Stop hook)
+    auto_save_parser = subparsers.add_parser("auto-save", help="Queue a background save (for the Stop hook; reads hook JSON from stdin)")
+    auto_save_parser.add_argument("--worker", metavar="SESSION_ID", help=argparse.SUPPRESS)
+    auto_save_parser.set_defaults(func=cmd_auto_save)
+
+    # backfill command
+    backfill_parser = subparsers.add_parser("backfill", help="Import historical sessions into memory")
+    backfill_parser.add_argument("--filter", help="Only projects whose Claude Code directory name contains this text")
+    backfill_parser.add_argument("--limit", type=int, help="Import at most N sessions in this run")
+    backfill_parser.add_argument("--workers", "-w", type=int, help="Parser processes (default: CPU count - 1, max 8)")
+    backfill_parser.add_argument("--api-concurrency", type=int, default=4, help="Concurrent API calls (default: 4)")
+    backfill_parser.add_argument("--api-rate", type=float, default=2.0, help="Max API calls started per second (default: 2)")
+    backfill_parser.add_argument("--all", action="store_true", help="Save all messages of each session")
+    backfill_parser.add_argument("--dry-run", action="store_true", help="Count sessions without importing")
+    backfill_parser.set_defaults(func=cmd_backfill)
+
     # search command
     search_parser = subparsers.add_parser("search", help="Search memories")
     search_parser.add_argument("query", help="Search query")
     search_parser.add_argument("--limit", "-l", type=int, default=6, help="Max results")
     search_parser.add_argument("--project", "-p", help="Search in specific project")
     search_parser.add_argument("--threshold", "-t", type=float, default=0.35, help="Min score")
+    search_parser.add_argument("--no-blobs", action="store_true", help="Skip chunks that reference blob-stored tool results")
+    search_parser.add_argument("--fts-only", action="store_true", help="Full-text search only, without the Claude API")
     search_parser.set_defaults(func=cmd_search)
 
+    # recall command
+    recall_parser = subparsers.add_parser("recall", help="Print a project's digest of topics, decisions and open TODOs")
+    recall_parser.add_argument("--project", "-p", help="Project name (default: current directory name)")
+    recall_parser.add_argument("--budget", "-b", type=int, default=800, help="Max estimated tokens (default: 800)")
+    recall_parser.add_argument("--sessions", type=int, default=50, help="Most recent sessions to draw from (default: 50)")
+    recall_parser.set_defaults(func=cmd_recall)
+
+    # activity command
+    activity_parser = subparsers.add_parser("activity", help="Find sessions by the files, commands or URLs their tools touched")
+    activity_parser.add_argument("--path", help="File or directory path (absolute, or relative to the session's working directory)")
+    activity_parser.add_argument("--command", dest="shell_command", help="Shell command prefix, e.g. \"pytest\"")
+    activity_parser.add_argument("--url", help="URL prefix, with or without scheme")
+    activity_parser.add_argument("--query", help="Web search query prefix")
+    activity_parser.add_argument("--pattern", help="Grep/Glob pattern prefix")
+    activity_parser.add_argument("--tool", help="Only calls of this tool, e.g. Edit")
+    activity_parser.add_argument("--project", "-p", help="Only sessions of this project")
+    activity_parser.add_argument("--limit", "-l", type=int, default=20, help="Max sessions (default: 20)")
+    activity_parser.add_argument("--sync", action="store_true", help="First record tool calls of sessions saved earlier")
+    activity_parser.set_defaults(func=cmd_activity)
+
     # index command
     index_parser = subparsers.add_parser("index", help="Index all memory files")
     index_parser.add_argument("--force", "-f", action="store_true", help="Force full reindex")
@@ -519,14 +863,26 @@ def main():
 
     # status command
     status_parser = subparsers.add_parser("status", help="Show memory status")
+    status_parser.add_argument("--throughput", action="store_true", help="Also measure full transcript read throughput")
+    status_parser.add_argument("--verify", action="store_true", help="Rescan the memory directory and check the catalog and index")
     status_parser.set_defaults(func=cmd_status)
 
     # cleanup command
     cleanup_parser = subparsers.add_parser("cleanup", help="Clean up old memories")
     cleanup_parser.add_argument("--days", "-d", type=int, help="Delete files older than N days")
+    cleanup_parser.add_argument("--max-size", help="Size quota for the whole archive, e.g. 2GB")
+    cleanup_parser.add_argument("--project-max-size", help="Size quota for each project, e.g. 200MB")
+    cleanup_parser.add_argument("--lru", action="store_true", help="Over quota, delete least-recently-searched memories first")
+    cleanup_parser.add_argument("--project", "-p", help="Only clean up this project")
     cleanup_parser.add_argument("--dry-run", action="store_true", help="Preview without deleting")
     cleanup_parser.set_defaults(func=cmd_cleanup)
 
+    # blob command
+    blob_parser = subparsers.add_parser("blob", help="Show a blob-stored tool result or blob store usage")
+    blob_parser.add_argument("digest", nargs="?", help="Blob digest (sha256:... as shown in transcripts)")
+    blob_parser.add_argument("--output", "-o", help="Write the blob to a file instead of stdout")
+    blob_parser.set_defaults(func=cmd_blob)
+
     # config command
     config_parser = subparsers.add_parser("config", help="View or modify configuration")
     config_parser.add_argument("key", nargs="?", help="Config key")
@@ -535,19 +891,69 @@ def main():
 
     # export command
     export_parser = subparsers.add_parser("export", help="Export memories to file")
-    export_parser.add_argument("--format", "-f", choices=["md", "json"], default="md", help="Export format (default: md)")
+    export_parser.add_argument("--format", "-f", choices=["md", "json", "ndjson"], help="Export format (default: md, ndjson with --since)")
     export_parser.add_argument("--project", "-p", help="Export specific project only")
     export_parser.add_argument("--output", "-o", help="Output file path")
     export_parser.add_argument("--full", action="store_true", help="Export full conversations instead of summaries")
+    export_parser.add_argument("--gzip", action="store_true", help="Compress the export with gzip (implied by a .gz output path)")
+    export_parser.add_argument("--workers", type=int, default=4, help="Threads reading files ahead (default: 4)")
+    export_parser.add_argument("--since", metavar="WATERMARK", help="Only export changes and deletions after a watermark ('last' for the previous export)")
     export_parser.set_defaults(func=cmd_export)
 
+    # import command
+    import_parser = subparsers.add_parser("import", help="Import an NDJSON export")
+    import_parser.add_argument("input", help="NDJSON export file (.ndjson or .ndjson.gz)")
+    import_parser.add_argument("--dry-run", action="store_true", help="Show what would be imported without writing")
+    import_parser.add_argument("--batch-size", type=int, default=500, help="Files per index transaction (default: 500)")
+    import_parser.set_defaults(func=cmd_import)
+
     args = parser.parse_args()
 
     if args.command is None:
         parser.print_help()
         sys.exit(1)
 
-    args.func(args)
+    if args.profile or args.profile_out:
+        profiler.enable()
+
+    if not (args.timing or os.environ.get("CLAUDEMEMV2_TIMING")):
+        _run_command(args)
+        return
+
+    ready = time.perf_counter()
+    modules_before = set(sys.modules)
+    try:
+        _run_command(args)
+    finally:
+        done = time.perf_counter()
+        lazy_modules = sorted(
+            name for name in set(sys.modules) - modules_before
+            if name in ("session_parser", "search_engine", "storage", "backfill", "blob_store", "anthropic")
+        )
+        print(f"[TIMING] startup {(ready - _START) * 1000:.1f} ms, "
+              f"{args.command} {(done - ready) * 1000:.1f} ms, "
+              f"total {(done - _START) * 1000:.1f} ms", file=sys.stderr)
+        if lazy_modules:
+            print(f"[TIMING] loaded on demand: {', '.join(lazy_modules)}", file=sys.stderr)
+
+
+def _run_command(args):
+    """Run the selected command, reporting its profile when enabled."""
+    if not profiler.enabled:
+        args.func(args)
+        return
+
+    try:
+        with profiler.span(args.command):
+            args.func(args)
+    finally:
+        if args.profile:
+            print("\n".join(profiler.format_report(args.command)), file=sys.stderr)
+        if args.profile_out:
+            try:
+                profiler.append_json(Path(args.profile_out), args.command)
+            except OSError as e:
+                print(f"[ERROR] Could not write profile to {args.profile_out}: {e}", file=sys.stderr)
 
 
 if __name__ == "__main__":
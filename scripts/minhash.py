@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 MinHash
+Near-duplicate detection for index chunks (one-permutation MinHash with LSH banding)
+"""
+
+import re
+import struct
+import zlib
+
+# Signature layout: NUM_BINS minimum hash values of 32 bits, split into
+# LSH_BANDS bands. Chunks that agree on every value of at least one band
+# become candidates; with 8 bands of 4 values, pairs from about 0.6
+# Jaccard similarity up are likely to collide, and candidates are then
+# checked against the configured threshold.
+NUM_BINS = 32
+LSH_BANDS = 8
+ROWS_PER_BAND = NUM_BINS // LSH_BANDS
+SHINGLE_CHARS = 5
+
+_EMPTY = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+# Fibonacci hashing spreads the CRC32 of a shingle over 64 bits
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_BIN_SHIFT = 64 - (NUM_BINS.bit_length() - 1)
+_PACK = struct.Struct(f"<{NUM_BINS}I")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def signature(text: str) -> bytes:
+    """Compute the MinHash signature of a text over its character shingles.
+
+    Each shingle is hashed once; the top bits of the hash pick a bin and
+    the next 32 bits are the value, of which each bin keeps the minimum
+    (one-permutation hashing), so the cost is linear in the text length.
+    """
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    if len(text) <= SHINGLE_CHARS:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_CHARS] for i in range(len(text) - SHINGLE_CHARS + 1)}
+
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles:
+        h = (zlib.crc32(shingle.encode("utf-8")) * _MULTIPLIER) & _MASK64
+        b = h >> _BIN_SHIFT
+        value = (h >> (_BIN_SHIFT - 32)) & _EMPTY
+        if value < bins[b]:
+            bins[b] = value
+    return _PACK.pack(*bins)
+
+
+def band_keys(sig: bytes) -> list:
+    """Split a signature into its (band, key) LSH entries."""
+    width = ROWS_PER_BAND * 4
+    return [(band, sig[band * width:(band + 1) * width]) for band in range(LSH_BANDS)]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    values_a = _PACK.unpack(a)
+    values_b = _PACK.unpack(b)
+    used = matches = 0
+    for x, y in zip(values_a, values_b):
+        if x == _EMPTY and y == _EMPTY:
+            continue
+        used += 1
+        matches += x == y
+    return matches / used if used else 1.0
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Message Models
+Compact slotted records for parsed session messages
+"""
+
+from typing import Optional
+
+
+class _Record:
+    """Base for slotted message records.
+
+    Records use __slots__ instead of a per-instance dict, which keeps a
+    fully parsed session small. They stay plain classes (rather than
+    dataclasses with slots=True) to support Python 3.8.
+    """
+
+    __slots__ = ()
+    role = "unknown"
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self) -> dict:
+        """Convert to a JSON-serializable dict (for checkpoints)."""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data.setdefault("role", self.role)
+        return data
+
+
+class Message(_Record):
+    """A user or assistant text message."""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: Optional[str] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+
+class ToolSummary(_Record):
+    """A one-line summary of a tool call, as used in summary parses."""
+
+    __slots__ = ("tool_name", "content", "timestamp")
+    role = "tool"
+
+    def __init__(self, tool_name: str, content: str, timestamp: Optional[str] = None):
+        self.tool_name = tool_name
+        self.content = content
+        self.timestamp = timestamp
+
+
+class ToolCall(_Record):
+    """A tool call with its (serialized) input, as used in full parses."""
+
+    __slots__ = ("tool_name", "tool_id", "input", "timestamp")
+    role = "tool_call"
+
+    def __init__(self, tool_name: str, tool_id: Optional[str], input: str, timestamp: Optional[str] = None):
+        self.tool_name = tool_name
+        self.tool_id = tool_id
+        self.input = input
+        self.timestamp = timestamp
+
+
+class ToolResult(_Record):
+    """A tool result with its (serialized) output, as used in full parses."""
+
+    __slots__ = ("tool_name", "tool_id", "result", "timestamp")
+    role = "tool_result"
+
+    def __init__(self, tool_name: str, tool_id: Optional[str], result: str, timestamp: Optional[str] = None):
+        self.tool_name = tool_name
+        self.tool_id = tool_id
+        self.result = result
+        self.timestamp = timestamp
+
+
+_RECORD_TYPES = {
+    "tool": ToolSummary,
+    "tool_call": ToolCall,
+    "tool_result": ToolResult,
+}
+
+
+def message_from_dict(data: dict) -> _Record:
+    """Rebuild a message record from its to_dict() form."""
+    record_type = _RECORD_TYPES.get(data.get("role"))
+    if record_type is None:
+        return Message(data.get("role", "unknown"), data.get("content", ""), data.get("timestamp"))
+    fields = {name: data.get(name) for name in record_type.__slots__}
+    return record_type(**fields)
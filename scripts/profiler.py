@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Profiler
+Lightweight timing spans and counters for --profile
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# Token fields reported in the usage of an API response
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+class Profiler:
+    """Collect nested timing spans and named counters for one command run.
+
+    Disabled by default: span() then returns without timing anything and
+    the counting methods return immediately, so instrumented code costs
+    next to nothing unless --profile is given. Spans with the same name
+    under the same parent are added up.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = {}
+        self.counters = {}
+        self._stack = []
+        self._started = None
+
+    def enable(self):
+        """Start collecting; the run's total time is measured from here."""
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def _timed(self, name: str):
+        path = "/".join(self._stack + [name])
+        self._stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            entry = self.spans.setdefault(path, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += elapsed
+
+    def span(self, name: str):
+        """Time a block: `with profiler.span("parse"): ...`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._timed(name)
+
+    def count(self, name: str, value: int = 1):
+        """Add to a counter (candidate counts, cache hits, ...)."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_usage(self, name: str, response):
+        """Add the token usage of an Anthropic API response to the `api.<name>.*` counters."""
+        if not self.enabled:
+            return
+        self.count(f"api.{name}.calls")
+        usage = getattr(response, "usage", None)
+        for field in USAGE_FIELDS:
+            value = getattr(usage, field, None)
+            if isinstance(value, int):
+                self.count(f"api.{name}.{field}", value)
+
+    def to_dict(self, command: Optional[str] = None) -> dict:
+        """Metrics of the run as a JSON-serializable dict."""
+        total = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "command": command,
+            "started_at": datetime.now().isoformat(),
+            "total_ms": round(total * 1000, 3),
+            "spans": [
+                {"name": path, "calls": entry["calls"], "ms": round(entry["seconds"] * 1000, 3)}
+                for path, entry in self.spans.items()
+            ],
+            "counters": dict(self.counters),
+        }
+
+    def format_report(self, command: Optional[str] = None) -> list:
+        """Human-readable breakdown, one line per span and counter."""
+        data = self.to_dict(command)
+        lines = [f"[PROFILE] {command or 'run'} {data['total_ms']:.1f} ms"]
+        # Spans are stored in completion order; show each parent before its children
+        for span in sorted(data["spans"], key=lambda s: self._sort_key(s["name"])):
+            depth = span["name"].count("/")
+            label = "  " * depth + span["name"].rsplit("/", 1)[-1]
+            calls = f" ({span['calls']}x)" if span["calls"] > 1 else ""
+            lines.append(f"  {label:<36} {span['ms']:>10.1f} ms{calls}")
+        if data["counters"]:
+            lines.append("  Counters:")
+            for name in sorted(data["counters"]):
+                lines.append(f"    {name}: {data['counters'][name]}")
+        cache_lines = self._cache_lines(data["counters"])
+        if cache_lines:
+            lines.append("  Prompt cache:")
+            lines.extend(cache_lines)
+        return lines
+
+    @staticmethod
+    def _cache_lines(counters: dict) -> list:
+        """Share of the input tokens of each API call type read from the prompt cache."""
+        lines = []
+        for key in sorted(counters):
+            if not (key.startswith("api.") and key.endswith(".calls")):
+                continue
+            name = key[len("api."):-len(".calls")]
+            read = counters.get(f"api.{name}.cache_read_input_tokens", 0)
+            written = counters.get(f"api.{name}.cache_creation_input_tokens", 0)
+            total = read + written + counters.get(f"api.{name}.input_tokens", 0)
+            if total:
+                lines.append(f"    {name}: {read} of {total} input tokens read from cache "
+                             f"({read / total * 100:.1f}%), {written} written")
+        return lines
+
+    def _sort_key(self, path: str) -> list:
+        # Order siblings by when they first finished, parents before children
+        order = list(self.spans)
+        parts = path.split("/")
+        return [order.index("/".join(parts[:i + 1])) if "/".join(parts[:i + 1]) in self.spans else -1
+                for i in range(len(parts))]
+
+    def append_json(self, output_path: Path, command: Optional[str] = None):
+        """Append the metrics of the run to a JSON Lines file."""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_dict(command), ensure_ascii=False) + "\n")
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+# Process-wide profiler used by memory_core, SessionParser and SearchEngine
+profiler = Profiler()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Prompt Cache
+Prompt caching markers for API requests, and a local stand-in client that
+checks whether the marked prefixes stay byte-identical between calls
+"""
+
+import hashlib
+import json
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from digest import estimate_tokens
+
+# Ends a prompt prefix the API may cache for a few minutes
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Shortest prefix the API caches (models differ; shorter prefixes are sent
+# uncached, without an error)
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def cached_block(text: str) -> dict:
+    """Text content block ending a cacheable prefix."""
+    return {"type": "text", "text": text, "cache_control": CACHE_CONTROL}
+
+
+def _request_blocks(request: dict) -> list:
+    """Content blocks of a request in the order the API caches them: system, then messages."""
+    blocks = []
+    system = request.get("system")
+    if isinstance(system, str):
+        system = [{"type": "text", "text": system}]
+    for block in system or []:
+        blocks.append(("system", block))
+    for message in request.get("messages", []):
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        for block in content:
+            blocks.append((message["role"], block))
+    return blocks
+
+
+def cached_prefixes(request: dict) -> list:
+    """Serialize a request up to each cache_control breakpoint.
+
+    A breakpoint caches everything up to and including its block, under
+    the model; the next call reads it only if that prefix is byte-identical.
+
+    Returns:
+        List of (sha256 hex, estimated tokens) per breakpoint, in order
+    """
+    prefixes = []
+    hasher = hashlib.sha256(request.get("model", "").encode("utf-8"))
+    tokens = 0
+    for role, block in _request_blocks(request):
+        content = {key: value for key, value in block.items() if key != "cache_control"}
+        hasher.update(json.dumps([role, content], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        tokens += estimate_tokens(content.get("text", ""))
+        if "cache_control" in block:
+            prefixes.append((hasher.copy().hexdigest(), tokens))
+    return prefixes
+
+
+class StandInClient:
+    """Local stand-in for anthropic.Anthropic() that simulates prompt caching.
+
+    messages.create() remembers every prefix ending at a cache_control
+    breakpoint and reports usage the way the API does, with estimated
+    token counts: a later call whose prefix is byte-identical reads it
+    from the cache, so a stray byte in a supposedly stable prefix shows up
+    as a cache write instead of a read. Used by check_prompt_cache.py.
+    """
+
+    def __init__(self, respond: Optional[Callable] = None, min_tokens: int = MIN_CACHEABLE_TOKENS):
+        """
+        Args:
+            respond: Callable taking the request dict and returning the reply text
+            min_tokens: Shortest prefix that is cached
+        """
+        self.respond = respond or (lambda request: "")
+        self.min_tokens = min_tokens
+        self.cache = {}
+        self.calls = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **request) -> SimpleNamespace:
+        prefixes = cached_prefixes(request)
+        total = sum(estimate_tokens(block.get("text", "")) for _, block in _request_blocks(request))
+
+        # The longest prefix seen before is read; the rest up to the last
+        # cacheable breakpoint is written
+        read = max((tokens for digest, tokens in prefixes if digest in self.cache), default=0)
+        written = 0
+        for digest, tokens in prefixes:
+            if tokens >= self.min_tokens and digest not in self.cache:
+                self.cache[digest] = tokens
+                written = max(written, tokens - read)
+
+        text = self.respond(request)
+        usage = SimpleNamespace(
+            input_tokens=total - read - written,
+            output_tokens=estimate_tokens(text),
+            cache_creation_input_tokens=written,
+            cache_read_input_tokens=read,
+        )
+        self.calls.append({"request": request, "prefixes": prefixes, "usage": usage})
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], usage=usage)
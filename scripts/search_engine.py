@@ -9,21 +9,251 @@ import os
 import sqlite3
 import hashlib
 import re
+import time
+from itertools import groupby
 from pathlib import Path
 from typing import Optional
 
-# Try to import anthropic for semantic search
-try:
-    import anthropic
-    HAS_ANTHROPIC = True
-except ImportError:
-    HAS_ANTHROPIC = False
-
+from blob_store import strip_blob_previews
+from chunk_refs import DEFAULT_STORAGE, STORAGE_MODES, locate_chunks, read_chunk_texts
+from digest import estimate_tokens, extract_digest
+from fts_tokenizer import DEFAULT_TOKENIZER, REWRITTEN, TOKENIZERS, bigram_query, cjk_bigrams
 from logger import setup_logger
-from utils import get_model
+from minhash import LSH_BANDS, ROWS_PER_BAND, band_keys, signature, similarity
+from profiler import profiler
+from prompt_cache import cached_block
+from storage import COLD_DIR_NAME, codec_for_path, iter_full_files, logical_name, read_memory_text, tier_cold_files, uncompressed_size
+from utils import file_lock, get_anthropic_client, get_model, has_anthropic
+
+# anthropic is imported lazily, only when the API is actually called
+HAS_ANTHROPIC = has_anthropic()
 
 log = setup_logger("claudememv2.search")
 
+# Bump when the DDL in _init_db changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 9
+
+# Several Claude Code sessions may save and index at the same time: SQLite
+# waits this long for another writer, and index mutations are serialized
+# across processes by an advisory lock file next to the database
+BUSY_TIMEOUT_SECONDS = 30
+INDEX_LOCK_TIMEOUT = 300
+
+# Near-duplicate chunks (overlapping chunks, resumed sessions, boilerplate)
+# share a cluster; search scores one chunk per cluster. Default Jaccard
+# similarity for search.nearDuplicateThreshold, and the most indexed
+# chunks compared per LSH band when clustering a new chunk.
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8
+MAX_LSH_CANDIDATES = 50
+
+# Chunks sent to the Claude API for reranking per search
+RERANK_CANDIDATES = 50
+
+# Fixed rerank instructions, sent as the system prompt
+RERANK_INSTRUCTIONS = """Rate the relevance of each text chunk to the query on a scale of 0-100.
+Only output a JSON array of scores in the same order as the chunks.
+
+Output format: [score1, score2, ...]"""
+
+# With byte-range chunk storage, FTS entries of removed chunks stay behind
+# until index() rebuilds the table, once they exceed this share of the chunks
+STALE_FTS_FRACTION = 0.2
+
+# Marker of chunks referencing blob-stored tool results (search --no-blobs)
+BLOB_REF_MARKER = "[blob sha256:"
+
+# Per-project aggregates of the catalog and index, kept current by triggers
+# so that status is a single query instead of a directory walk. The triggers
+# avoid INSERT OR IGNORE: the conflict mode of an outer upsert overrides it.
+CATALOG_DDL = [
+    # Change sequence: every operation that changes the catalog takes the next
+    # number and stamps it on the rows it touches (export --since watermarks)
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT INTO sync_state (key, value) SELECT 'seq', 0 WHERE NOT EXISTS (SELECT 1 FROM sync_state WHERE key = 'seq')",
+    """
+    CREATE TABLE IF NOT EXISTS tombstones (
+        path TEXT PRIMARY KEY,
+        project TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        deleted_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON tombstones(seq)",
+    """
+    CREATE TABLE IF NOT EXISTS catalog (
+        path TEXT PRIMARY KEY,
+        project TEXT NOT NULL,
+        name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        tier TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        raw_size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        last_hit REAL,
+        seq INTEGER NOT NULL DEFAULT 0,
+        hash TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_catalog_seq ON catalog(seq)",
+    "CREATE INDEX IF NOT EXISTS idx_catalog_project_mtime ON catalog(project, kind, mtime)",
+    "CREATE INDEX IF NOT EXISTS idx_catalog_memory ON catalog(project, name)",
+    "CREATE INDEX IF NOT EXISTS idx_catalog_kind_mtime ON catalog(kind, mtime)",
+    """
+    CREATE TABLE IF NOT EXISTS project_stats (
+        project TEXT PRIMARY KEY,
+        summary_files INTEGER NOT NULL DEFAULT 0,
+        summary_bytes INTEGER NOT NULL DEFAULT 0,
+        full_files INTEGER NOT NULL DEFAULT 0,
+        full_bytes INTEGER NOT NULL DEFAULT 0,
+        full_raw_bytes INTEGER NOT NULL DEFAULT 0,
+        cold_files INTEGER NOT NULL DEFAULT 0,
+        latest_mtime REAL,
+        indexed_files INTEGER NOT NULL DEFAULT 0,
+        chunks INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_ai AFTER INSERT ON catalog BEGIN
+        DELETE FROM tombstones WHERE path = NEW.path;
+        INSERT INTO project_stats(project) SELECT NEW.project
+            WHERE NOT EXISTS (SELECT 1 FROM project_stats WHERE project = NEW.project);
+        UPDATE project_stats SET
+            summary_files = summary_files + (NEW.kind = 'summary'),
+            summary_bytes = summary_bytes + (NEW.kind = 'summary') * NEW.size,
+            full_files = full_files + (NEW.kind = 'full'),
+            full_bytes = full_bytes + (NEW.kind = 'full') * NEW.size,
+            full_raw_bytes = full_raw_bytes + (NEW.kind = 'full') * NEW.raw_size,
+            cold_files = cold_files + (NEW.tier = 'cold'),
+            latest_mtime = CASE WHEN NEW.kind = 'summary' AND NEW.mtime > IFNULL(latest_mtime, 0)
+                                THEN NEW.mtime ELSE latest_mtime END
+        WHERE project = NEW.project;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_ad AFTER DELETE ON catalog BEGIN
+        UPDATE project_stats SET
+            summary_files = summary_files - (OLD.kind = 'summary'),
+            summary_bytes = summary_bytes - (OLD.kind = 'summary') * OLD.size,
+            full_files = full_files - (OLD.kind = 'full'),
+            full_bytes = full_bytes - (OLD.kind = 'full') * OLD.size,
+            full_raw_bytes = full_raw_bytes - (OLD.kind = 'full') * OLD.raw_size,
+            cold_files = cold_files - (OLD.tier = 'cold'),
+            latest_mtime = (SELECT MAX(mtime) FROM catalog WHERE project = OLD.project AND kind = 'summary')
+        WHERE project = OLD.project;
+        DELETE FROM tombstones WHERE path = OLD.path;
+        INSERT INTO tombstones (path, project, seq, deleted_at)
+        VALUES (OLD.path, OLD.project, (SELECT value FROM sync_state WHERE key = 'seq'), strftime('%s', 'now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_au AFTER UPDATE ON catalog BEGIN
+        UPDATE project_stats SET
+            summary_files = summary_files - (OLD.kind = 'summary'),
+            summary_bytes = summary_bytes - (OLD.kind = 'summary') * OLD.size,
+            full_files = full_files - (OLD.kind = 'full'),
+            full_bytes = full_bytes - (OLD.kind = 'full') * OLD.size,
+            full_raw_bytes = full_raw_bytes - (OLD.kind = 'full') * OLD.raw_size,
+            cold_files = cold_files - (OLD.tier = 'cold')
+        WHERE project = OLD.project;
+        INSERT INTO project_stats(project) SELECT NEW.project
+            WHERE NOT EXISTS (SELECT 1 FROM project_stats WHERE project = NEW.project);
+        UPDATE project_stats SET
+            summary_files = summary_files + (NEW.kind = 'summary'),
+            summary_bytes = summary_bytes + (NEW.kind = 'summary') * NEW.size,
+            full_files = full_files + (NEW.kind = 'full'),
+            full_bytes = full_bytes + (NEW.kind = 'full') * NEW.size,
+            full_raw_bytes = full_raw_bytes + (NEW.kind = 'full') * NEW.raw_size,
+            cold_files = cold_files + (NEW.tier = 'cold')
+        WHERE project = NEW.project;
+        UPDATE project_stats SET
+            latest_mtime = (SELECT MAX(mtime) FROM catalog c WHERE c.project = project_stats.project AND c.kind = 'summary')
+        WHERE project IN (OLD.project, NEW.project);
+    END
+    """,
+    # Recall digest fields of each summary file with an AI summary (recall command)
+    """
+    CREATE TABLE IF NOT EXISTS digests (
+        path TEXT PRIMARY KEY,
+        project TEXT NOT NULL,
+        created TEXT NOT NULL,
+        entry TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_digests_project ON digests(project, created)",
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_digest_ad AFTER DELETE ON catalog BEGIN
+        DELETE FROM digests WHERE path = OLD.path;
+    END
+    """,
+    # Tool calls of saved sessions (activity command): the file path, command,
+    # URL, query or pattern each call targeted, plus a short alias of it (path
+    # relative to the session cwd, command without a leading "cd <dir> &&",
+    # URL without its scheme) for lookups by prefix
+    """
+    CREATE TABLE IF NOT EXISTS tool_activity (
+        session_id TEXT NOT NULL,
+        call_id TEXT NOT NULL,
+        project TEXT NOT NULL,
+        memory_path TEXT,
+        tool TEXT NOT NULL,
+        kind TEXT,
+        target TEXT,
+        alias TEXT,
+        timestamp TEXT,
+        PRIMARY KEY (session_id, call_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_activity_target ON tool_activity(kind, target)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_alias ON tool_activity(kind, alias) WHERE alias IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_activity_tool ON tool_activity(tool, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_memory ON tool_activity(memory_path)",
+    # How far each session file has been scanned for tool calls
+    "CREATE TABLE IF NOT EXISTS activity_offsets (session_id TEXT PRIMARY KEY, offset INTEGER NOT NULL)",
+    # A deleted memory takes its activity along; saving the session again rescans it
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_activity_ad AFTER DELETE ON catalog BEGIN
+        DELETE FROM activity_offsets
+            WHERE session_id IN (SELECT session_id FROM tool_activity WHERE memory_path = OLD.path);
+        DELETE FROM tool_activity WHERE memory_path = OLD.path;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+        INSERT INTO project_stats(project) SELECT NEW.project
+            WHERE NOT EXISTS (SELECT 1 FROM project_stats WHERE project = NEW.project);
+        UPDATE project_stats SET indexed_files = indexed_files + 1 WHERE project = NEW.project;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+        UPDATE project_stats SET indexed_files = indexed_files - 1 WHERE project = OLD.project;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+        UPDATE project_stats SET chunks = chunks + 1
+        WHERE project = (SELECT project FROM files WHERE path = NEW.file_path);
+    END
+    """,
+    # LSH entries are found by primary key from the deleted chunk's signature (see minhash.band_keys)
+    "CREATE TRIGGER IF NOT EXISTS chunks_lsh_ad AFTER DELETE ON chunks WHEN OLD.minhash IS NOT NULL BEGIN "
+    + "".join(
+        f"DELETE FROM chunk_lsh WHERE band = {band} AND chunk_rowid = OLD.rowid"
+        f" AND key = substr(OLD.minhash, {band * ROWS_PER_BAND * 4 + 1}, {ROWS_PER_BAND * 4}); "
+        for band in range(LSH_BANDS)
+    )
+    + "END",
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+        UPDATE project_stats SET chunks = chunks - 1
+        WHERE project = (SELECT project FROM files WHERE path = OLD.file_path);
+    END
+    """,
+]
+
+CATALOG_TRIGGERS = ("catalog_ai", "catalog_ad", "catalog_au", "catalog_digest_ad", "catalog_activity_ad", "files_ai", "files_ad",
+                    "chunks_ai", "chunks_ad", "chunks_lsh_ad")
+
 
 class SearchEngine:
     """Search engine for memory files using Claude API."""
@@ -38,15 +268,74 @@ class SearchEngine:
         self.data_dir = Path(data_dir).expanduser()
         self.memory_dir = self.data_dir / "memory"
         self.db_path = self.data_dir / "memory.sqlite"
+        self.lock_path = self.data_dir / "index.lock"
+        self.dedup_threshold = float(
+            config.get("search", {}).get("nearDuplicateThreshold", DEFAULT_NEAR_DUPLICATE_THRESHOLD) or 0
+        )
+        self.tokenizer = config.get("search", {}).get("tokenizer", DEFAULT_TOKENIZER)
+        if self.tokenizer not in TOKENIZERS:
+            log.warning("Unknown search.tokenizer %r, using %s", self.tokenizer, DEFAULT_TOKENIZER)
+            self.tokenizer = DEFAULT_TOKENIZER
+        self.chunk_storage = config.get("search", {}).get("chunkStorage", DEFAULT_STORAGE)
+        if self.chunk_storage not in STORAGE_MODES:
+            log.warning("Unknown search.chunkStorage %r, using %s", self.chunk_storage, DEFAULT_STORAGE)
+            self.chunk_storage = DEFAULT_STORAGE
+        # (tokenizer, chunk storage) the FTS table was actually built for (read on first use)
+        self._fts_layout = None
 
         # Initialize database
         self._init_db()
 
     def _init_db(self):
-        """Initialize SQLite database."""
+        """Initialize SQLite database.
+
+        The DDL only runs when the stored schema version is behind, so opening
+        an up-to-date database costs a single PRAGMA read.
+        """
+        if self._schema_version() >= SCHEMA_VERSION:
+            return
+
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
-        conn = sqlite3.connect(self.db_path)
+        # Another process may be creating or upgrading the same database
+        with self._index_lock():
+            version = self._schema_version()
+            if version < SCHEMA_VERSION:
+                self._migrate(version)
+
+    def _schema_version(self) -> int:
+        """Read the stored schema version (0 for a new database)."""
+        if not self.db_path.exists():
+            return 0
+        conn = self._connect()
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, waiting for other writers instead of failing with "database is locked"."""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_SECONDS * 1000}")
+        # With WAL, NORMAL only syncs at checkpoints; a crash can lose the last
+        # commits but never corrupts the database, and the index is rebuildable
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # Builds and deletes the FTS rows of a cjk-bigram index
+        conn.create_function("cjk_bigrams", 1, cjk_bigrams, deterministic=True)
+        return conn
+
+    def _index_lock(self):
+        """Exclusive lock for index and catalog mutations across processes."""
+        return file_lock(self.lock_path, timeout=INDEX_LOCK_TIMEOUT)
+
+    def _migrate(self, version: int):
+        """Create the schema, or upgrade it from an older version."""
+        conn = self._connect()
+
+        # Readers (search, status) keep working while another process writes;
+        # the journal mode is stored in the database file
+        conn.execute("PRAGMA journal_mode = WAL")
+
         cursor = conn.cursor()
 
         # Create tables
@@ -66,24 +355,189 @@ class SearchEngine:
                 start_line INTEGER NOT NULL,
                 end_line INTEGER NOT NULL,
                 content TEXT NOT NULL,
+                minhash BLOB,
+                cluster INTEGER,
+                byte_start INTEGER,
+                byte_end INTEGER,
+                chunk_hash TEXT,
                 FOREIGN KEY (file_path) REFERENCES files(path)
             )
         """)
+        if 0 < version < 7:
+            # Signatures of existing chunks are filled in by the next index run
+            cursor.execute("ALTER TABLE chunks ADD COLUMN minhash BLOB")
+            cursor.execute("ALTER TABLE chunks ADD COLUMN cluster INTEGER")
+        if 0 < version < 8:
+            # Byte ranges of chunks stored by reference (content is then empty)
+            cursor.execute("ALTER TABLE chunks ADD COLUMN byte_start INTEGER")
+            cursor.execute("ALTER TABLE chunks ADD COLUMN byte_end INTEGER")
+            cursor.execute("ALTER TABLE chunks ADD COLUMN chunk_hash TEXT")
+
+        # Per-file chunk lookups (incremental index updates, deletes)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file_path ON chunks(file_path)")
+
+        # LSH buckets of chunk MinHash signatures (near-duplicate clustering)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_lsh (
+                band INTEGER NOT NULL,
+                key BLOB NOT NULL,
+                chunk_rowid INTEGER NOT NULL,
+                PRIMARY KEY (band, key, chunk_rowid)
+            ) WITHOUT ROWID
+        """)
 
         # Create FTS5 virtual table for full-text search
-        cursor.execute("""
+        self._create_fts(cursor, self.tokenizer, self.chunk_storage)
+
+        # Catalog of all memory files with per-project aggregates. It only
+        # holds data derived from disk (plus search hits), so older layouts
+        # are dropped and rebuilt rather than migrated.
+        if version < 3:
+            cursor.execute("DROP TABLE IF EXISTS catalog")
+        elif version < 4:
+            # Existing rows count as changed by the first sequence number, so
+            # that `export --since 0` includes them
+            cursor.execute("ALTER TABLE catalog ADD COLUMN seq INTEGER NOT NULL DEFAULT 1")
+            cursor.execute("ALTER TABLE catalog ADD COLUMN hash TEXT")
+        # Triggers hold no data; recreate them from the current definitions
+        for trigger in CATALOG_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        for statement in CATALOG_DDL:
+            cursor.execute(statement)
+
+        # Fill the catalog of an archive indexed before it existed
+        if version < 3:
+            self._sync_catalog(cursor)
+            self._rebuild_project_stats(cursor)
+        elif version < 6:
+            self._rebuild_digests(cursor)
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        conn.commit()
+        conn.close()
+
+    def _create_fts(self, cursor, tokenizer: str, storage: str):
+        """Create the FTS table for a search.tokenizer and search.chunkStorage choice.
+
+        trigram and unicode61 over inline chunks index chunks.content directly
+        (external content table). cjk-bigram indexes the rewritten text from
+        cjk_bigrams(), and chunks stored by reference have no text in the
+        database, so their table is contentless; columns other than the rowid
+        read as NULL. The choice is recorded in a comment of the DDL.
+        """
+        contentless = tokenizer in REWRITTEN or storage == "reference"
+        source = "content=''" if contentless else "content=chunks,\n                content_rowid=rowid"
+        cursor.execute(f"""
             CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
                 content,
                 id UNINDEXED,
                 file_path UNINDEXED,
-                content=chunks,
-                content_rowid=rowid,
-                tokenize='trigram'
+                {source},
+                tokenize='{TOKENIZERS[tokenizer]}' /* tokenizer={tokenizer} storage={storage} */
             )
         """)
+        # An existing table is kept as it is; read back what is there
+        self._fts_layout = None
+
+    def _current_layout(self, cursor) -> tuple:
+        """Find the (tokenizer, chunk storage) the existing FTS table was built for."""
+        if self._fts_layout is None:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'chunks_fts'")
+            row = cursor.fetchone()
+            sql = row[0] if row else ""
+            marker = re.search(r"/\* tokenizer=(\S+) storage=(\S+) \*/", sql)
+            if marker:
+                self._fts_layout = (marker.group(1), marker.group(2))
+            # Tables created before the layout comment
+            elif "content=''" in sql:
+                self._fts_layout = ("cjk-bigram", "inline")
+            elif "unicode61" in sql:
+                self._fts_layout = ("unicode61", "inline")
+            else:
+                self._fts_layout = ("trigram", "inline")
+        return self._fts_layout
 
-        conn.commit()
-        conn.close()
+    def _current_tokenizer(self, cursor) -> str:
+        """Find which search.tokenizer choice the existing FTS table was built with."""
+        return self._current_layout(cursor)[0]
+
+    def _contentless(self, cursor) -> bool:
+        """Check whether the FTS table holds only the index (no text to rebuild or delete from)."""
+        tokenizer, storage = self._current_layout(cursor)
+        return tokenizer in REWRITTEN or storage == "reference"
+
+    def fts_layout(self) -> tuple:
+        """(tokenizer, chunk storage) the index is built with; differs from the config until the next index run."""
+        conn = self._connect()
+        try:
+            return self._current_layout(conn.cursor())
+        finally:
+            conn.close()
+
+    def _fts_text(self, cursor) -> str:
+        """SQL expression for the indexed text of an inline chunks row."""
+        return "cjk_bigrams(content)" if self._current_tokenizer(cursor) in REWRITTEN else "content"
+
+    def _fts_rows(self, cursor, rows) -> list:
+        """Turn (rowid, text, id, file_path) rows into FTS rows for the current tokenizer."""
+        if self._current_tokenizer(cursor) in REWRITTEN:
+            return [(rowid, cjk_bigrams(text), chunk_id, file_path) for rowid, text, chunk_id, file_path in rows]
+        return list(rows)
+
+    def _switch_layout(self, cursor) -> bool:
+        """Recreate the FTS table if search.tokenizer or search.chunkStorage changed. Returns True if it did.
+
+        The new table is empty; the caller must rebuild it (and re-chunk
+        every file when the chunk storage changed).
+        """
+        current = self._current_layout(cursor)
+        if current == (self.tokenizer, self.chunk_storage):
+            return False
+        log.info("Switching FTS layout from %s/%s to %s/%s", *current, self.tokenizer, self.chunk_storage)
+        cursor.execute("DROP TABLE chunks_fts")
+        self._create_fts(cursor, self.tokenizer, self.chunk_storage)
+        return True
+
+    def _rebuild_fts(self, cursor):
+        """Rebuild the whole FTS table from the chunks table (and, for chunks stored by reference, their files)."""
+        if not self._contentless(cursor):
+            cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
+            return
+
+        cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('delete-all')")
+        cursor.execute(f"""
+            INSERT INTO chunks_fts(rowid, content, id, file_path)
+            SELECT rowid, {self._fts_text(cursor)}, id, file_path FROM chunks WHERE byte_start IS NULL
+        """)
+        cursor.execute("""
+            SELECT rowid, id, file_path, byte_start, byte_end, chunk_hash FROM chunks
+            WHERE byte_start IS NOT NULL ORDER BY file_path
+        """)
+        refs = cursor.fetchall()
+        # One file at a time, so only a single file's text is in memory
+        for file_path, group in groupby(refs, key=lambda row: row[2]):
+            group = list(group)
+            texts = read_chunk_texts(self.memory_dir, [(row[0], *row[2:]) for row in group])
+            cursor.executemany(
+                "INSERT INTO chunks_fts(rowid, content, id, file_path) VALUES (?, ?, ?, ?)",
+                self._fts_rows(cursor, [(row[0], texts[row[0]], row[1], file_path) for row in group if row[0] in texts])
+            )
+        self._set_counter(cursor, "fts_stale", 0)
+
+    def _fts_stale(self, cursor) -> bool:
+        """Check whether enough FTS entries of removed byte-range chunks piled up to rebuild the table."""
+        stale = self._counter(cursor, "fts_stale")
+        if not stale:
+            return False
+        cursor.execute("SELECT COUNT(*) FROM chunks")
+        return stale > STALE_FTS_FRACTION * cursor.fetchone()[0]
+
+    def _match_query(self, cursor, query: str) -> str:
+        """Adapt a search query to the tokenizer of the FTS table."""
+        if self._current_tokenizer(cursor) in REWRITTEN:
+            return bigram_query(query)
+        return query
 
     def _compute_hash(self, content: str) -> str:
         """Compute SHA256 hash of content."""
@@ -152,135 +606,1050 @@ class SearchEngine:
         return chunks
 
     def index(self, force: bool = False) -> dict:
-        """Index memory files based on searchScope config."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        log.info("Starting index operation (force=%s)", force)
-
-        scanned = 0
-        new_indexed = 0
-        updated = 0
-
+        """Index memory files based on searchScope config.
+
+        Runs under the index lock, so concurrent index runs from several
+        sessions take turns; a run that finds nothing changed skips the FTS
+        rebuild. A changed search.tokenizer takes effect here: the FTS table
+        is recreated and rebuilt from the stored chunks. A changed
+        search.chunkStorage re-chunks every file as well.
+
+        With chunks stored by reference, FTS rows are written as files are
+        indexed, and the table is only rebuilt (reading every memory file)
+        once stale entries of removed chunks pass STALE_FTS_FRACTION.
+        """
         if not self.memory_dir.exists():
             return {"scanned": 0, "new": 0, "updated": 0, "chunks": 0}
 
-        # Get search scope from config
-        search_scope = self.memory_config.get("searchScope", "summary")
-
-        # Get existing file hashes
-        existing_files = {}
-        if not force:
+        with self._index_lock():
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            log.info("Starting index operation (force=%s)", force)
+
+            # The rebuild at the end fills a recreated table
+            restore = self._current_layout(cursor)[1] != self.chunk_storage
+            switched = self._switch_layout(cursor)
+            incremental = self.chunk_storage == "reference" and not (force or switched)
+
+            scanned = 0
+            new_indexed = 0
+            updated = 0
+
+            # Move old full transcripts to the cold tier, carrying their index rows along
+            with profiler.span("cold_tier"):
+                moved = tier_cold_files(
+                    self.memory_dir,
+                    self.memory_config.get("coldTierDays", 0),
+                    self.memory_config.get("fullCompression", "none")
+                )
+            for old_path, new_path in moved:
+                self._rename_indexed_file(
+                    cursor,
+                    str(old_path.relative_to(self.memory_dir)),
+                    str(new_path.relative_to(self.memory_dir))
+                )
+
+            # Bring the catalog up to date; its scan also lists the files to index
+            with profiler.span("sync_catalog"):
+                files, _ = self._sync_catalog(cursor)
+
+            # Get existing file hashes
             cursor.execute("SELECT path, hash FROM files")
             existing_files = {row[0]: row[1] for row in cursor.fetchall()}
 
-        # Scan memory directory
-        for project_dir in self.memory_dir.iterdir():
+            # Drop index rows of files that no longer exist
+            on_disk = {rel_path for _, rel_path, _, _ in files}
+            gone = set(existing_files) - on_disk
+            for rel_path in gone:
+                self._remove_indexed_file(cursor, rel_path)
+
+            if force or restore:
+                existing_files = {}
+
+            with profiler.span("index_files"):
+                for md_file, rel_path, project, kind in files:
+                    # Summary files live in the project directory, full files in full/
+                    if not self._in_scope(kind):
+                        continue
+
+                    scanned += 1
+                    result = self._index_file(cursor, md_file, rel_path, project, existing_files, force,
+                                              sync_fts=incremental)
+                    if result == "new":
+                        new_indexed += 1
+                    elif result == "updated":
+                        updated += 1
+
+            # Chunks indexed before near-duplicate clustering was enabled
+            if self.dedup_threshold > 0:
+                with profiler.span("cluster_chunks"):
+                    signed = self._cluster_unsigned(cursor)
+                if signed:
+                    log.info("Clustered %d chunks without a near-duplicate signature", signed)
+
+            # Rebuild FTS index
+            changed = moved or gone or new_indexed or updated
+            if force or switched or (changed and not incremental) or self._fts_stale(cursor):
+                with profiler.span("fts_rebuild"):
+                    self._rebuild_fts(cursor)
+            conn.commit()
+
+            # Give the space of the dropped chunk text back to the file system
+            if restore:
+                with profiler.span("vacuum"):
+                    conn.execute("VACUUM")
+
+            # Get total chunks and how many of them search skips as near-duplicates
+            duplicates = self._near_duplicate_stats(cursor)
+
+            conn.close()
+
+            return {
+                "scanned": scanned,
+                "new": new_indexed,
+                "updated": updated,
+                "chunks": duplicates["chunks"],
+                "duplicates": duplicates
+            }
+
+    def _rename_indexed_file(self, cursor, old_rel: str, new_rel: str):
+        """Point the index rows of a moved file at its new path.
+
+        Byte ranges do not survive the recompression of a cold-tier move, so
+        a file with chunks stored by reference is dropped from the index
+        instead and indexed again under its new path.
+        """
+        cursor.execute("SELECT 1 FROM chunks WHERE file_path = ? AND byte_start IS NOT NULL LIMIT 1", (old_rel,))
+        if cursor.fetchone():
+            self._remove_indexed_file(cursor, old_rel)
+            return
+        cursor.execute("UPDATE files SET path = ? WHERE path = ?", (new_rel, old_rel))
+        cursor.execute("""
+            UPDATE chunks SET file_path = ?, id = ? || substr(id, ?)
+            WHERE file_path = ?
+        """, (new_rel, new_rel, len(old_rel) + 1, old_rel))
+
+    def _iter_memory_files(self):
+        """Yield (path, rel_path, project, kind) for every summary and full file on disk."""
+        for project_dir in sorted(self.memory_dir.iterdir()):
             if not project_dir.is_dir():
                 continue
-
             project = project_dir.name
 
-            # Index summary files (not in full/ directory)
-            if search_scope in ("summary", "both"):
-                for md_file in project_dir.glob("*.md"):
+            for md_file in sorted(project_dir.glob("*.md")):
+                yield md_file, str(md_file.relative_to(self.memory_dir)), project, "summary"
+
+            for md_file in iter_full_files(project_dir / "full"):
+                yield md_file, str(md_file.relative_to(self.memory_dir)), project, "full"
+
+    def _catalog_upsert(self, cursor, path: Path, rel_path: str, project: str, kind: str, stat=None,
+                        file_hash: Optional[str] = None, content: Optional[str] = None):
+        """Insert or refresh the catalog row of a memory file, stamped with the current change sequence.
+
+        Summary files also get their recall digest refreshed (from `content`
+        if given, otherwise read from disk).
+        """
+        stat = stat or path.stat()
+        tier = "cold" if kind == "full" and path.parent.name == COLD_DIR_NAME else "hot"
+        raw_size = stat.st_size if kind == "summary" else (uncompressed_size(path) or stat.st_size)
+        cursor.execute("""
+            INSERT INTO catalog (path, project, name, kind, tier, size, raw_size, mtime, hash, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT value FROM sync_state WHERE key = 'seq'))
+            ON CONFLICT(path) DO UPDATE SET
+                project = excluded.project, name = excluded.name, kind = excluded.kind, tier = excluded.tier,
+                size = excluded.size, raw_size = excluded.raw_size, mtime = excluded.mtime,
+                hash = excluded.hash, seq = excluded.seq
+        """, (rel_path, project, logical_name(path), kind, tier, stat.st_size, raw_size, stat.st_mtime, file_hash))
+        if kind == "summary":
+            self._update_digest(cursor, path, rel_path, project, content)
+
+    def _update_digest(self, cursor, path: Path, rel_path: str, project: str, content: Optional[str] = None):
+        """Refresh the recall digest row of a summary file from its sections."""
+        if content is None:
+            try:
+                content = read_memory_text(path)
+            except (OSError, UnicodeDecodeError) as e:
+                log.warning("Could not read %s for its digest: %s", rel_path, e)
+                return
+        entry = extract_digest(content)
+        if entry is None:
+            cursor.execute("DELETE FROM digests WHERE path = ?", (rel_path,))
+            return
+        cursor.execute("""
+            INSERT INTO digests (path, project, created, entry) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                project = excluded.project, created = excluded.created, entry = excluded.entry
+        """, (rel_path, project, entry["created"], json.dumps(entry, ensure_ascii=False)))
+
+    def _rebuild_digests(self, cursor):
+        """Recompute the recall digests of all cataloged summary files."""
+        cursor.execute("DELETE FROM digests")
+        rows = cursor.execute("SELECT path, project FROM catalog WHERE kind = 'summary'").fetchall()
+        for rel_path, project in rows:
+            self._update_digest(cursor, self.memory_dir / rel_path, rel_path, project)
+
+    def _next_seq(self, cursor) -> int:
+        """Take the next change sequence number for the current transaction."""
+        cursor.execute("UPDATE sync_state SET value = value + 1 WHERE key = 'seq'")
+        cursor.execute("SELECT value FROM sync_state WHERE key = 'seq'")
+        return cursor.fetchone()[0]
+
+    def _counter(self, cursor, key: str) -> int:
+        """Read a counter from the sync state table (0 if unset)."""
+        cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _set_counter(self, cursor, key: str, value: int):
+        """Store a counter in the sync state table (within the current transaction)."""
+        cursor.execute("""
+            INSERT INTO sync_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (key, value))
+
+    def _sync_catalog(self, cursor) -> tuple:
+        """Bring the catalog in line with the memory directory.
+
+        Only rows whose size or mtime changed are rewritten; the triggers
+        keep project_stats current as a side effect.
+
+        Returns:
+            (files, changes) where files lists (path, rel_path, project, kind)
+            of every memory file on disk and changes counts 'added',
+            'updated' and 'removed' catalog rows
+        """
+        self._next_seq(cursor)
+        cursor.execute("SELECT path, size, mtime FROM catalog")
+        cataloged = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        changes = {"added": 0, "updated": 0, "removed": 0}
+        files = []
+
+        if self.memory_dir.exists():
+            for md_file, rel_path, project, kind in self._iter_memory_files():
+                files.append((md_file, rel_path, project, kind))
+                stat = md_file.stat()
+                known = cataloged.pop(rel_path, None)
+                if known == (stat.st_size, stat.st_mtime):
+                    continue
+                self._catalog_upsert(cursor, md_file, rel_path, project, kind, stat)
+                changes["updated" if known else "added"] += 1
+
+        for rel_path in cataloged:
+            cursor.execute("DELETE FROM catalog WHERE path = ?", (rel_path,))
+            changes["removed"] += 1
+
+        return files, changes
+
+    def _rebuild_project_stats(self, cursor):
+        """Recompute all per-project aggregates from the catalog and index tables."""
+        cursor.execute("DELETE FROM project_stats")
+        cursor.execute("""
+            INSERT INTO project_stats (project, summary_files, summary_bytes, full_files, full_bytes,
+                                       full_raw_bytes, cold_files, latest_mtime)
+            SELECT project,
+                   SUM(kind = 'summary'), SUM((kind = 'summary') * size),
+                   SUM(kind = 'full'), SUM((kind = 'full') * size), SUM((kind = 'full') * raw_size),
+                   SUM(tier = 'cold'), MAX(CASE WHEN kind = 'summary' THEN mtime END)
+            FROM catalog GROUP BY project
+        """)
+        cursor.execute("INSERT OR IGNORE INTO project_stats (project) SELECT DISTINCT project FROM files")
+        cursor.execute("""
+            UPDATE project_stats SET
+                indexed_files = (SELECT COUNT(*) FROM files f WHERE f.project = project_stats.project),
+                chunks = (SELECT COUNT(*) FROM chunks c JOIN files f ON c.file_path = f.path
+                          WHERE f.project = project_stats.project)
+        """)
+
+    def get_stats(self) -> dict:
+        """Get archive totals from the precomputed per-project aggregates (one query)."""
+        conn = self._connect()
+        try:
+            row = conn.execute("""
+                SELECT SUM(summary_files + full_files > 0),
+                       SUM(summary_files), SUM(summary_bytes), MAX(latest_mtime),
+                       SUM(full_files), SUM(full_bytes), SUM(full_raw_bytes), SUM(cold_files),
+                       SUM(indexed_files), SUM(chunks)
+                FROM project_stats
+            """).fetchone()
+        finally:
+            conn.close()
+
+        keys = ("projects", "summary_files", "summary_bytes", "latest_mtime", "full_files",
+                "full_bytes", "full_raw_bytes", "cold_files", "indexed_files", "chunks")
+        stats = {key: value or 0 for key, value in zip(keys, row)}
+        stats["latest_mtime"] = row[3]
+        return stats
+
+    def verify(self) -> dict:
+        """Deep-scan the memory directory and repair the catalog, aggregates and digests.
+
+        Returns:
+            Dict with catalog 'changes', the 'drifted' projects whose
+            aggregates were off, 'unindexed' files in searchScope that have no
+            index rows, 'orphaned' index rows without a file and 'fts_ok'
+        """
+        with self._index_lock():
+            search_scope = self.memory_config.get("searchScope", "summary")
+            kinds = {"summary": ("summary",), "full": ("full",)}.get(search_scope, ("summary", "full"))
+
+            conn = self._connect()
+            cursor = conn.cursor()
+            try:
+                # Projects whose totals are all zero count as absent
+                stats_query = """
+                    SELECT * FROM project_stats
+                    WHERE summary_files + full_files + indexed_files + chunks != 0
+                """
+                before = {row[0]: row[1:] for row in cursor.execute(stats_query)}
+                _, changes = self._sync_catalog(cursor)
+                self._rebuild_project_stats(cursor)
+                self._rebuild_digests(cursor)
+                after = {row[0]: row[1:] for row in cursor.execute(stats_query)}
+
+                drifted = sorted(
+                    project for project in set(before) | set(after)
+                    if before.get(project) != after.get(project)
+                )
+
+                cursor.execute(f"""
+                    SELECT COUNT(*) FROM catalog c LEFT JOIN files f ON f.path = c.path
+                    WHERE f.path IS NULL AND c.kind IN ({','.join('?' * len(kinds))})
+                """, kinds)
+                unindexed = cursor.fetchone()[0]
+
+                cursor.execute("""
+                    SELECT COUNT(*) FROM files f LEFT JOIN catalog c ON c.path = f.path
+                    WHERE c.path IS NULL
+                """)
+                orphaned = cursor.fetchone()[0]
+
+                try:
+                    cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('integrity-check')")
+                    fts_ok = True
+                except sqlite3.DatabaseError as e:
+                    log.warning("FTS integrity check failed: %s", e)
+                    fts_ok = False
+
+                conn.commit()
+            finally:
+                conn.close()
+
+            return {
+                "changes": changes,
+                "drifted": drifted,
+                "unindexed": unindexed,
+                "orphaned": orphaned,
+                "fts_ok": fts_ok,
+            }
+
+    def recent_files(self, kind: str, limit: int) -> list:
+        """List the most recently modified cataloged files of a kind, newest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT path FROM catalog WHERE kind = ? ORDER BY mtime DESC LIMIT ?", (kind, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self.memory_dir / row[0] for row in rows]
+
+    def recall_entries(self, project: str, limit: int = 50) -> list:
+        """Load the recall digests of a project's most recent summaries, newest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT entry FROM digests WHERE project = ? ORDER BY created DESC LIMIT ?", (project, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def record_tool_activity(self, session_id: str, project: str, memory_path, extract) -> int:
+        """Add the tool calls of a session that are not recorded yet.
+
+        The scanned offset is stored in the same transaction as the rows, so
+        a re-save only parses what was appended to the session since.
+
+        Args:
+            session_id: Claude Code session ID
+            project: Project the session is saved under
+            memory_path: Summary file the session is saved to
+            extract: Callable taking a byte offset and returning (rows,
+                end_offset), see SessionParser.tool_activity
+
+        Returns:
+            Number of tool calls added
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT offset FROM activity_offsets WHERE session_id = ?", (session_id,)).fetchone()
+        finally:
+            conn.close()
+        # The session file is scanned outside the index lock; inserts are idempotent
+        rows, offset = extract(row[0] if row else 0)
+        memory_rel = self._relative_path(memory_path) if memory_path else None
+
+        with self._index_lock():
+            conn = self._connect()
+            try:
+                before = conn.total_changes
+                conn.executemany("""
+                    INSERT OR IGNORE INTO tool_activity
+                        (session_id, call_id, project, memory_path, tool, kind, target, alias, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(session_id, r["call_id"], project, memory_rel, r["tool"], r["kind"], r["target"], r["alias"],
+                       r["timestamp"]) for r in rows])
+                added = conn.total_changes - before
+                # Calls recorded under an earlier memory of the session move to the current one
+                conn.execute(
+                    "UPDATE tool_activity SET project = ?, memory_path = ? WHERE session_id = ? AND memory_path IS NOT ?",
+                    (project, memory_rel, session_id, memory_rel)
+                )
+                conn.execute("""
+                    INSERT INTO activity_offsets (session_id, offset) VALUES (?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET offset = excluded.offset
+                """, (session_id, offset))
+                conn.commit()
+            finally:
+                conn.close()
+            return added
+
+    def find_activity(self, kind: Optional[str] = None, value: Optional[str] = None, tool: Optional[str] = None,
+                      project: Optional[str] = None, limit: int = 500) -> list:
+        """Look up recorded tool calls, newest first.
+
+        Paths match exactly or as a directory prefix; commands, URLs,
+        queries and patterns match by prefix. Either the full target or its
+        alias may be given.
+
+        Args:
+            kind: "path", "command", "url", "query" or "pattern" (with value)
+            value: Path, command, URL, query or pattern to look for
+            tool: Only calls of this tool (e.g. "Edit")
+            project: Only sessions saved under this project
+            limit: Maximum number of calls returned
+
+        Returns:
+            List of dicts with 'session_id', 'project', 'memory_path',
+            'tool', 'kind', 'target', 'alias' and 'timestamp'
+        """
+        conditions = []
+        params = []
+        if kind and value:
+            if kind == "path":
+                # The path itself, or anything below it with either separator
+                value = value.rstrip("/\\") or value
+                terms = [("= ?", [value]), (">= ? AND {column} < ?", [value + "/", value + "0"]),
+                         (">= ? AND {column} < ?", [value + "\\", value + "]"])]
+            else:
+                terms = [(">= ? AND {column} < ?", [value, value + "\U0010ffff"])]
+            # Flat OR of (kind, column range) terms: one index range scan each
+            matches = []
+            for column in ("target", "alias"):
+                for term, bounds in terms:
+                    matches.append(f"(kind = ? AND {column} {term.format(column=column)})")
+                    params += [kind] + bounds
+            conditions.append(f"({' OR '.join(matches)})")
+        if tool:
+            conditions.append("tool = ?")
+            params.append(tool)
+        if project:
+            conditions.append("project = ?")
+            params.append(project)
+
+        where = " AND ".join(conditions) or "1 = 1"
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"""
+                SELECT session_id, project, memory_path, tool, kind, target, alias, timestamp
+                FROM tool_activity WHERE {where}
+                ORDER BY timestamp DESC LIMIT ?
+            """, params + [limit]).fetchall()
+        finally:
+            conn.close()
+        keys = ("session_id", "project", "memory_path", "tool", "kind", "target", "alias", "timestamp")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def index_paths(self, paths: list, removed: Optional[list] = None) -> dict:
+        """Index an explicit list of memory files, keeping the FTS table in sync row by row.
+
+        Unlike index(), this neither scans the memory directory nor rebuilds
+        the whole FTS table, so its cost does not grow with the archive.
+        Paths outside the memory directory or outside searchScope are skipped.
+
+        Args:
+            paths: Memory files that were written or updated
+            removed: Memory files that were deleted and should leave the index
+
+        Returns:
+            Dict with 'scanned', 'new', 'updated', 'removed' counts
+        """
+        with self._index_lock():
+            scanned = 0
+            new_indexed = 0
+            updated = 0
+            removed_count = 0
+
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            try:
+                self._next_seq(cursor)
+                if removed:
+                    removed_count = self._remove_paths(cursor, removed)
+
+                for path in paths:
+                    path = Path(path)
+                    rel_path = self._relative_path(path)
+                    if rel_path is None or not path.exists():
+                        continue
+
+                    parts = Path(rel_path).parts
+                    kind = "full" if len(parts) > 2 and parts[1] == "full" else "summary"
+                    self._catalog_upsert(cursor, path, rel_path, parts[0], kind)
+                    if not self._in_scope(kind):
+                        continue
+
                     scanned += 1
-                    rel_path = str(md_file.relative_to(self.memory_dir))
+                    cursor.execute("SELECT hash FROM files WHERE path = ?", (rel_path,))
+                    row = cursor.fetchone()
+                    existing_files = {rel_path: row[0]} if row else {}
 
-                    result = self._index_file(cursor, md_file, rel_path, project, existing_files, force)
+                    result = self._index_file(cursor, path, rel_path, parts[0], existing_files, False, sync_fts=True)
                     if result == "new":
                         new_indexed += 1
                     elif result == "updated":
                         updated += 1
 
-            # Index full files (in full/ directory)
-            if search_scope in ("full", "both"):
-                full_dir = project_dir / "full"
-                if full_dir.exists():
-                    for md_file in full_dir.glob("*.md"):
-                        scanned += 1
-                        rel_path = str(md_file.relative_to(self.memory_dir))
+                conn.commit()
+            finally:
+                conn.close()
 
-                        result = self._index_file(cursor, md_file, rel_path, project, existing_files, force)
-                        if result == "new":
-                            new_indexed += 1
-                        elif result == "updated":
-                            updated += 1
+            log.info("Indexed %d paths (new=%d, updated=%d, removed=%d)", scanned, new_indexed, updated, removed_count)
+            return {"scanned": scanned, "new": new_indexed, "updated": updated, "removed": removed_count}
 
-        # Rebuild FTS index
-        cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
+    def _in_scope(self, kind: str) -> bool:
+        """Check whether files of a kind ("summary" or "full") are indexed under searchScope."""
+        search_scope = self.memory_config.get("searchScope", "summary")
+        return search_scope == "both" or search_scope == kind
+
+    def sync_catalog(self) -> dict:
+        """Bring the catalog in line with the memory directory (without indexing).
+
+        Returns:
+            Dict with 'added', 'updated' and 'removed' counts
+        """
+        with self._index_lock():
+            conn = self._connect()
+            try:
+                _, changes = self._sync_catalog(conn.cursor())
+                conn.commit()
+            finally:
+                conn.close()
+            return changes
+
+    def changes_since(self, since: int) -> dict:
+        """List memory files changed and deleted after a change sequence watermark.
+
+        Returns:
+            Dict with 'watermark' (the current sequence, to pass as `since`
+            next time), 'files' and 'deleted' lists of (project, rel_path)
+        """
+        conn = self._connect()
+        try:
+            watermark = conn.execute("SELECT value FROM sync_state WHERE key = 'seq'").fetchone()[0]
+            files = conn.execute(
+                "SELECT project, path FROM catalog WHERE seq > ? AND seq <= ? ORDER BY project, kind DESC, path",
+                (since, watermark)
+            ).fetchall()
+            deleted = conn.execute(
+                "SELECT project, path FROM tombstones WHERE seq > ? AND seq <= ? ORDER BY project, path",
+                (since, watermark)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {"watermark": watermark, "files": files, "deleted": deleted}
 
-        conn.commit()
+    def get_sync_value(self, key: str) -> Optional[int]:
+        """Read a value from the sync state table (e.g. the last export watermark)."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
 
-        # Get total chunks
-        cursor.execute("SELECT COUNT(*) FROM chunks")
-        total_chunks = cursor.fetchone()[0]
+    def set_sync_value(self, key: str, value: int):
+        """Store a value in the sync state table."""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                INSERT INTO sync_state (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (key, value))
+            conn.commit()
+        finally:
+            conn.close()
 
-        conn.close()
+    def touch_paths(self, rel_paths: list):
+        """Stamp catalog rows with a new change sequence, as if their files had just changed."""
+        if not rel_paths:
+            return
+        with self._index_lock():
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                seq = self._next_seq(cursor)
+                cursor.execute(f"UPDATE catalog SET seq = ? WHERE path IN ({','.join('?' * len(rel_paths))})",
+                               [seq] + list(rel_paths))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def known_hashes(self) -> dict:
+        """Map content hashes of stored memory files to their relative paths."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("""
+                SELECT hash, path FROM catalog WHERE hash IS NOT NULL
+                UNION
+                SELECT f.hash, f.path FROM files f JOIN catalog c ON c.path = f.path
+            """).fetchall()
+        finally:
+            conn.close()
+
+        known = {}
+        for file_hash, rel_path in rows:
+            known.setdefault(file_hash, set()).add(rel_path)
+        return known
+
+    def import_batch(self, files: list, deleted: list) -> dict:
+        """Apply one batch of imported files and deletions in a single transaction.
+
+        The files must already be written to disk. Their catalog rows are
+        upserted and, within searchScope, they are indexed from the content
+        passed in, with FTS rows added incrementally.
+
+        Args:
+            files: Dicts with 'path', 'rel_path', 'project', 'kind', 'content' and 'hash'
+            deleted: Paths of memory files that were deleted
+
+        Returns:
+            Dict with 'indexed' and 'removed' counts
+        """
+        with self._index_lock():
+            indexed = 0
+            conn = self._connect()
+            cursor = conn.cursor()
+            try:
+                self._next_seq(cursor)
+                removed = self._remove_paths(cursor, deleted) if deleted else 0
+
+                for item in files:
+                    self._catalog_upsert(cursor, item["path"], item["rel_path"], item["project"], item["kind"],
+                                         file_hash=item["hash"], content=item["content"])
+                    if not self._in_scope(item["kind"]):
+                        continue
+                    cursor.execute("SELECT hash FROM files WHERE path = ?", (item["rel_path"],))
+                    row = cursor.fetchone()
+                    existing_files = {item["rel_path"]: row[0]} if row else {}
+                    if self._index_file(cursor, item["path"], item["rel_path"], item["project"], existing_files, False,
+                                        sync_fts=True, content=item["content"]) != "skip":
+                        indexed += 1
+
+                conn.commit()
+            finally:
+                conn.close()
+
+            return {"indexed": indexed, "removed": removed}
+
+    def _relative_path(self, path) -> Optional[str]:
+        """Get a memory file's path relative to the memory directory, as stored in the index."""
+        try:
+            return str(Path(path).relative_to(self.memory_dir))
+        except ValueError:
+            log.debug("Not under the memory directory, skipping: %s", path)
+            return None
+
+    def _delete_fts_rows(self, cursor, rel_path: str):
+        """Remove the FTS entries of a file's current chunks (given the indexed values)."""
+        self._forget_fts_rows(cursor, "file_path = ?", (rel_path,))
+
+    def _forget_fts_rows(self, cursor, where: str, params):
+        """Remove the FTS entries of the chunks matching a WHERE clause, before the chunks go.
+
+        FTS5 deletes need the indexed text. Chunks stored by reference may no
+        longer have it on disk (the file was rewritten or deleted), so their
+        entries stay behind and are counted as stale. They cannot match a
+        later chunk, since rowids of chunks stored by reference are never
+        reused, and leave with the next rebuild.
+        """
+        cursor.execute(f"""
+            INSERT INTO chunks_fts(chunks_fts, rowid, content, id, file_path)
+            SELECT 'delete', rowid, {self._fts_text(cursor)}, id, file_path FROM chunks
+            WHERE ({where}) AND byte_start IS NULL
+        """, params)
+        cursor.execute(f"SELECT COUNT(*) FROM chunks WHERE ({where}) AND byte_start IS NOT NULL", params)
+        stale = cursor.fetchone()[0]
+        if stale:
+            self._set_counter(cursor, "fts_stale", self._counter(cursor, "fts_stale") + stale)
+
+    def remove_paths(self, paths: list, batch_size: int = 500) -> int:
+        """Drop deleted memory files from the catalog and index, in batched transactions.
+
+        Each batch deletes its FTS entries, chunks, file records and catalog
+        rows with set-based statements and commits, so the cost follows the
+        number of files removed rather than the size of the archive.
+
+        Returns:
+            Number of files that had index rows
+        """
+        with self._index_lock():
+            removed = 0
+            conn = self._connect()
+            cursor = conn.cursor()
+            try:
+                for start in range(0, len(paths), batch_size):
+                    self._next_seq(cursor)
+                    removed += self._remove_paths(cursor, paths[start:start + batch_size])
+                    conn.commit()
+            finally:
+                conn.close()
+
+            log.info("Removed %d files from the catalog and index", len(paths))
+            return removed
+
+    def _remove_paths(self, cursor, paths: list) -> int:
+        """Delete one batch of files from the catalog and index (no commit)."""
+        rel_paths = [rel for rel in (self._relative_path(path) for path in paths) if rel]
+        if not rel_paths:
+            return 0
+        placeholders = ",".join("?" * len(rel_paths))
+
+        self._forget_fts_rows(cursor, f"file_path IN ({placeholders})", rel_paths)
+        cursor.execute(f"DELETE FROM chunks WHERE file_path IN ({placeholders})", rel_paths)
+        cursor.execute(f"DELETE FROM files WHERE path IN ({placeholders})", rel_paths)
+        removed = cursor.rowcount
+        cursor.execute(f"DELETE FROM catalog WHERE path IN ({placeholders})", rel_paths)
+        return removed
+
+    def select_cleanup(self, days: Optional[int] = None, max_total_bytes: Optional[int] = None,
+                       max_project_bytes: Optional[int] = None, by_search: bool = False,
+                       project: Optional[str] = None) -> list:
+        """Pick memories to delete from the catalog, without touching the disk.
+
+        A memory is a summary file together with its full transcript(s).
+        Memories older than `days` go first; then, if a project or the whole
+        archive is over its size quota, the least valuable memories are
+        added until it fits. With by_search, value is the last time the
+        memory came up in a search (or was written, if it never did);
+        otherwise it is the modification time.
+
+        Args:
+            days: Delete memories not modified for this many days
+            max_total_bytes: Size quota for the whole archive
+            max_project_bytes: Size quota for each project
+            by_search: Evict least-recently-searched memories first under quota
+            project: Only consider this project
+
+        Returns:
+            List of dicts with 'project', 'name', 'bytes', 'mtime' and
+            'paths' (absolute paths of its files), oldest first
+        """
+        rank = "MAX(mtime, IFNULL(last_hit, 0))" if by_search else "mtime"
+        filters = []
+        params = []
+        if project:
+            filters.append("project = ?")
+            params.append(project)
+        cutoff = time.time() - days * 24 * 60 * 60 if days else None
+        if cutoff is not None and max_project_bytes is None and max_total_bytes is None:
+            # Age alone: only memories with an old file need grouping
+            filters.append("""(project, name) IN (
+                SELECT project, name FROM catalog WHERE kind IN ('summary', 'full') AND mtime < ?)""")
+            params.append(cutoff)
+        project_filter = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+        # A memory whose summary is gone is as old as its newest full file
+        memories = f"""
+            SELECT project, name, SUM(size) AS bytes,
+                   IFNULL(MAX(CASE WHEN kind = 'summary' THEN mtime END), MAX(mtime)) AS mtime,
+                   MAX({rank}) AS rank, GROUP_CONCAT(path, char(31)) AS paths
+            FROM catalog {project_filter}
+            GROUP BY project, name
+        """
+        if cutoff is not None:
+            aged = "mtime < ?"
+            params.append(cutoff)
+        else:
+            aged = "0"
+        # Running totals of the memories the age limit keeps, from the most
+        # valuable down; whatever overflows the quota goes too
+        conditions = ["aged"] if cutoff is not None else []
+        if max_project_bytes is not None:
+            conditions.append("kept_project > ?")
+            params.append(max_project_bytes)
+        if max_total_bytes is not None:
+            conditions.append("kept_total > ?")
+            params.append(max_total_bytes)
+        if not conditions:
+            return []
 
-        return {
-            "scanned": scanned,
-            "new": new_indexed,
-            "updated": updated,
-            "chunks": total_chunks
-        }
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"""
+                SELECT project, name, bytes, mtime, paths FROM (
+                    SELECT *,
+                        SUM(CASE WHEN aged THEN 0 ELSE bytes END)
+                            OVER (PARTITION BY project ORDER BY rank DESC, name DESC
+                                  ROWS UNBOUNDED PRECEDING) AS kept_project,
+                        SUM(CASE WHEN aged THEN 0 ELSE bytes END)
+                            OVER (ORDER BY rank DESC, project DESC, name DESC
+                                  ROWS UNBOUNDED PRECEDING) AS kept_total
+                    FROM (SELECT *, {aged} AS aged FROM ({memories}))
+                )
+                WHERE {" OR ".join(conditions)}
+                ORDER BY rank, project, name
+            """, params).fetchall()
+        finally:
+            conn.close()
 
-    def _index_file(self, cursor, md_file: Path, rel_path: str, project: str, existing_files: dict, force: bool) -> str:
-        """Index a single file. Returns 'new', 'updated', or 'skip'."""
-        # Read file content
-        with open(md_file, "r", encoding="utf-8") as f:
-            content = f.read()
+        return [{
+            "project": row[0],
+            "name": row[1],
+            "bytes": row[2],
+            "mtime": row[3],
+            "paths": [self.memory_dir / rel for rel in row[4].split(chr(31))],
+        } for row in rows]
+
+    def _remove_indexed_file(self, cursor, rel_path: str) -> bool:
+        """Drop a file and its chunks from the index. Returns True if it was indexed."""
+        self._delete_fts_rows(cursor, rel_path)
+        cursor.execute("DELETE FROM chunks WHERE file_path = ?", (rel_path,))
+        cursor.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+        return cursor.rowcount > 0
+
+    def _index_file(self, cursor, md_file: Path, rel_path: str, project: str, existing_files: dict, force: bool,
+                    sync_fts: bool = False, content: Optional[str] = None) -> str:
+        """Index a single file. Returns 'new', 'updated', or 'skip'.
+
+        With sync_fts, the file's FTS rows are replaced as well; otherwise the
+        caller rebuilds the FTS table afterwards. Content that is already in
+        memory can be passed in to skip reading the file again.
+
+        With chunks stored by reference, a plain file whose bytes are exactly
+        the indexed text gets byte ranges instead of stored text; compressed
+        files, files with stripped blob previews and CRLF files stay inline.
+        """
+        by_reference = self._current_layout(cursor)[1] == "reference"
+        raw = None
+
+        # Read file content (full transcripts may be compressed)
+        if by_reference and codec_for_path(md_file) == "none":
+            raw = Path(md_file).read_bytes()
+            if content is None:
+                content = raw.decode("utf-8")
+                if "\r" in content:
+                    # Text mode translates newlines, as every other reader does
+                    content = read_memory_text(md_file)
+        elif content is None:
+            content = read_memory_text(md_file)
 
         file_hash = self._compute_hash(content)
 
+        # The catalog keeps content hashes too (import skips known content)
+        cursor.execute("UPDATE catalog SET hash = ? WHERE path = ? AND hash IS NOT ?", (file_hash, rel_path, file_hash))
+
+        # Blob contents are never inlined; by default their previews are not indexed either
+        if not self.config.get("search", {}).get("indexBlobPreviews", False):
+            content = strip_blob_previews(content)
+
+        if raw is not None and raw != content.encode("utf-8"):
+            raw = None
+
         # Check if file needs indexing
         if not force and rel_path in existing_files:
             if existing_files[rel_path] == file_hash:
+                profiler.count("index.unchanged")
                 return "skip"
             result = "updated"
         else:
             result = "new"
 
+        profiler.count(f"index.{result}")
+
         # Remove old chunks
+        if sync_fts:
+            self._delete_fts_rows(cursor, rel_path)
         cursor.execute("DELETE FROM chunks WHERE file_path = ?", (rel_path,))
 
-        # Update file record
+        # Update file record (an upsert, so the files triggers see one insert per file)
         cursor.execute("""
-            INSERT OR REPLACE INTO files (path, project, hash, created_at)
+            INSERT INTO files (path, project, hash, created_at)
             VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT(path) DO UPDATE SET
+                project = excluded.project, hash = excluded.hash, created_at = excluded.created_at
         """, (rel_path, project, file_hash))
 
         # Chunk and index content
         chunks = self._chunk_content(content)
-        for chunk in chunks:
+        ranges = locate_chunks(raw, chunks) if raw is not None else [(None, None, None)] * len(chunks)
+        next_rowid = self._allocate_rowids(cursor, len(chunks)) if by_reference else None
+        fts_rows = []
+        for chunk, (byte_start, byte_end, digest) in zip(chunks, ranges):
             chunk_id = f"{rel_path}:{chunk['start_line']}-{chunk['end_line']}"
             cursor.execute("""
-                INSERT INTO chunks (id, file_path, start_line, end_line, content)
-                VALUES (?, ?, ?, ?, ?)
-            """, (chunk_id, rel_path, chunk["start_line"], chunk["end_line"], chunk["content"]))
+                INSERT INTO chunks (rowid, id, file_path, start_line, end_line, content, byte_start, byte_end, chunk_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (next_rowid, chunk_id, rel_path, chunk["start_line"], chunk["end_line"],
+                  "" if byte_start is not None else chunk["content"], byte_start, byte_end, digest))
+            rowid = cursor.lastrowid
+            if next_rowid is not None:
+                next_rowid += 1
+            fts_rows.append((rowid, chunk["content"], chunk_id, rel_path))
+            if self.dedup_threshold > 0:
+                self._cluster_chunk(cursor, rowid, chunk["content"])
+
+        if sync_fts:
+            cursor.executemany(
+                "INSERT INTO chunks_fts(rowid, content, id, file_path) VALUES (?, ?, ?, ?)",
+                self._fts_rows(cursor, fts_rows)
+            )
 
         return result
 
-    def search(self, query: str, limit: int = 6, project: Optional[str] = None, threshold: float = 0.35) -> list:
-        """Search memories using Claude API for semantic matching."""
-        conn = sqlite3.connect(self.db_path)
+    def _allocate_rowids(self, cursor, count: int) -> int:
+        """Reserve `count` consecutive chunk rowids that were never used before.
+
+        Stale FTS entries of removed chunks stored by reference keep their
+        rowids, so a new chunk must not take one over.
+        """
+        cursor.execute("SELECT IFNULL(MAX(rowid), 0) FROM chunks")
+        first = max(cursor.fetchone()[0], self._counter(cursor, "chunk_rowid")) + 1
+        self._set_counter(cursor, "chunk_rowid", first + count - 1)
+        return first
+
+    def _cluster_chunk(self, cursor, rowid: int, content: str) -> bool:
+        """Sign an indexed chunk and join the cluster of its closest near-duplicate.
+
+        Candidates come from the LSH buckets of the signature; the best one
+        at or above the similarity threshold gives its cluster. A chunk
+        without a match keeps cluster NULL and is its own representative.
+
+        Returns:
+            True if the chunk joined an existing cluster
+        """
+        sig = signature(content)
+        keys = band_keys(sig)
+
+        candidates = set()
+        for band, key in keys:
+            cursor.execute(
+                "SELECT chunk_rowid FROM chunk_lsh WHERE band = ? AND key = ? LIMIT ?",
+                (band, key, MAX_LSH_CANDIDATES)
+            )
+            candidates.update(row[0] for row in cursor.fetchall())
+        candidates.discard(rowid)
+
+        cluster = None
+        best = self.dedup_threshold
+        if candidates:
+            cursor.execute(f"""
+                SELECT minhash, IFNULL(cluster, rowid) FROM chunks
+                WHERE rowid IN ({','.join('?' * len(candidates))}) ORDER BY rowid
+            """, sorted(candidates))
+            for other_sig, other_cluster in cursor.fetchall():
+                score = similarity(sig, other_sig)
+                if score >= best:
+                    best, cluster = score, other_cluster
+
+        cursor.execute("UPDATE chunks SET minhash = ?, cluster = ? WHERE rowid = ?", (sig, cluster, rowid))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO chunk_lsh (band, key, chunk_rowid) VALUES (?, ?, ?)",
+            [(band, key, rowid) for band, key in keys]
+        )
+        return cluster is not None
+
+    def _cluster_unsigned(self, cursor) -> int:
+        """Cluster indexed chunks that have no signature yet (older archives, dedup newly enabled)."""
+        cursor.execute("""
+            SELECT rowid, content, file_path, byte_start, byte_end, chunk_hash FROM chunks
+            WHERE minhash IS NULL ORDER BY rowid
+        """)
+        rows = cursor.fetchall()
+        texts = read_chunk_texts(self.memory_dir, [(row[0], *row[2:]) for row in rows if row[3] is not None])
+        signed = 0
+        for rowid, content, _, byte_start, _, _ in rows:
+            if byte_start is not None:
+                content = texts.get(rowid)
+                if content is None:
+                    continue
+            self._cluster_chunk(cursor, rowid, content)
+            signed += 1
+        return signed
+
+    def _near_duplicate_stats(self, cursor) -> dict:
+        """Count the chunks that search skips as near-duplicates of another chunk.
+
+        Text sizes are in characters, or bytes for chunks stored by reference.
+        """
+        cursor.execute("""
+            SELECT COUNT(*), IFNULL(SUM(IFNULL(byte_end - byte_start, LENGTH(content))), 0),
+                   IFNULL(SUM(CASE WHEN cluster IS NOT NULL THEN 1 END), 0),
+                   IFNULL(SUM(CASE WHEN cluster IS NOT NULL THEN IFNULL(byte_end - byte_start, LENGTH(content)) END), 0)
+            FROM chunks
+        """)
+        chunks, chars, duplicates, duplicate_chars = cursor.fetchone()
+        return {"chunks": chunks, "chars": chars, "duplicates": duplicates, "duplicate_chars": duplicate_chars}
+
+    def search(self, query: str, limit: int = 6, project: Optional[str] = None, threshold: float = 0.35,
+               skip_blobs: bool = False, fts_only: bool = False) -> list:
+        """Search memories using Claude API for semantic matching.
+
+        Args:
+            skip_blobs: Leave out chunks that reference blob-stored tool results
+            fts_only: Skip the Claude API and rank by full-text match only
+        """
+        conn = self._connect()
         cursor = conn.cursor()
 
-        # Get all chunks (optionally filtered by project)
-        if project:
-            cursor.execute("""
-                SELECT c.id, c.file_path, c.start_line, c.end_line, c.content
-                FROM chunks c
-                JOIN files f ON c.file_path = f.path
-                WHERE f.project = ?
-            """, (project,))
-        else:
-            cursor.execute("""
-                SELECT id, file_path, start_line, end_line, content
-                FROM chunks
-            """)
+        blob_filter = " AND c.content NOT LIKE '%[blob sha256:%'" if skip_blobs else ""
+
+        # Without the API only the best FTS matches are needed, not every chunk
+        if fts_only or not HAS_ANTHROPIC:
+            try:
+                with profiler.span("fts_search"):
+                    results = self._fts_search(cursor, query, limit, project, blob_filter)
+                profiler.count("search.results", len(results))
+                self._record_hits(conn, results)
+                return results
+            finally:
+                conn.close()
+
+        # Get all chunks (optionally filtered by project), newest first so
+        # that the latest copy of near-duplicate chunks represents them
+        with profiler.span("load_candidates"):
+            if project:
+                cursor.execute(f"""
+                    SELECT c.id, c.file_path, c.start_line, c.end_line, c.content, IFNULL(c.cluster, c.rowid),
+                           c.byte_start, c.byte_end, c.chunk_hash
+                    FROM chunks c
+                    JOIN files f ON c.file_path = f.path
+                    WHERE f.project = ?{blob_filter}
+                    ORDER BY c.rowid DESC
+                """, (project,))
+            else:
+                cursor.execute(f"""
+                    SELECT c.id, c.file_path, c.start_line, c.end_line, c.content, IFNULL(c.cluster, c.rowid),
+                           c.byte_start, c.byte_end, c.chunk_hash
+                    FROM chunks c
+                    WHERE 1 = 1{blob_filter}
+                    ORDER BY c.rowid DESC
+                """)
 
-        chunks = cursor.fetchall()
+            chunks = cursor.fetchall()
+        profiler.count("search.candidates", len(chunks))
 
         if not chunks:
             conn.close()
@@ -288,71 +1657,204 @@ class SearchEngine:
 
         # Also do FTS search for hybrid results
         fts_scores = {}
-        try:
-            cursor.execute("""
-                SELECT id, bm25(chunks_fts) as score
-                FROM chunks_fts
-                WHERE chunks_fts MATCH ?
-                ORDER BY score
-                LIMIT ?
-            """, (query, limit * 2))
-            for row in cursor.fetchall():
-                # BM25 returns negative scores, lower is better
-                fts_scores[row[0]] = -row[1]
-        except Exception as e:
-            log.debug("FTS search failed (may need indexing): %s", e)
+        with profiler.span("fts_search"):
+            try:
+                cursor.execute("""
+                    SELECT c.id, bm25(chunks_fts) as score
+                    FROM chunks_fts
+                    JOIN chunks c ON c.rowid = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ?
+                    ORDER BY score
+                    LIMIT ?
+                """, (self._match_query(cursor, query), limit * 2))
+                for row in cursor.fetchall():
+                    # BM25 returns negative scores, lower is better
+                    fts_scores[row[0]] = -row[1]
+            except Exception as e:
+                log.debug("FTS search failed (may need indexing): %s", e)
+        profiler.count("search.fts_matches", len(fts_scores))
 
         conn.close()
 
+        if self.dedup_threshold > 0:
+            chunks = self._drop_near_duplicates(chunks, fts_scores)
+
+        # Only the reranked window and the FTS matches are ever read
+        with profiler.span("load_texts"):
+            chunks = self._load_texts(chunks, RERANK_CANDIDATES, skip_blobs, fts_scores)
+
         # Use Claude API for semantic search
-        if HAS_ANTHROPIC and chunks:
+        with profiler.span("semantic_search"):
             results = self._semantic_search(query, chunks, fts_scores, limit, threshold)
-        else:
-            # Fallback to FTS only
-            results = []
-            for chunk_id, score in sorted(fts_scores.items(), key=lambda x: -x[1])[:limit]:
-                for chunk in chunks:
-                    if chunk[0] == chunk_id:
-                        results.append({
-                            "file": chunk[1],
-                            "lines": f"{chunk[2]}-{chunk[3]}",
-                            "score": min(score / 10, 1.0),  # Normalize
-                            "excerpt": chunk[4][:200]
-                        })
-                        break
-
+        profiler.count("search.results", len(results))
+        conn = self._connect()
+        try:
+            self._record_hits(conn, results)
+        finally:
+            conn.close()
         return results
 
+    def _drop_near_duplicates(self, chunks: list, fts_scores: dict) -> list:
+        """Keep the first chunk of each near-duplicate cluster.
+
+        A dropped chunk's FTS score carries over to the chunk kept for its
+        cluster, so a match in any copy still counts.
+        """
+        kept = {}
+        result = []
+        skipped = skipped_in_window = tokens_in_window = 0
+        for i, chunk in enumerate(chunks):
+            representative = kept.get(chunk[5])
+            if representative is None:
+                kept[chunk[5]] = chunk[0]
+                result.append(chunk)
+                continue
+            skipped += 1
+            if i < RERANK_CANDIDATES:
+                skipped_in_window += 1
+                if chunk[6] is None:
+                    tokens_in_window += estimate_tokens(chunk[4][:500])
+                else:
+                    # Not read from disk; about 4 bytes per token
+                    tokens_in_window += min(chunk[7] - chunk[6], 2000) // 4
+            if chunk[0] in fts_scores:
+                fts_scores[representative] = max(fts_scores.get(representative, 0), fts_scores[chunk[0]])
+
+        profiler.count("search.near_duplicates", skipped)
+        # Rerank slots that would have gone to copies, and their prompt tokens
+        profiler.count("search.rerank_duplicates_avoided", skipped_in_window)
+        profiler.count("search.rerank_tokens_avoided", tokens_in_window)
+        return result
+
+    def _load_texts(self, chunks: list, limit: int, skip_blobs: bool, wanted=()) -> list:
+        """Fill in the text of the first `limit` usable chunks, and of chunks whose id is in `wanted`.
+
+        Chunks stored by reference are read from their files through mmap;
+        those whose file changed since indexing are left out, as are chunks
+        referencing blobs when skip_blobs is set (the SQL filter only sees
+        inline text). Other chunks past the limit are dropped.
+
+        Args:
+            chunks: Rows of (id, file_path, start_line, end_line, content,
+                cluster, byte_start, byte_end, chunk_hash, ...)
+        """
+        selected = []
+        position = 0
+        # Skipped chunks make room for the next ones
+        while position < len(chunks) and len(selected) < limit:
+            batch = chunks[position:position + limit - len(selected)]
+            position += len(batch)
+            selected += self._with_texts(batch, skip_blobs)
+        # FTS matches past the window still count when reranking fails
+        selected += self._with_texts([chunk for chunk in chunks[position:] if chunk[0] in wanted], skip_blobs)
+        return selected
+
+    def _with_texts(self, chunks: list, skip_blobs: bool) -> list:
+        """Put the text of each chunk in place of its stored content (see _load_texts)."""
+        refs = [(chunk[0], chunk[1], chunk[6], chunk[7], chunk[8]) for chunk in chunks if chunk[6] is not None]
+        texts = read_chunk_texts(self.memory_dir, refs) if refs else {}
+        profiler.count("search.texts_read", len(refs))
+        result = []
+        for chunk in chunks:
+            text = chunk[4] if chunk[6] is None else texts.get(chunk[0])
+            if text is None or (skip_blobs and BLOB_REF_MARKER in text):
+                continue
+            result.append(chunk[:4] + (text,) + chunk[5:])
+        return result
+
+    def _record_hits(self, conn, results: list):
+        """Remember when files last came up in a search (for least-recently-searched cleanup)."""
+        files = sorted({result["file"] for result in results})
+        if not files:
+            return
+        try:
+            conn.execute(
+                f"UPDATE catalog SET last_hit = ? WHERE path IN ({','.join('?' * len(files))})",
+                [time.time()] + files
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            # A busy database must not fail the search itself
+            log.debug("Could not record search hits: %s", e)
+
+    def _fts_search(self, cursor, query: str, limit: int, project: Optional[str], blob_filter: str) -> list:
+        """Rank chunks by BM25 inside SQLite and fetch only the top matches."""
+        project_join = "JOIN files f ON c.file_path = f.path" if project else ""
+        project_filter = " AND f.project = ?" if project else ""
+        # Fetch extra matches so that dropping near-duplicates (or chunks whose
+        # file changed since indexing) still leaves `limit`
+        by_reference = self._current_layout(cursor)[1] == "reference"
+        fetch = limit * 4 if self.dedup_threshold > 0 or by_reference else limit
+        match = self._match_query(cursor, query)
+        params = (match, project, fetch) if project else (match, fetch)
+
+        try:
+            cursor.execute(f"""
+                SELECT c.id, c.file_path, c.start_line, c.end_line, c.content, IFNULL(c.cluster, c.rowid),
+                       c.byte_start, c.byte_end, c.chunk_hash, bm25(chunks_fts) AS score
+                FROM chunks_fts
+                JOIN chunks c ON c.rowid = chunks_fts.rowid
+                {project_join}
+                WHERE chunks_fts MATCH ?{project_filter}{blob_filter}
+                ORDER BY score
+                LIMIT ?
+            """, params)
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            log.debug("FTS search failed (may need indexing): %s", e)
+            return []
+
+        # Keep the best match of each near-duplicate cluster
+        if self.dedup_threshold > 0:
+            clusters = set()
+            unique = []
+            for row in rows:
+                if row[5] not in clusters:
+                    clusters.add(row[5])
+                    unique.append(row)
+            profiler.count("search.near_duplicates", len(rows) - len(unique))
+            rows = unique
+
+        # Excerpts of chunks stored by reference are read for the top results only
+        rows = self._load_texts(rows, limit, bool(blob_filter))
+
+        # BM25 returns negative scores, lower is better
+        return [{
+            "file": row[1],
+            "lines": f"{row[2]}-{row[3]}",
+            "score": min(-row[9] / 10, 1.0),  # Normalize
+            "excerpt": row[4][:200]
+        } for row in rows]
+
     def _semantic_search(self, query: str, chunks: list, fts_scores: dict, limit: int, threshold: float) -> list:
         """Use Claude API for semantic search."""
         try:
             model = get_model(self.model_config)
-            client = anthropic.Anthropic()
+            client = get_anthropic_client()
 
             # Prepare chunks for evaluation (limit to avoid token limits)
-            eval_chunks = chunks[:50]  # Evaluate top 50 chunks
+            eval_chunks = chunks[:RERANK_CANDIDATES]
 
             # Build prompt
             chunk_texts = []
             for i, chunk in enumerate(eval_chunks):
                 chunk_texts.append(f"[{i}] {chunk[4][:500]}")
 
-            prompt = f"""Rate the relevance of each text chunk to the query on a scale of 0-100.
-Only output a JSON array of scores in the same order as the chunks.
-
-Query: {query}
-
-Chunks:
-{chr(10).join(chunk_texts)}
-
-Output format: [score1, score2, ...]
-Scores:"""
-
-            response = client.messages.create(
-                model=model,
-                max_tokens=500,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            profiler.count("search.evaluated", len(eval_chunks))
+            with profiler.span("api.rerank"):
+                response = client.messages.create(
+                    model=model,
+                    max_tokens=500,
+                    # Instructions, then the candidate chunks, then the query: the
+                    # breakpoint after the chunks caches both, so repeating a search
+                    # over the same candidates only sends the query uncached
+                    system=RERANK_INSTRUCTIONS,
+                    messages=[{"role": "user", "content": [
+                        cached_block(f"Chunks:\n{chr(10).join(chunk_texts)}"),
+                        {"type": "text", "text": f"Query: {query}\n\nScores:"},
+                    ]}]
+                )
+            profiler.record_usage("rerank", response)
 
             # Parse scores
             scores_text = response.content[0].text.strip()
@@ -4,26 +4,57 @@ Claudememv2 Session Parser
 Parses Claude Code session files and saves to memory
 """
 
+import base64
+import binascii
 import json
 import os
 import re
 import hashlib
+import shutil
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
-# Try to import anthropic for slug generation
-try:
-    import anthropic
-    HAS_ANTHROPIC = True
-except ImportError:
-    HAS_ANTHROPIC = False
-
+from blob_store import BLOB_PREVIEW_END, BLOB_PREVIEW_START, BlobStore, format_blob_ref
 from logger import setup_logger
-from utils import get_home_dir, get_model
+from models import Message, ToolCall, ToolResult, ToolSummary, message_from_dict
+from profiler import profiler
+from session_state import CheckpointStore, SessionCatalog, SessionRegistry
+from storage import find_full_files, full_file_name, open_memory_writer, resolve_codec
+from utils import atomic_write_text, file_lock, get_anthropic_client, get_home_dir, get_model, has_anthropic
+
+# anthropic is imported lazily, only when the API is actually called
+HAS_ANTHROPIC = has_anthropic()
 
 log = setup_logger("claudememv2.parser")
 
+# How long a save waits for another process saving the same session
+SESSION_LOCK_TIMEOUT = 300
+
+# Session record fields holding the last summary, for incremental updates
+SUMMARY_STATE_KEYS = ("summary", "summary_digests", "summary_signature")
+
+# Tool input field recorded in the activity index, and the kind of target it is
+TOOL_TARGETS = {
+    "Read": ("path", "file_path"),
+    "Write": ("path", "file_path"),
+    "Edit": ("path", "file_path"),
+    "MultiEdit": ("path", "file_path"),
+    "NotebookRead": ("path", "notebook_path"),
+    "NotebookEdit": ("path", "notebook_path"),
+    "Bash": ("command", "command"),
+    "WebFetch": ("url", "url"),
+    "WebSearch": ("query", "query"),
+    "Grep": ("pattern", "pattern"),
+    "Glob": ("pattern", "pattern"),
+}
+# Longer targets (heredoc commands) are cut; lookups match by prefix anyway
+MAX_ACTIVITY_TARGET = 500
+
+_LEADING_CD = re.compile(r"^(?:cd\s+(?:\"[^\"]*\"|'[^']*'|\S+)\s*&&\s*)+")
+_URL_SCHEME = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://(?:www\.)?")
+
 
 class SessionParser:
     """Parse Claude Code sessions and save to memory."""
@@ -38,6 +69,12 @@ class SessionParser:
         self.data_dir = Path(data_dir).expanduser()
         self.memory_dir = self.data_dir / "memory"
 
+        # Parse checkpoints for incremental re-saves
+        self.checkpoints = CheckpointStore(self.data_dir)
+        self.session_catalog = SessionCatalog(self.data_dir)
+        self.sessions = SessionRegistry(self.data_dir)
+        self.blobs = BlobStore(self.data_dir)
+
     def get_claude_projects_dir(self) -> Path:
         """Get Claude Code projects directory."""
         return get_home_dir() / ".claude" / "projects"
@@ -57,134 +94,167 @@ class SessionParser:
         working_path = Path(working_dir).resolve()
         expected_project_name = str(working_path).replace(os.sep, "-")
 
-        # Search for matching project first
-        latest_session = None
-        latest_time = 0
-        matched_session = None
-        matched_time = 0
-
-        for project_dir in projects_dir.iterdir():
-            if not project_dir.is_dir():
-                continue
-
-            is_match = project_dir.name == expected_project_name
-
-            for session_file in project_dir.glob("*.jsonl"):
-                mtime = session_file.stat().st_mtime
-
-                if is_match and mtime > matched_time:
-                    matched_time = mtime
-                    matched_session = session_file
+        # Direct lookup: the project directory for the working directory is known
+        matched_session, _ = SessionCatalog.latest_in_dir(projects_dir / expected_project_name)
+        if matched_session:
+            return Path(matched_session)
+
+        # Fallback to the global latest session across all project directories
+        return self.session_catalog.latest_session(projects_dir)
+
+    def _parser_signature(self, mode: str) -> str:
+        """Hash of the settings that shape parsed messages, used to validate checkpoints."""
+        settings = {
+            "mode": mode,
+            "contentScope": self.memory_config.get("contentScope", "standard"),
+            "includeThinking": self.memory_config.get("includeThinking", False),
+            "includeToolCalls": self.memory_config.get("includeToolCalls", True),
+            "maxMessages": self.memory_config.get("maxMessages", 25),
+        }
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
 
-                if mtime > latest_time:
-                    latest_time = mtime
-                    latest_session = session_file
+    def _load_checkpoint(self, session_path: Path, mode: str) -> Optional[dict]:
+        """Load the parse checkpoint for a session, if checkpoints are enabled."""
+        if not self.memory_config.get("checkpoints", True):
+            return None
+        checkpoint = self.checkpoints.load(session_path, mode, self._parser_signature(mode))
+        profiler.count(f"cache.checkpoint.{'hit' if checkpoint else 'miss'}")
+        return checkpoint
+
+    def _save_checkpoint(self, session_path: Path, mode: str, offset: int, state: dict):
+        """Persist the parse checkpoint for a session, if checkpoints are enabled."""
+        if not self.memory_config.get("checkpoints", True):
+            return
+        self.checkpoints.save(session_path, mode, self._parser_signature(mode), offset, state)
+
+    def _iter_session_entries(self, session_path: Path, offset: int = 0):
+        """Iterate over complete JSONL lines of a session file, starting at a byte offset.
+
+        Yields:
+            (entry, end_offset) tuples, where entry is None for blank or malformed
+            lines and end_offset is the byte offset just past the line. A trailing
+            line that is still being written is left for the next parse.
+        """
+        # Counted per pass and logged once, so the loop itself never logs
+        lines = 0
+        malformed = 0
+        try:
+            with open(session_path, "rb") as f:
+                f.seek(offset)
+                for raw in f:
+                    complete = raw.endswith(b"\n")
+                    line = raw.strip()
+
+                    if not line:
+                        if complete:
+                            offset += len(raw)
+                            yield None, offset
+                        continue
 
-        # Return matched project session if found, otherwise fallback to global latest
-        return matched_session if matched_session else latest_session
+                    try:
+                        entry = json.loads(line.decode("utf-8"))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        if not complete:
+                            break
+                        malformed += 1
+                        entry = None
+
+                    lines += 1
+                    offset += len(raw)
+                    yield entry, offset
+        finally:
+            profiler.count("parse.lines", lines)
+            profiler.count("parse.malformed_lines", malformed)
+            if malformed:
+                log.info("Skipped %d malformed JSON lines of %d in session file: %s", malformed, lines, session_path)
+
+    def parse_session_file(self, session_path: Path, resume: bool = False) -> list:
+        """Parse a session JSONL file and extract messages.
 
-    def parse_session_file(self, session_path: Path) -> list:
-        """Parse a session JSONL file and extract messages."""
+        Args:
+            session_path: Session JSONL file
+            resume: Continue from the last checkpoint instead of byte 0, and
+                record a new checkpoint afterwards
+        """
         messages = []
+        offset = 0
 
         content_scope = self.memory_config.get("contentScope", "standard")
-        include_thinking = self.memory_config.get("includeThinking", False)
         include_tool_calls = self.memory_config.get("includeToolCalls", True)
         max_messages = self.memory_config.get("maxMessages", 25)
 
-        with open(session_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-
-                try:
-                    entry = json.loads(line)
-                except json.JSONDecodeError:
-                    log.debug("Skipping malformed JSON line in session file: %s", session_path)
-                    continue
-
-                # Claude Code session format: type is "user" or "assistant"
-                # Message content is in entry["message"]["content"]
-                entry_type = entry.get("type")
-
-                # Skip non-message entries (file-history-snapshot, progress, system, summary, etc.)
-                if entry_type not in ("user", "assistant"):
-                    continue
+        if resume:
+            checkpoint = self._load_checkpoint(session_path, "summary")
+            if checkpoint:
+                messages = [message_from_dict(m) for m in checkpoint.get("messages", [])]
+                offset = checkpoint.get("offset", 0)
+                log.debug("Resuming summary parse of %s at byte %d", session_path, offset)
 
-                # Get the message object
-                message = entry.get("message", {})
-                role = message.get("role")
-
-                if not role:
-                    continue
-
-                # Skip meta messages (system reminders, etc.)
-                if entry.get("isMeta"):
-                    continue
-
-                # Extract content from message
-                content = self._extract_content(message, include_thinking=(content_scope == "full"))
-
-                if not content:
-                    continue
-
-                # Skip command messages (starting with / or containing command tags)
-                if role == "user":
-                    if content.startswith("/") or "<command-name>" in content:
-                        continue
-                    # Skip local command outputs
-                    if "<local-command" in content:
-                        continue
-
-                # Extract tool calls from assistant messages if needed
-                tool_calls = []
-                if include_tool_calls and role == "assistant":
-                    tool_calls = self._extract_tool_calls(message)
-
-                # Filter based on content scope
-                if content_scope == "minimal":
-                    # Only user and assistant text messages (no tool calls)
-                    messages.append({
-                        "role": role,
-                        "content": content,
-                        "timestamp": entry.get("timestamp")
-                    })
-                elif content_scope == "standard":
-                    # User, assistant, and tool call summaries (no thinking)
-                    messages.append({
-                        "role": role,
-                        "content": content,
-                        "timestamp": entry.get("timestamp")
-                    })
-                    # Add tool calls as separate entries
-                    for tool_call in tool_calls:
-                        messages.append({
-                            "role": "tool",
-                            "tool_name": tool_call.get("name", "unknown"),
-                            "content": self._summarize_tool_call(tool_call),
-                            "timestamp": entry.get("timestamp")
-                        })
-                else:  # full
-                    # Everything including thinking (already extracted above)
-                    messages.append({
-                        "role": role,
-                        "content": content,
-                        "timestamp": entry.get("timestamp")
-                    })
-                    # Add tool calls as separate entries
-                    for tool_call in tool_calls:
-                        messages.append({
-                            "role": "tool",
-                            "tool_name": tool_call.get("name", "unknown"),
-                            "content": self._summarize_tool_call(tool_call),
-                            "timestamp": entry.get("timestamp")
-                        })
+        for entry, end_offset in self._iter_session_entries(session_path, offset):
+            offset = end_offset
+            if entry is None:
+                continue
+            messages.extend(self._summary_messages_from_entry(entry, content_scope, include_tool_calls))
 
         # Apply message limit (0 or None = no limit)
         if max_messages and max_messages > 0 and len(messages) > max_messages:
             messages = messages[-max_messages:]
 
+        if resume:
+            self._save_checkpoint(session_path, "summary", offset, {
+                "messages": [m.to_dict() for m in messages]
+            })
+
+        return messages
+
+    def _summary_messages_from_entry(self, entry: dict, content_scope: str, include_tool_calls: bool) -> list:
+        """Convert one session entry into summary messages (possibly none)."""
+        # Claude Code session format: type is "user" or "assistant"
+        # Message content is in entry["message"]["content"]
+        entry_type = entry.get("type")
+
+        # Skip non-message entries (file-history-snapshot, progress, system, summary, etc.)
+        if entry_type not in ("user", "assistant"):
+            return []
+
+        # Get the message object
+        message = entry.get("message", {})
+        role = message.get("role")
+
+        if not role:
+            return []
+
+        # Skip meta messages (system reminders, etc.)
+        if entry.get("isMeta"):
+            return []
+
+        # Extract content from message
+        content = self._extract_content(message, include_thinking=(content_scope == "full"))
+
+        if not content:
+            return []
+
+        # Skip command messages (starting with / or containing command tags)
+        if role == "user":
+            if content.startswith("/") or "<command-name>" in content:
+                return []
+            # Skip local command outputs
+            if "<local-command" in content:
+                return []
+
+        messages = [Message(role, content, entry.get("timestamp"))]
+
+        # Minimal scope keeps only user and assistant text messages.
+        # Standard and full scopes add tool call summaries as separate entries
+        # (thinking for full scope was already extracted above).
+        if content_scope != "minimal" and include_tool_calls and role == "assistant":
+            for tool_call in self._extract_tool_calls(message):
+                messages.append(ToolSummary(
+                    tool_call.get("name", "unknown"),
+                    self._summarize_tool_call(tool_call),
+                    entry.get("timestamp")
+                ))
+
         return messages
 
     def _extract_content(self, message: dict, include_thinking: bool = False) -> Optional[str]:
@@ -279,6 +349,102 @@ class SessionParser:
         else:
             return f"[{tool_name}]"
 
+    def tool_activity(self, session_path: Path, offset: int = 0) -> tuple:
+        """Extract the tool calls of a session file for the activity index.
+
+        Every tool call counts, including those of assistant messages without
+        text, whatever the content scope.
+
+        Args:
+            session_path: Session JSONL file
+            offset: Byte offset to start at (end of the previous scan)
+
+        Returns:
+            (rows, end_offset) where rows are dicts with 'call_id', 'tool',
+            'kind', 'target', 'alias' and 'timestamp'
+        """
+        if offset > Path(session_path).stat().st_size:
+            # Rewritten session file; calls seen before are ignored on insert
+            offset = 0
+
+        rows = []
+        for entry, end_offset in self._iter_session_entries(session_path, offset):
+            if entry is not None and entry.get("type") == "assistant":
+                rows.extend(self._activity_from_entry(entry, offset))
+            offset = end_offset
+        return rows, offset
+
+    def _activity_from_entry(self, entry: dict, offset: int) -> list:
+        """Turn the tool_use blocks of an assistant entry into activity rows."""
+        content = entry.get("message", {}).get("content")
+        if not isinstance(content, list):
+            return []
+
+        rows = []
+        cwd = entry.get("cwd") or ""
+        for i, item in enumerate(content):
+            if not isinstance(item, dict) or item.get("type") != "tool_use":
+                continue
+            tool_name = item.get("name") or "unknown"
+            tool_input = item.get("input") if isinstance(item.get("input"), dict) else {}
+            kind, field = TOOL_TARGETS.get(tool_name, (None, None))
+            target = tool_input.get(field) if field else None
+            if not isinstance(target, str) or not target:
+                kind = target = None
+            else:
+                target = target[:MAX_ACTIVITY_TARGET]
+            rows.append({
+                # Entries without a tool_use ID are told apart by their position
+                "call_id": item.get("id") or f"{offset}:{i}",
+                "tool": tool_name,
+                "kind": kind,
+                "target": target,
+                "alias": self._activity_alias(kind, target, cwd),
+                "timestamp": entry.get("timestamp"),
+            })
+        return rows
+
+    @staticmethod
+    def _activity_alias(kind: Optional[str], target: Optional[str], cwd: str) -> Optional[str]:
+        """Short form of an activity target: cwd-relative path, command without leading cd, URL without scheme."""
+        if not target:
+            return None
+        if kind == "path":
+            cwd = cwd.rstrip("/\\")
+            if cwd and target.startswith(cwd) and target[len(cwd):len(cwd) + 1] in ("/", "\\"):
+                return target[len(cwd) + 1:].replace("\\", "/")
+        elif kind == "command":
+            alias = _LEADING_CD.sub("", target)
+            if alias and alias != target:
+                return alias
+        elif kind == "url":
+            alias = _URL_SCHEME.sub("", target)
+            if alias != target:
+                return alias
+        return None
+
+    def record_tool_activity(self, session_path: Path, project: str, memory_path) -> int:
+        """Add the session's tool calls since the last save to the activity index.
+
+        Failures are logged and never fail the save.
+
+        Returns:
+            Number of tool calls added
+        """
+        if not self.memory_config.get("toolActivity", True):
+            return 0
+        from search_engine import SearchEngine
+        try:
+            added = SearchEngine(self.config).record_tool_activity(
+                Path(session_path).stem, project, memory_path,
+                lambda offset: self.tool_activity(session_path, offset)
+            )
+        except Exception as e:
+            log.warning("Could not record tool activity of %s: %s", session_path, e)
+            return 0
+        profiler.count("activity.calls", added)
+        return added
+
     def generate_slug(self, messages: list) -> str:
         """Generate a descriptive slug for the session using Claude API."""
         if not HAS_ANTHROPIC:
@@ -287,8 +453,8 @@ class SessionParser:
         # Create a summary of the conversation
         summary_parts = []
         for msg in messages[:10]:  # Use first 10 messages for context
-            role = msg.get("role", "")
-            content = msg.get("content", "")
+            role = msg.role
+            content = msg.content
             if content and len(content) > 200:
                 content = content[:200] + "..."
             summary_parts.append(f"{role}: {content}")
@@ -299,20 +465,22 @@ class SessionParser:
             # Get model from config
             model = get_model(self.model_config)
 
-            client = anthropic.Anthropic()
-            response = client.messages.create(
-                model=model,
-                max_tokens=50,
-                messages=[{
-                    "role": "user",
-                    "content": f"""Based on this conversation, generate a 1-3 word slug (lowercase, hyphen-separated) that describes the main topic. Only output the slug, nothing else.
+            client = get_anthropic_client()
+            with profiler.span("api.slug"):
+                response = client.messages.create(
+                    model=model,
+                    max_tokens=50,
+                    messages=[{
+                        "role": "user",
+                        "content": f"""Based on this conversation, generate a 1-3 word slug (lowercase, hyphen-separated) that describes the main topic. Only output the slug, nothing else.
 
 Conversation:
 {summary}
 
 Slug:"""
-                }]
-            )
+                    }]
+                )
+            profiler.record_usage("slug", response)
 
             slug = response.content[0].text.strip().lower()
             # Clean up slug
@@ -329,8 +497,13 @@ Slug:"""
             log.warning("Failed to generate slug via API: %s", e)
             return datetime.now().strftime("%H%M")
 
-    def generate_summary(self, messages: list) -> Optional[str]:
-        """使用 Claude API 生成对话摘要。"""
+    def generate_summary(self, messages: list, previous: Optional[dict] = None) -> Optional[str]:
+        """使用 Claude API 生成对话摘要。
+
+        previous 为该会话上次保存的记录：若其摘要覆盖的消息仍是本次消息的前缀，
+        只发送原摘要和新增消息由模型更新（没有新增消息时直接沿用原摘要）；
+        否则重新生成完整摘要。
+        """
         summary_config = self.config.get("summary", {})
 
         # 检查是否启用摘要
@@ -346,35 +519,114 @@ Slug:"""
 
         format_type = summary_config.get("format", "structured")
 
-        # 准备对话内容
-        conversation = self._format_conversation_for_summary(messages)
-
-        # 获取对应的 prompt
-        prompt = self._get_summary_prompt(format_type, conversation)
+        new_messages = None
+        if summary_config.get("incremental", True):
+            new_messages = self._unsummarized_messages(messages, previous)
+        if new_messages == []:
+            profiler.count("summary.reused")
+            return previous["summary"]
+
+        # 准备对话内容和对应的 prompt
+        if new_messages is not None:
+            log.info("Updating summary with %d new of %d messages", len(new_messages), len(messages))
+            profiler.count("summary.incremental")
+            profiler.count("summary.messages_sent", len(new_messages))
+            conversation = self._format_conversation_for_summary(new_messages)
+            prompt = self._get_update_prompt(previous["summary"], conversation)
+        else:
+            profiler.count("summary.full")
+            profiler.count("summary.messages_sent", len(messages))
+            conversation = self._format_conversation_for_summary(messages)
+            prompt = self._get_summary_prompt(conversation)
 
         try:
             model = get_model(self.model_config)
-            client = anthropic.Anthropic()
-            response = client.messages.create(
-                model=model,
-                max_tokens=1500,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            client = get_anthropic_client()
+            with profiler.span("api.summary"):
+                response = client.messages.create(
+                    model=model,
+                    max_tokens=1500,
+                    # Not marked for caching: the instructions alone are below the
+                    # API's minimum cacheable length, and the summary that follows
+                    # them changes with every update
+                    system=self._get_summary_instructions(format_type),
+                    messages=[{"role": "user", "content": prompt}]
+                )
+            profiler.record_usage("summary", response)
             return response.content[0].text
         except Exception as e:
             # API 调用失败时返回 None，仍保存原始对话
             log.warning("Failed to generate summary via API: %s", e)
             return None
 
+    def _summary_signature(self) -> str:
+        """Hash of the settings a stored summary was generated with."""
+        hasher = hashlib.sha256(self._parser_signature("summary").encode("utf-8"))
+        hasher.update(json.dumps(self.config.get("summary", {}), sort_keys=True).encode("utf-8"))
+        return hasher.hexdigest()[:16]
+
+    @staticmethod
+    def _message_digests(messages: list) -> list:
+        """Short per-message hashes, to tell which messages a stored summary covers."""
+        return [
+            hashlib.sha256(json.dumps(msg.to_dict(), sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+            for msg in messages
+        ]
+
+    def _summary_state(self, messages: list, summary: Optional[str], previous: Optional[dict] = None) -> dict:
+        """Session record fields that let the next save update this summary incrementally.
+
+        Without a summary (generation failed or is disabled) the state of the
+        previous record is kept, so the next save still updates that summary.
+        """
+        if not summary:
+            return {key: previous[key] for key in SUMMARY_STATE_KEYS if key in previous} if previous else {}
+        return {
+            "summary": summary,
+            "summary_digests": self._message_digests(messages),
+            "summary_signature": self._summary_signature(),
+        }
+
+    def _unsummarized_messages(self, messages: list, previous: Optional[dict]) -> Optional[list]:
+        """Messages added since the summary stored in a session record.
+
+        Returns:
+            The new messages (empty if there are none), or None when the
+            summary must be regenerated: no usable summary, other settings,
+            or the summarized messages are no longer a prefix of these
+        """
+        if not previous or not previous.get("summary") or not previous.get("summary_digests") \
+                or previous.get("summary_signature") != self._summary_signature():
+            return None
+
+        old = previous["summary_digests"]
+        new = self._message_digests(messages)
+        max_messages = self.memory_config.get("maxMessages", 25)
+        if max_messages and max_messages > 0 and len(new) >= max_messages:
+            # The message window slid forward: the tail of the summarized
+            # window must open this one. Short repeated messages ("yes", the
+            # same tool result) share digests, so a few matching messages
+            # prove nothing; at least half of the old window must line up
+            min_overlap = max(2, min(len(old), max_messages) // 2)
+            overlaps = range(min(len(old), len(new)), min_overlap - 1, -1)
+        else:
+            overlaps = [len(old)]
+
+        for k in overlaps:
+            if new[:k] == old[len(old) - k:]:
+                return messages[k:]
+        log.info("Conversation no longer extends the summarized messages, regenerating the summary")
+        return None
+
     def _format_conversation_for_summary(self, messages: list) -> str:
         """将消息列表格式化为摘要用的文本。"""
         parts = []
         for msg in messages:
-            role = msg.get("role", "unknown")
-            content = msg.get("content", "")
+            role = msg.role
+            content = msg.content
 
             if role == "tool":
-                tool_name = msg.get("tool_name", "unknown")
+                tool_name = msg.tool_name
                 parts.append(f"[工具调用: {tool_name}] {content}")
             else:
                 role_cn = {"user": "用户", "assistant": "助手"}.get(role, role)
@@ -385,10 +637,13 @@ Slug:"""
 
         return "\n\n".join(parts)
 
-    def _get_summary_prompt(self, format_type: str, conversation: str) -> str:
-        """根据格式类型获取摘要 prompt。"""
+    def _get_summary_instructions(self, format_type: str) -> str:
+        """根据格式类型获取摘要指令（system prompt）。
+
+        完整生成和增量更新共用同一段指令，不含会话内容。
+        """
         if format_type == "structured":
-            return f"""基于以下对话内容，生成一个结构化摘要。请使用中文输出（专有名词除外）。严格按照以下格式：
+            return """你负责为 Claude Code 会话生成结构化摘要。请使用中文输出（专有名词除外）。严格按照以下格式：
 
 ## 会话主题
 [一句话描述本次会话的主要目标或主题]
@@ -415,19 +670,16 @@ Slug:"""
 
 如果某个部分没有相关内容，写"无"。
 
----
-对话内容：
-{conversation}"""
+收到已有摘要和新增对话时，把新增内容合并进摘要，输出完整的更新后摘要（不要只写新增部分），保持已有摘要的格式和各部分标题不变：已完成的待办移入「完成的任务」，新的决策、任务、问题和待办追加到对应部分。"""
 
         elif format_type == "freeform":
-            return f"""基于以下对话内容，生成一段简洁的总结（150-300字）。请使用中文输出（专有名词除外）。
+            return """你负责为 Claude Code 会话生成一段简洁的总结（150-300字）。请使用中文输出（专有名词除外）。
 重点描述：做了什么、为什么这样做、结果如何。
 
-对话内容：
-{conversation}"""
+收到已有摘要和新增对话时，把新增内容合并进总结，输出完整的更新后总结（不要只写新增部分）。"""
 
         else:  # mixed
-            return f"""基于以下对话内容，生成摘要。请使用中文输出（专有名词除外）。格式如下：
+            return """你负责为 Claude Code 会话生成摘要。请使用中文输出（专有名词除外）。格式如下：
 
 ## 概述
 [2-3句话总结本次会话]
@@ -438,10 +690,29 @@ Slug:"""
 - [要点 3]
 ...
 
-对话内容：
-{conversation}"""
+收到已有摘要和新增对话时，把新增内容合并进摘要，输出完整的更新后摘要（不要只写新增部分），保持「概述」和「关键点」的格式不变。"""
+
+    def _get_summary_prompt(self, conversation: str) -> str:
+        """完整生成摘要的用户消息：对话内容在前，指令在 system prompt 中。"""
+        return f"""对话内容：
+{conversation}
+
+---
+基于以上对话内容生成摘要。"""
 
-    def parse_session_file_full(self, session_path: Path) -> list:
+    def _get_update_prompt(self, previous_summary: str, conversation: str) -> str:
+        """增量更新摘要的用户消息：已有摘要 + 新增对话。"""
+        return f"""已有摘要：
+{previous_summary}
+
+---
+新增对话内容：
+{conversation}
+
+---
+以上是同一会话此前内容的摘要和此后新增的对话，请输出完整的更新后摘要。"""
+
+    def parse_session_file_full(self, session_path: Path, resume: bool = False) -> list:
         """Parse a session JSONL file and extract full messages with tool results.
 
         This method extracts complete content including:
@@ -449,207 +720,489 @@ Slug:"""
         - Assistant messages with thinking
         - Tool calls with full input
         - Tool results with full output
+
+        Args:
+            session_path: Session JSONL file
+            resume: Continue from the last checkpoint instead of byte 0, and
+                record a new checkpoint afterwards
         """
         messages = []
+        offset = 0
         max_messages = self.memory_config.get("maxMessages", 25)
 
         # Track tool calls to match with results
         pending_tool_calls = {}  # tool_use_id -> tool_call_info
 
-        with open(session_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
+        if resume:
+            checkpoint = self._load_checkpoint(session_path, "full")
+            if checkpoint:
+                messages = [message_from_dict(m) for m in checkpoint.get("messages", [])]
+                pending_tool_calls = checkpoint.get("pending_tool_calls", {})
+                offset = checkpoint.get("offset", 0)
+                log.debug("Resuming full parse of %s at byte %d", session_path, offset)
 
-                try:
-                    entry = json.loads(line)
-                except json.JSONDecodeError:
-                    log.debug("Skipping malformed JSON line in full parse: %s", session_path)
-                    continue
-
-                entry_type = entry.get("type")
-
-                # Skip non-message entries
-                if entry_type not in ("user", "assistant"):
-                    continue
-
-                message = entry.get("message", {})
-                role = message.get("role")
-
-                if not role:
-                    continue
-
-                # Skip meta messages
-                if entry.get("isMeta"):
-                    continue
-
-                content = message.get("content")
-
-                # Handle assistant messages
-                if entry_type == "assistant" and role == "assistant":
-                    # Extract text and thinking
-                    text_content = self._extract_content(message, include_thinking=True)
-
-                    if text_content:
-                        # Skip if it's just a command response
-                        if "<command-name>" not in text_content:
-                            messages.append({
-                                "role": "assistant",
-                                "content": text_content,
-                                "timestamp": entry.get("timestamp")
-                            })
-
-                    # Extract and store tool calls
-                    if isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict) and item.get("type") == "tool_use":
-                                tool_id = item.get("id")
-                                tool_name = item.get("name", "unknown")
-                                tool_input = item.get("input", {})
-
-                                # Store for later matching with result
-                                pending_tool_calls[tool_id] = {
-                                    "name": tool_name,
-                                    "input": tool_input
-                                }
-
-                                # Add tool call entry
-                                messages.append({
-                                    "role": "tool_call",
-                                    "tool_name": tool_name,
-                                    "tool_id": tool_id,
-                                    "input": tool_input,
-                                    "timestamp": entry.get("timestamp")
-                                })
-
-                # Handle user messages (including tool results)
-                elif entry_type == "user" and role == "user":
-                    if isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict):
-                                item_type = item.get("type")
-
-                                # Tool result
-                                if item_type == "tool_result":
-                                    tool_id = item.get("tool_use_id")
-                                    result_content = item.get("content", "")
-
-                                    # Get tool info from pending calls
-                                    tool_info = pending_tool_calls.get(tool_id, {})
-
-                                    messages.append({
-                                        "role": "tool_result",
-                                        "tool_name": tool_info.get("name", "unknown"),
-                                        "tool_id": tool_id,
-                                        "result": result_content,
-                                        "timestamp": entry.get("timestamp")
-                                    })
-
-                    elif isinstance(content, str):
-                        # Regular user message
-                        if content.startswith("/") or "<command-name>" in content:
-                            continue
-                        if "<local-command" in content:
-                            continue
-
-                        messages.append({
-                            "role": "user",
-                            "content": content,
-                            "timestamp": entry.get("timestamp")
-                        })
+        progress = {"offset": offset}
+        messages.extend(self._iter_full_messages(session_path, pending_tool_calls, progress))
 
         # Apply message limit (0 or None = no limit)
         if max_messages and max_messages > 0 and len(messages) > max_messages:
             messages = messages[-max_messages:]
 
+        if resume:
+            self._save_checkpoint(session_path, "full", progress["offset"], {
+                "messages": [m.to_dict() for m in messages],
+                "pending_tool_calls": pending_tool_calls,
+            })
+
         return messages
 
-    def save_session(self, project_override: Optional[str] = None) -> dict:
-        """Save the current session to memory (summary + full files)."""
+    def _iter_full_messages(self, session_path: Path, pending_tool_calls: dict, progress: dict):
+        """Iterate over full-transcript messages from progress["offset"] onwards.
+
+        Args:
+            session_path: Session JSONL file
+            pending_tool_calls: Tool calls awaiting a result; updated in place
+            progress: Holds the byte offset to start at; updated in place to
+                just past the last fully parsed line
+        """
+        for entry, end_offset in self._iter_session_entries(session_path, progress["offset"]):
+            progress["offset"] = end_offset
+            if entry is None:
+                continue
+            yield from self._full_messages_from_entry(entry, pending_tool_calls)
+
+    def _tool_payload_cap(self, key: str, tool_name: str) -> int:
+        """Get the byte cap for a tool input/result ("toolInputMaxBytes"/"toolResultMaxBytes").
+
+        The config value is either a number, or a dict of per-tool caps with
+        an optional "default" entry. 0 disables the cap.
+        """
+        cap = self.memory_config.get(key, 65536)
+        if isinstance(cap, dict):
+            cap = cap.get(tool_name, cap.get("default", 65536))
+        return int(cap or 0)
+
+    @staticmethod
+    def _cap_text(text: str, max_bytes: int) -> str:
+        """Keep the head and tail of text longer than max_bytes (UTF-8), noting what was cut."""
+        # A character is at most 4 bytes, so short strings need no encoding
+        if not max_bytes or len(text) * 4 <= max_bytes:
+            return text
+
+        data = text.encode("utf-8")
+        if len(data) <= max_bytes:
+            return text
+
+        keep = max_bytes // 2
+        head = data[:keep].decode("utf-8", errors="ignore")
+        tail = data[-keep:].decode("utf-8", errors="ignore")
+        omitted = len(data) - 2 * keep
+        return f"{head}\n... [{omitted} of {len(data)} bytes omitted] ...\n{tail}"
+
+    def _serialize_tool_result(self, result, tool_name: str) -> str:
+        """Serialize a tool result for the full transcript.
+
+        Binary blocks (base64 images and documents) and results larger than
+        memory.blobThresholdBytes are moved to the blob store and replaced by
+        a reference, plus a short preview for large text. Whatever stays
+        inline is capped by toolResultMaxBytes.
+        """
+        threshold = self.memory_config.get("blobThresholdBytes", 32768)
+
+        if isinstance(result, str):
+            text = result
+        elif threshold and isinstance(result, list) and any(self._is_binary_block(item) for item in result):
+            parts = []
+            for item in result:
+                data = self._decode_binary_block(item) if self._is_binary_block(item) else None
+                if data is not None:
+                    digest = self.blobs.put(data)
+                    parts.append(format_blob_ref(digest, len(data), item["source"].get("media_type", "application/octet-stream")))
+                elif isinstance(item, dict) and item.get("type") == "text":
+                    parts.append(item.get("text", ""))
+                else:
+                    parts.append(json.dumps(item, ensure_ascii=False))
+            text = "\n".join(parts)
+        else:
+            text = json.dumps(result, indent=2, ensure_ascii=False)
+
+        # Large text goes to the blob store, leaving a reference and a preview
+        if threshold and threshold > 0 and len(text) * 4 > threshold:
+            data = text.encode("utf-8")
+            if len(data) > threshold:
+                digest = self.blobs.put(data)
+                preview = self._cap_text(text, self.memory_config.get("blobPreviewBytes", 2048))
+                return "\n".join([
+                    format_blob_ref(digest, len(data), "text/plain"),
+                    BLOB_PREVIEW_START,
+                    preview,
+                    BLOB_PREVIEW_END,
+                ])
+
+        return self._cap_text(text, self._tool_payload_cap("toolResultMaxBytes", tool_name))
+
+    @staticmethod
+    def _is_binary_block(item) -> bool:
+        """Check whether a tool result content block carries base64 data."""
+        return (
+            isinstance(item, dict)
+            and item.get("type") in ("image", "document")
+            and isinstance(item.get("source"), dict)
+            and item["source"].get("type") == "base64"
+        )
+
+    @staticmethod
+    def _decode_binary_block(item: dict) -> Optional[bytes]:
+        """Decode the base64 data of a binary block, or None if it is malformed (kept inline as JSON)."""
+        try:
+            return base64.b64decode(item["source"].get("data", ""), validate=True)
+        except (binascii.Error, ValueError, TypeError) as e:
+            log.warning("Keeping malformed base64 %s block inline: %s", item.get("type"), e)
+            return None
+
+    def _full_messages_from_entry(self, entry: dict, pending_tool_calls: dict) -> list:
+        """Convert one session entry into full-transcript messages (possibly none).
+
+        Args:
+            entry: Parsed JSONL entry
+            pending_tool_calls: tool_use_id -> tool info for calls still awaiting
+                a result; updated in place
+        """
+        messages = []
+        entry_type = entry.get("type")
+
+        # Skip non-message entries
+        if entry_type not in ("user", "assistant"):
+            return messages
+
+        message = entry.get("message", {})
+        role = message.get("role")
+
+        if not role:
+            return messages
+
+        # Skip meta messages
+        if entry.get("isMeta"):
+            return messages
+
+        content = message.get("content")
+
+        # Handle assistant messages
+        if entry_type == "assistant" and role == "assistant":
+            # Extract text and thinking
+            text_content = self._extract_content(message, include_thinking=True)
+
+            if text_content:
+                # Skip if it's just a command response
+                if "<command-name>" not in text_content:
+                    messages.append(Message("assistant", text_content, entry.get("timestamp")))
+
+            # Extract and store tool calls
+            if isinstance(content, list):
+                for item in content:
+                    if isinstance(item, dict) and item.get("type") == "tool_use":
+                        tool_id = item.get("id")
+                        tool_name = item.get("name", "unknown")
+                        tool_input = item.get("input", {})
+
+                        # Store for later matching with result (only the name is needed)
+                        pending_tool_calls[tool_id] = {"name": tool_name}
+
+                        # Serialize and cap the input now so large payloads are not kept around
+                        tool_input = self._cap_text(
+                            json.dumps(tool_input, indent=2, ensure_ascii=False),
+                            self._tool_payload_cap("toolInputMaxBytes", tool_name)
+                        )
+
+                        # Add tool call entry
+                        messages.append(ToolCall(tool_name, tool_id, tool_input, entry.get("timestamp")))
+
+        # Handle user messages (including tool results)
+        elif entry_type == "user" and role == "user":
+            if isinstance(content, list):
+                for item in content:
+                    if isinstance(item, dict) and item.get("type") == "tool_result":
+                        tool_id = item.get("tool_use_id")
+                        result_content = item.get("content", "")
+
+                        # Get tool info from pending calls
+                        tool_info = pending_tool_calls.pop(tool_id, {})
+                        tool_name = tool_info.get("name", "unknown")
+
+                        result_content = self._serialize_tool_result(result_content, tool_name)
+
+                        messages.append(ToolResult(tool_name, tool_id, result_content, entry.get("timestamp")))
+
+            elif isinstance(content, str):
+                # Regular user message
+                if content.startswith("/") or "<command-name>" in content:
+                    return messages
+                if "<local-command" in content:
+                    return messages
+
+                messages.append(Message("user", content, entry.get("timestamp")))
+
+        return messages
+
+    def read_session_info(self, session_path: Path) -> dict:
+        """Read session metadata recorded in the first entries of a session file.
+
+        Returns:
+            Dict with 'session_id', 'cwd' (None if not recorded) and 'started'
+            (first entry timestamp, None if not recorded)
+        """
+        info = {"session_id": Path(session_path).stem, "cwd": None, "started": None}
+
+        for lineno, (entry, _) in enumerate(self._iter_session_entries(session_path)):
+            if lineno >= 50:
+                break
+            if not entry:
+                continue
+            if not info["cwd"] and entry.get("cwd"):
+                info["cwd"] = entry["cwd"]
+            if not info["started"] and entry.get("timestamp"):
+                info["started"] = entry["timestamp"]
+            if entry.get("sessionId"):
+                info["session_id"] = entry["sessionId"]
+            if info["cwd"] and info["started"]:
+                break
+
+        return info
+
+    def reserve_memory_path(self, project_dir: Path, date_str: str, slug: str) -> Path:
+        """Reserve a free `DATE-slug[-N].md` path in the project directory.
+
+        The name is claimed by creating an empty file with O_EXCL, so
+        concurrent saves in other sessions can never pick the same name. The
+        caller replaces the placeholder with the real content.
+        """
+        file_path = project_dir / f"{date_str}-{slug}.md"
+
+        # Handle duplicate filenames
+        counter = 1
+        while True:
+            try:
+                os.close(os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                return file_path
+            except FileExistsError:
+                file_path = project_dir / f"{date_str}-{slug}-{counter}.md"
+                counter += 1
+
+    def content_hash(self, messages: list) -> str:
+        """Hash parsed summary messages together with the settings that shape the summary."""
+        summary_config = self.config.get("summary", {})
+        hasher = hashlib.sha256()
+        hasher.update(self._parser_signature("summary").encode("utf-8"))
+        hasher.update(json.dumps(summary_config, sort_keys=True).encode("utf-8"))
+        for msg in messages:
+            hasher.update(json.dumps(msg.to_dict(), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def save_session(self, project_override: Optional[str] = None,
+                     session_path: Optional[Path] = None,
+                     working_dir: Optional[str] = None) -> dict:
+        """Save a session to memory (summary + full files).
+
+        A session that was saved before is updated in place rather than
+        written to a new file. If neither its messages nor the session file
+        changed since the last save, nothing is rewritten and no API calls
+        are made.
+
+        Args:
+            project_override: Project name to file the memory under
+            session_path: Session file to save (default: current session)
+            working_dir: Working directory of the session (default: cwd)
+
+        Returns:
+            Dict with 'file_path', 'message_count', 'project', optionally
+            'full_file_path', 'removed_paths' (files of an earlier save that
+            were deleted) and 'status' ("new", "updated" or "unchanged")
+        """
+        if working_dir is None:
+            working_dir = os.getcwd()
+
         # Find current session
-        session_path = self.find_current_session()
+        if session_path is None:
+            with profiler.span("find_session"):
+                session_path = self.find_current_session(working_dir)
         if session_path is None:
             raise ValueError("No current session found. Please have a conversation first.")
 
+        # Saves of the same session from several processes (manual save,
+        # auto-save worker, backfill) take turns
+        with file_lock(self.sessions.lock_path(Path(session_path).stem), timeout=SESSION_LOCK_TIMEOUT):
+            result = self._save_session_locked(session_path, project_override, working_dir)
+            with profiler.span("tool_activity"):
+                self.record_tool_activity(session_path, result["project"], result["file_path"])
+            return result
+
+    def _save_session_locked(self, session_path: Path, project_override: Optional[str], working_dir: str) -> dict:
+        """Body of save_session, run while holding the session's lock."""
         log.info("Parsing session file: %s", session_path)
 
         # Parse messages for summary
-        messages = self.parse_session_file(session_path)
+        with profiler.span("parse"):
+            messages = self.parse_session_file(session_path, resume=True)
         if not messages:
             raise ValueError("Current session has no valid content.")
+        profiler.count("parse.messages", len(messages))
 
         # Get project name
         if project_override:
             project = project_override
         else:
-            project = Path(os.getcwd()).name
+            project = Path(working_dir).name
 
-        # Generate slug
-        slug = self.generate_slug(messages)
+        session_id = Path(session_path).stem
+        session_size = Path(session_path).stat().st_size
+        content_hash = self.content_hash(messages)
+        save_full = self.memory_config.get("saveFull", True)
 
-        # Create file path
-        date_str = datetime.now().strftime("%Y-%m-%d")
-        filename = f"{date_str}-{slug}.md"
+        # Reuse the files of an earlier save of this session, if they still exist
+        record = self.sessions.load(session_id)
+        if record and (record.get("project") != project or not Path(record.get("file_path", "")).exists()):
+            record = None
+
+        if record and record.get("content_hash") == content_hash and record.get("session_size") == session_size:
+            log.info("Session unchanged since last save: %s", session_id)
+            profiler.count("cache.session_unchanged")
+            result = {
+                "file_path": record["file_path"],
+                "message_count": len(messages),
+                "project": project,
+                "status": "unchanged",
+            }
+            if record.get("full_file_path"):
+                result["full_file_path"] = record["full_file_path"]
+            return result
 
         project_dir = self.memory_dir / project
         project_dir.mkdir(parents=True, exist_ok=True)
 
-        file_path = project_dir / filename
-
-        # Handle duplicate filenames
-        counter = 1
-        base_filename = filename
-        while file_path.exists():
-            filename = f"{date_str}-{slug}-{counter}.md"
-            file_path = project_dir / filename
-            counter += 1
-
-        # Generate and write summary markdown
-        summary_content = self._generate_markdown(messages, project)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(summary_content)
+        if record:
+            file_path = Path(record["file_path"])
+            created = datetime.fromisoformat(record["created"]) if record.get("created") else None
+            status = "updated"
+        else:
+            # Generate slug and create file path
+            with profiler.span("slug"):
+                slug = self.generate_slug(messages)
+            date_str = datetime.now().strftime("%Y-%m-%d")
+            file_path = self.reserve_memory_path(project_dir, date_str, slug)
+            created = datetime.now()
+            status = "new"
+
+        filename = file_path.name
+
+        # Generate and write summary markdown (only when the messages changed)
+        summary_state = self._summary_state(messages, None, record)
+        if not record or record.get("content_hash") != content_hash:
+            try:
+                with profiler.span("summary"):
+                    ai_summary = self.generate_summary(messages, record)
+                    summary_state = self._summary_state(messages, ai_summary, record)
+                with profiler.span("write_summary"):
+                    summary_content = self._generate_markdown(messages, project, ai_summary, working_dir, created, session_id)
+                    atomic_write_text(file_path, summary_content)
+            except BaseException:
+                # Release the name reserved for a new memory
+                if status == "new":
+                    try:
+                        file_path.unlink()
+                    except OSError:
+                        pass
+                raise
 
         # Save full file if enabled
-        save_full = self.memory_config.get("saveFull", True)
         full_file_path = None
+        removed_paths = []
 
         if save_full:
-            # Parse full messages
-            full_messages = self.parse_session_file_full(session_path)
-
-            if full_messages:
-                # Create full directory
-                full_dir = project_dir / "full"
-                full_dir.mkdir(parents=True, exist_ok=True)
-
-                full_file_path = full_dir / filename
-
-                # Generate and write full markdown
-                full_content = self._generate_full_markdown(full_messages, project)
-                with open(full_file_path, "w", encoding="utf-8") as f:
-                    f.write(full_content)
+            # Create full directory
+            full_dir = project_dir / "full"
+            full_dir.mkdir(parents=True, exist_ok=True)
+
+            # Stream the full transcript straight to disk, compressed if configured
+            codec = resolve_codec(self.memory_config.get("fullCompression", "none"))
+            full_file_path = full_dir / full_file_name(filename, codec)
+            with profiler.span("write_full"):
+                written = self.write_full_transcript(session_path, full_file_path, project, working_dir,
+                                                     created, resume=True, session_id=session_id)
+            if not written:
+                full_file_path = None
+
+            # Drop a copy stored under another codec or tier by an earlier save
+            if record:
+                removed_paths = self.remove_stale_full_files(full_dir, filename, full_file_path)
+
+        self.sessions.save(session_id, {
+            "session_path": str(session_path),
+            "project": project,
+            "file_path": str(file_path),
+            "full_file_path": str(full_file_path) if full_file_path else None,
+            "content_hash": content_hash,
+            "session_size": session_size,
+            "created": created.isoformat() if created else None,
+            "updated": datetime.now().isoformat(),
+            **summary_state,
+        })
 
         result = {
             "file_path": str(file_path),
             "message_count": len(messages),
-            "project": project
+            "project": project,
+            "status": status,
         }
 
         if full_file_path:
             result["full_file_path"] = str(full_file_path)
+        if removed_paths:
+            result["removed_paths"] = removed_paths
 
         return result
 
-    def _generate_markdown(self, messages: list, project: str) -> str:
-        """Generate markdown content for the summary memory file."""
-        now = datetime.now()
+    def remove_stale_full_files(self, full_dir: Path, filename: str, keep: Optional[Path]) -> list:
+        """Delete the other stored variants of a summary's full transcript.
+
+        Looks the variants up on disk rather than trusting the session record,
+        since cold tiering moves files to full/cold/ without updating it.
+
+        Args:
+            full_dir: The project's full/ directory
+            filename: Summary file name the transcript pairs with
+            keep: Variant just written, left in place
+
+        Returns:
+            Paths of the deleted files, as strings
+        """
+        removed = []
+        for path in find_full_files(full_dir, filename):
+            if keep is not None and path == Path(keep):
+                continue
+            try:
+                os.unlink(path)
+                removed.append(str(path))
+            except OSError as e:
+                log.warning("Could not remove old full transcript %s: %s", path, e)
+        return removed
+
+    def _generate_markdown(self, messages: list, project: str, ai_summary: Optional[str] = None,
+                           working_dir: Optional[str] = None, created: Optional[datetime] = None,
+                           session_id: Optional[str] = None) -> str:
+        """Generate markdown content for the summary memory file.
+
+        Args:
+            messages: Parsed summary messages
+            project: Project name
+            ai_summary: AI-generated summary, or None if not generated
+            working_dir: Working directory of the session (default: cwd)
+            created: Session time to record (default: now)
+            session_id: Claude Code session ID to record
+        """
+        now = created or datetime.now()
         summary_config = self.config.get("summary", {})
         summary_format = summary_config.get("format", "structured")
 
-        # 尝试生成 AI 摘要
-        ai_summary = self.generate_summary(messages)
-
         # YAML frontmatter
         lines = [
             "---",
@@ -661,13 +1214,17 @@ Slug:"""
             f"summary_format: {summary_format}",
             f"has_ai_summary: {ai_summary is not None}",
             "type: summary",
+        ]
+        if session_id:
+            lines.append(f"session_id: {session_id}")
+        lines += [
             "---",
             "",
             f"# 会话记录: {now.strftime('%Y-%m-%d %H:%M:%S')}",
             "",
             "## 元数据",
             f"- **项目**: {project}",
-            f"- **工作目录**: {os.getcwd()}",
+            f"- **工作目录**: {working_dir or os.getcwd()}",
             f"- **消息数**: {len(messages)}",
             ""
         ]
@@ -683,9 +1240,10 @@ Slug:"""
 
         return "\n".join(lines)
 
-    def _generate_full_markdown(self, messages: list, project: str) -> str:
-        """Generate markdown content for the full memory file with complete tool I/O."""
-        now = datetime.now()
+    def _full_markdown_header(self, project: str, message_count: int, working_dir: Optional[str] = None,
+                              created: Optional[datetime] = None, session_id: Optional[str] = None) -> str:
+        """Generate the frontmatter and metadata block of a full memory file."""
+        now = created or datetime.now()
 
         # YAML frontmatter
         lines = [
@@ -693,64 +1251,167 @@ Slug:"""
             f"project: {project}",
             f"created: {now.isoformat()}",
             "source: claude-code",
-            f"messages: {len(messages)}",
+            f"messages: {message_count}",
             "content_scope: full",
             "type: full",
+        ]
+        if session_id:
+            lines.append(f"session_id: {session_id}")
+        lines += [
             "---",
             "",
             f"# Session: {now.strftime('%Y-%m-%d %H:%M:%S')} (Full)",
             "",
             "## Metadata",
             f"- **Project**: {project}",
-            f"- **Working Directory**: {os.getcwd()}",
-            f"- **Messages**: {len(messages)}",
+            f"- **Working Directory**: {working_dir or os.getcwd()}",
+            f"- **Messages**: {message_count}",
             "",
             "## Conversation",
             ""
         ]
+        return "\n".join(lines) + "\n"
 
-        # Add messages
-        for msg in messages:
-            role = msg.get("role", "unknown")
-
-            if role == "user":
-                content = msg.get("content", "")
-                lines.append(f"### User")
-                lines.append("")
-                lines.append(content)
-                lines.append("")
-
-            elif role == "assistant":
-                content = msg.get("content", "")
-                lines.append(f"### Assistant")
-                lines.append("")
-                lines.append(content)
-                lines.append("")
-
-            elif role == "tool_call":
-                tool_name = msg.get("tool_name", "unknown")
-                tool_input = msg.get("input", {})
-                lines.append(f"### Tool Call: {tool_name}")
-                lines.append("")
-                lines.append("**Input:**")
-                lines.append("```json")
-                lines.append(json.dumps(tool_input, indent=2, ensure_ascii=False))
-                lines.append("```")
-                lines.append("")
-
-            elif role == "tool_result":
-                tool_name = msg.get("tool_name", "unknown")
-                result = msg.get("result", "")
-                lines.append(f"### Tool Result: {tool_name}")
-                lines.append("")
-                lines.append("**Output:**")
-                lines.append("```")
-                # Handle result that might be very long
-                if isinstance(result, str):
-                    lines.append(result)
-                else:
-                    lines.append(json.dumps(result, indent=2, ensure_ascii=False))
-                lines.append("```")
-                lines.append("")
+    def _render_full_message(self, msg) -> str:
+        """Render one full-transcript message as markdown."""
+        role = msg.role
+        lines = []
 
-        return "\n".join(lines)
+        if role == "user":
+            lines.append(f"### User")
+            lines.append("")
+            lines.append(msg.content)
+            lines.append("")
+
+        elif role == "assistant":
+            lines.append(f"### Assistant")
+            lines.append("")
+            lines.append(msg.content)
+            lines.append("")
+
+        elif role == "tool_call":
+            tool_name = msg.tool_name
+            tool_input = msg.input
+            lines.append(f"### Tool Call: {tool_name}")
+            lines.append("")
+            lines.append("**Input:**")
+            lines.append("```json")
+            # Inputs are serialized (and capped) at parse time
+            lines.append(tool_input)
+            lines.append("```")
+            lines.append("")
+
+        elif role == "tool_result":
+            tool_name = msg.tool_name
+            result = msg.result
+            lines.append(f"### Tool Result: {tool_name}")
+            lines.append("")
+            lines.append("**Output:**")
+            lines.append("```")
+            lines.append(result)
+            lines.append("```")
+            lines.append("")
+
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _generate_full_markdown(self, messages: list, project: str, working_dir: Optional[str] = None,
+                                created: Optional[datetime] = None) -> str:
+        """Generate markdown content for the full memory file with complete tool I/O."""
+        parts = [self._full_markdown_header(project, len(messages), working_dir, created)]
+        parts.extend(self._render_full_message(msg) for msg in messages)
+        return "".join(parts)
+
+    def write_full_transcript(self, session_path: Path, output_path: Path, project: str,
+                              working_dir: Optional[str] = None, created: Optional[datetime] = None,
+                              resume: bool = False, session_id: Optional[str] = None) -> int:
+        """Stream the full transcript of a session straight to a memory file.
+
+        Messages are rendered as they are parsed, so peak memory does not grow
+        with the session: with a message limit only the last N (size-capped)
+        messages are held, and without one the rendered body is spooled to disk
+        and copied behind the header once the message count is known.
+
+        Args:
+            session_path: Session JSONL file
+            output_path: Full memory file to write (atomically); a ".md.gz" or
+                ".md.zst" suffix stores it compressed
+            project: Project name
+            working_dir: Working directory of the session (default: cwd)
+            created: Session time to record (default: now)
+            resume: Continue from the last checkpoint instead of byte 0
+            session_id: Claude Code session ID to record
+
+        Returns:
+            Number of messages written; no file is written when it is 0
+        """
+        max_messages = self.memory_config.get("maxMessages", 25)
+        checkpoint = self._load_checkpoint(session_path, "transcript") if resume else None
+        progress = {"offset": 0}
+        pending_tool_calls = {}
+
+        if max_messages and max_messages > 0:
+            tail = deque(maxlen=max_messages)
+            if checkpoint:
+                tail.extend(message_from_dict(m) for m in checkpoint.get("messages", []))
+                pending_tool_calls = checkpoint.get("pending_tool_calls", {})
+                progress["offset"] = checkpoint.get("offset", 0)
+
+            tail.extend(self._iter_full_messages(session_path, pending_tool_calls, progress))
+            message_count = len(tail)
+
+            if message_count:
+                with open_memory_writer(output_path) as out:
+                    header = self._full_markdown_header(project, message_count, working_dir, created, session_id)
+                    out.write(header.encode("utf-8"))
+                    for msg in tail:
+                        out.write(self._render_full_message(msg).encode("utf-8"))
+
+            if resume:
+                self._save_checkpoint(session_path, "transcript", progress["offset"], {
+                    "messages": [m.to_dict() for m in tail],
+                    "pending_tool_calls": pending_tool_calls,
+                })
+            return message_count
+
+        # No message limit: spool the rendered body to disk
+        if resume:
+            spool_path = self.checkpoints.spool_path(session_path, "transcript")
+        else:
+            spool_path = output_path.with_name(f".{output_path.name}.body")
+
+        message_count = 0
+        spool_mode = "wb"
+        if checkpoint and spool_path.exists() and spool_path.stat().st_size == checkpoint.get("spool_size"):
+            message_count = checkpoint.get("message_count", 0)
+            pending_tool_calls = checkpoint.get("pending_tool_calls", {})
+            progress["offset"] = checkpoint.get("offset", 0)
+            spool_mode = "ab"
+
+        spool_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(spool_path, spool_mode) as spool:
+                for msg in self._iter_full_messages(session_path, pending_tool_calls, progress):
+                    spool.write(self._render_full_message(msg).encode("utf-8"))
+                    message_count += 1
+                spool_size = spool.tell()
+
+            if message_count:
+                header = self._full_markdown_header(project, message_count, working_dir, created, session_id)
+                with open_memory_writer(output_path) as out, open(spool_path, "rb") as spool:
+                    out.write(header.encode("utf-8"))
+                    shutil.copyfileobj(spool, out, 1024 * 1024)
+
+            if resume:
+                self._save_checkpoint(session_path, "transcript", progress["offset"], {
+                    "message_count": message_count,
+                    "pending_tool_calls": pending_tool_calls,
+                    "spool_size": spool_size,
+                })
+        finally:
+            if not resume:
+                try:
+                    os.unlink(spool_path)
+                except OSError:
+                    pass
+
+        return message_count
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Session State
+Small on-disk stores for per-session parser state
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger
+from utils import atomic_write_text
+
+log = setup_logger("claudememv2.state")
+
+
+class CheckpointStore:
+    """Remember how far each session file has already been parsed.
+
+    Claude Code session files are append-only, so a later parse can resume
+    from the last processed byte offset instead of re-reading from byte 0.
+    A checkpoint is discarded when the file's inode changes or the file
+    shrinks, since either means it is no longer the file we parsed.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.state_dir = Path(data_dir) / "state" / "checkpoints"
+
+    def _path_for(self, session_path: Path, mode: str) -> Path:
+        key = hashlib.sha1(str(Path(session_path).resolve()).encode("utf-8")).hexdigest()[:20]
+        return self.state_dir / f"{key}-{mode}.json"
+
+    def load(self, session_path: Path, mode: str, signature: str) -> Optional[dict]:
+        """Load a checkpoint if it is still valid for the session file.
+
+        Args:
+            session_path: Session JSONL file
+            mode: Parse mode the checkpoint belongs to ("summary" or "full")
+            signature: Hash of the parser settings that shaped the cached state
+
+        Returns:
+            Checkpoint dict, or None if there is no usable checkpoint
+        """
+        checkpoint_path = self._path_for(session_path, mode)
+        if not checkpoint_path.exists():
+            return None
+
+        try:
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            stat = Path(session_path).stat()
+        except (OSError, json.JSONDecodeError) as e:
+            log.debug("Ignoring unreadable checkpoint %s: %s", checkpoint_path, e)
+            return None
+
+        if checkpoint.get("signature") != signature:
+            return None
+        if checkpoint.get("inode") != stat.st_ino:
+            log.info("Session file replaced, discarding checkpoint: %s", session_path)
+            return None
+        if stat.st_size < checkpoint.get("size", 0) or stat.st_size < checkpoint.get("offset", 0):
+            log.info("Session file shrank, discarding checkpoint: %s", session_path)
+            return None
+
+        return checkpoint
+
+    def save(self, session_path: Path, mode: str, signature: str, offset: int, state: dict):
+        """Persist a checkpoint for the session file.
+
+        Args:
+            session_path: Session JSONL file
+            mode: Parse mode the checkpoint belongs to
+            signature: Hash of the parser settings that shaped the cached state
+            offset: Byte offset just past the last fully parsed line
+            state: Parser state to resume with (cached messages, pending tool calls, ...)
+        """
+        try:
+            stat = Path(session_path).stat()
+            checkpoint = {
+                "session_path": str(session_path),
+                "signature": signature,
+                "inode": stat.st_ino,
+                "size": stat.st_size,
+                "offset": offset,
+            }
+            checkpoint.update(state)
+
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(
+                self._path_for(session_path, mode),
+                json.dumps(checkpoint, ensure_ascii=False)
+            )
+        except OSError as e:
+            # A missing checkpoint only costs a full re-parse next time
+            log.warning("Could not write checkpoint for %s: %s", session_path, e)
+
+    def spool_path(self, session_path: Path, mode: str) -> Path:
+        """Path of a side file that holds output accumulated alongside a checkpoint."""
+        return self._path_for(session_path, mode).with_suffix(".spool")
+
+    def clear(self, session_path: Path):
+        """Remove all checkpoints for a session file."""
+        for mode in ("summary", "full", "transcript"):
+            for path in (self._path_for(session_path, mode), self.spool_path(session_path, mode)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+class SessionCatalog:
+    """Catalog of the latest session file in each Claude Code project directory.
+
+    Appending to a session file does not change its directory's mtime, so
+    every lookup lists each project directory again: one scandir per
+    project plus one stat per session file. The catalog is only rewritten
+    when the latest session of a project changed.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.catalog_path = Path(data_dir) / "state" / "session_catalog.json"
+
+    def _load(self) -> dict:
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, catalog: dict):
+        try:
+            self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.catalog_path, json.dumps(catalog, ensure_ascii=False))
+        except OSError as e:
+            log.warning("Could not write session catalog: %s", e)
+
+    @staticmethod
+    def latest_in_dir(project_dir: Path) -> tuple:
+        """Find the most recently modified session file in one project directory.
+
+        Returns:
+            (path, mtime) tuple, or (None, 0) if the directory has no sessions
+        """
+        latest_path = None
+        latest_mtime = 0
+        try:
+            with os.scandir(project_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".jsonl") or not entry.is_file():
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime > latest_mtime:
+                        latest_mtime = mtime
+                        latest_path = entry.path
+        except OSError:
+            return None, 0
+        return latest_path, latest_mtime
+
+    def latest_session(self, projects_dir: Path) -> Optional[Path]:
+        """Find the most recently modified session file across all projects."""
+        catalog = self._load()
+        projects = catalog.get("projects", {})
+        refreshed = {}
+
+        latest_path = None
+        latest_mtime = 0
+
+        try:
+            with os.scandir(projects_dir) as it:
+                project_entries = [entry for entry in it if entry.is_dir()]
+        except OSError:
+            return None
+
+        for entry in project_entries:
+            path, mtime = self.latest_in_dir(entry.path)
+            refreshed[entry.name] = {"latest": path, "latest_mtime": mtime}
+
+            if path and mtime > latest_mtime:
+                latest_mtime = mtime
+                latest_path = path
+
+        if refreshed != projects:
+            self._save({"projects": refreshed})
+
+        return Path(latest_path) if latest_path else None
+
+
+class SessionRegistry:
+    """Map Claude Code session IDs to the memory files saved for them.
+
+    Repeated saves of the same session look up the record here, update the
+    existing files in place and compare content hashes to skip unchanged
+    sessions entirely.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.state_dir = Path(data_dir) / "state" / "sessions"
+
+    def _path_for(self, session_id: str) -> Path:
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+        return self.state_dir / f"{safe_id}.json"
+
+    def lock_path(self, session_id: str) -> Path:
+        """Lock file held while a session is being saved (see utils.file_lock)."""
+        return self._path_for(session_id).with_suffix(".lock")
+
+    def load(self, session_id: str) -> Optional[dict]:
+        """Load the record of a saved session, or None if it was never saved."""
+        try:
+            with open(self._path_for(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, session_id: str, record: dict):
+        """Store the record of a saved session."""
+        record = dict(record, session_id=session_id)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self._path_for(session_id), json.dumps(record, ensure_ascii=False))
+
+    def records(self):
+        """Iterate over the records of all saved sessions."""
+        if not self.state_dir.exists():
+            return
+        for path in sorted(self.state_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    yield json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+
+    def delete(self, session_id: str):
+        """Forget a saved session."""
+        try:
+            os.unlink(self._path_for(session_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Storage
+Transparent compression and cold tiering for full/ transcripts
+"""
+
+import gzip
+import importlib.util
+import io
+import os
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from logger import setup_logger
+from utils import atomic_open
+
+log = setup_logger("claudememv2.storage")
+
+# zstd is optional; gzip from the standard library is always available.
+# The module itself is only imported once a .zst file is actually touched.
+HAS_ZSTD = importlib.util.find_spec("zstandard") is not None
+
+
+def _zstandard():
+    import zstandard
+    return zstandard
+
+# Codec -> file suffix appended after ".md"
+CODEC_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Compression levels: fast for freshly saved files, strong for the cold tier
+HOT_LEVELS = {"gzip": 6, "zstd": 3}
+COLD_LEVELS = {"gzip": 9, "zstd": 19}
+
+COLD_DIR_NAME = "cold"
+
+
+def resolve_codec(codec: Optional[str]) -> str:
+    """Map a configured codec to one that is usable here ("none", "gzip" or "zstd")."""
+    codec = (codec or "none").lower()
+    if codec not in CODEC_SUFFIXES:
+        log.warning("Unknown compression codec '%s', storing uncompressed", codec)
+        return "none"
+    if codec == "zstd" and not HAS_ZSTD:
+        log.warning("zstandard is not installed, falling back to gzip")
+        return "gzip"
+    return codec
+
+
+def codec_for_path(path: Path) -> str:
+    """Get the codec of a memory file from its suffix."""
+    name = Path(path).name
+    if name.endswith(".md.gz"):
+        return "gzip"
+    if name.endswith(".md.zst"):
+        return "zstd"
+    return "none"
+
+
+def is_memory_file(path: Path) -> bool:
+    """Check whether a path is a memory file (plain or compressed markdown)."""
+    name = Path(path).name
+    return not name.startswith(".") and (name.endswith(".md") or name.endswith(".md.gz") or name.endswith(".md.zst"))
+
+
+def logical_name(path: Path) -> str:
+    """Get the markdown filename of a memory file without its compression suffix."""
+    name = Path(path).name
+    for suffix in (".gz", ".zst"):
+        if name.endswith(".md" + suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def full_file_name(filename: str, codec: str) -> str:
+    """Get the on-disk name of a full transcript stored with a codec."""
+    return filename + CODEC_SUFFIXES[codec]
+
+
+def iter_full_files(full_dir: Path):
+    """Iterate over all full transcripts of a project, hot and cold tier."""
+    for directory in (full_dir, full_dir / COLD_DIR_NAME):
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.iterdir()):
+            if path.is_file() and is_memory_file(path):
+                yield path
+
+
+def find_full_files(full_dir: Path, filename: str) -> list:
+    """Find every stored variant of the full transcript that pairs with a summary file."""
+    found = []
+    for directory in (full_dir, full_dir / COLD_DIR_NAME):
+        for suffix in CODEC_SUFFIXES.values():
+            path = directory / (filename + suffix)
+            if path.exists():
+                found.append(path)
+    return found
+
+
+def open_memory_text(path: Path):
+    """Open a memory file for reading as text, decompressing transparently."""
+    codec = codec_for_path(path)
+    if codec == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if codec == "zstd":
+        if not HAS_ZSTD:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        raw = open(path, "rb")
+        reader = _zstandard().ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_memory_text(path: Path) -> str:
+    """Read a memory file as text, decompressing transparently."""
+    with open_memory_text(path) as f:
+        return f.read()
+
+
+def uncompressed_size(path: Path) -> Optional[int]:
+    """Get the uncompressed size of a memory file without decompressing it.
+
+    Returns:
+        Size in bytes, or None if the container does not record it
+    """
+    codec = codec_for_path(path)
+    if codec == "none":
+        return Path(path).stat().st_size
+    try:
+        if codec == "gzip":
+            # ISIZE trailer: size modulo 2^32, fine for transcripts
+            with open(path, "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                return struct.unpack("<I", f.read(4))[0]
+        if codec == "zstd" and HAS_ZSTD:
+            with open(path, "rb") as f:
+                params = _zstandard().get_frame_parameters(f.read(18))
+            if params.content_size > 0:
+                return params.content_size
+    except Exception as e:
+        log.debug("Could not read uncompressed size of %s: %s", path, e)
+    return None
+
+
+@contextmanager
+def open_memory_writer(path: Path, level: Optional[int] = None):
+    """Open a memory file for atomic binary writing, compressing by its suffix.
+
+    Args:
+        path: Target path; ".md.gz" / ".md.zst" select the codec
+        level: Compression level (default: the hot-tier level of the codec)
+    """
+    codec = codec_for_path(path)
+    with atomic_open(path, "wb") as raw:
+        if codec == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level or HOT_LEVELS["gzip"], mtime=0) as f:
+                yield f
+        elif codec == "zstd":
+            compressor = _zstandard().ZstdCompressor(level=level or HOT_LEVELS["zstd"], write_content_size=True)
+            with compressor.stream_writer(raw, closefd=False) as f:
+                yield f
+        else:
+            yield raw
+
+
+def tier_cold_files(memory_dir: Path, days: int, codec: str) -> list:
+    """Recompress full transcripts older than N days into the cold tier.
+
+    Files move from <project>/full/ to <project>/full/cold/ and are rewritten
+    with the strongest level of the codec, keeping their mtime.
+
+    Args:
+        memory_dir: Root memory directory
+        days: Age threshold in days (0 disables tiering)
+        codec: Codec for the cold tier ("gzip" or "zstd")
+
+    Returns:
+        List of (old_path, new_path) tuples for files that moved
+    """
+    if not days or days <= 0 or not memory_dir.exists():
+        return []
+
+    codec = resolve_codec(codec)
+    if codec == "none":
+        codec = "zstd" if HAS_ZSTD else "gzip"
+
+    cutoff = time.time() - days * 24 * 60 * 60
+    moved = []
+
+    for project_dir in memory_dir.iterdir():
+        full_dir = project_dir / "full"
+        if not full_dir.is_dir():
+            continue
+
+        for path in list(full_dir.iterdir()):
+            if not path.is_file() or not is_memory_file(path):
+                continue
+            stat = path.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+
+            cold_dir = full_dir / COLD_DIR_NAME
+            cold_dir.mkdir(exist_ok=True)
+            new_path = cold_dir / full_file_name(logical_name(path), codec)
+
+            try:
+                with open_memory_text(path) as src, open_memory_writer(new_path, COLD_LEVELS[codec]) as dst:
+                    while True:
+                        block = src.read(1024 * 1024)
+                        if not block:
+                            break
+                        dst.write(block.encode("utf-8"))
+                os.utime(new_path, (stat.st_atime, stat.st_mtime))
+                path.unlink()
+                moved.append((path, new_path))
+            except (OSError, RuntimeError) as e:
+                log.warning("Could not move %s to the cold tier: %s", path, e)
+
+    if moved:
+        log.info("Moved %d full transcripts to the cold tier", len(moved))
+    return moved
+
+
+def measure_read_throughput(paths: list, max_bytes: int = 32 * 1024 * 1024) -> Optional[dict]:
+    """Time reading (and decompressing) a sample of memory files.
+
+    Args:
+        paths: Candidate files, most interesting first
+        max_bytes: Stop after reading this many uncompressed bytes
+
+    Returns:
+        Dict with 'files', 'bytes', 'seconds' and 'mb_per_sec', or None if nothing was read
+    """
+    files = 0
+    total = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            with open_memory_text(path) as f:
+                while True:
+                    block = f.read(1024 * 1024)
+                    if not block:
+                        break
+                    total += len(block.encode("utf-8"))
+        except (OSError, RuntimeError):
+            continue
+        files += 1
+        if total >= max_bytes:
+            break
+    elapsed = time.perf_counter() - start
+
+    if not files:
+        return None
+    return {
+        "files": files,
+        "bytes": total,
+        "seconds": elapsed,
+        "mb_per_sec": (total / (1024 * 1024)) / elapsed if elapsed > 0 else 0.0,
+    }
+
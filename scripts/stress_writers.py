@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Claudememv2 Stress Test
+Run many concurrent savers and indexers against one data directory (development tool)
+
+Usage:
+    python stress_writers.py --savers 8 --sessions 6 --indexers 2 --rounds 3
+
+Every saver appends to a synthetic session and saves it, the way several
+Claude Code sessions (plus auto-save workers) do; indexers run full index
+passes at the same time. Sessions are spread over a few projects and, with
+--sessions below --savers, shared by several savers. Without --api the
+slug falls back to the time of day, so savers in one project collide on
+file names on purpose. Exits with status 1 if any check fails.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def _make_config(home: Path, chunk_storage: str) -> dict:
+    return {
+        "model": {"source": "inherit", "customModelId": None, "fallback": "claude-3-haiku-20240307"},
+        "memory": {
+            "dataDir": str(home / ".claude" / "Claudememv2-data"),
+            "contentScope": "standard",
+            "includeThinking": False,
+            "includeToolCalls": True,
+            "maxMessages": 25,
+            "searchScope": "both",
+        },
+        "summary": {"enabled": True, "format": "structured", "timing": "on_save"},
+        "search": {"chunkStorage": chunk_storage},
+    }
+
+
+def _append_turns(session_path: Path, cwd: str, session_id: str, turns: int, tag: str):
+    """Append user/assistant turns to a synthetic session file."""
+    with open(session_path, "a", encoding="utf-8") as f:
+        for i in range(turns):
+            for role, text in (("user", f"question {tag}-{i} about module_{i}.py"),
+                               ("assistant", f"answer {tag}-{i}: changed module_{i}.py and ran the tests")):
+                f.write(json.dumps({
+                    "type": role, "cwd": cwd, "sessionId": session_id,
+                    "message": {"role": role, "content": text},
+                }) + "\n")
+
+
+def _saver(config: dict, session: dict, worker: int, rounds: int, start_at: float, use_api: bool) -> dict:
+    import session_parser
+    from search_engine import SearchEngine
+
+    if not use_api:
+        session_parser.HAS_ANTHROPIC = False
+
+    time.sleep(max(0.0, start_at - time.time()))
+    stats = {"saves": 0, "errors": [], "seconds": 0.0}
+    for round_no in range(rounds):
+        _append_turns(Path(session["path"]), session["cwd"], session["id"], 3, f"w{worker}r{round_no}")
+        started = time.perf_counter()
+        try:
+            parser = session_parser.SessionParser(config)
+            result = parser.save_session(session_path=Path(session["path"]), working_dir=session["cwd"])
+            if result["status"] != "unchanged":
+                paths = [result["file_path"]] + ([result["full_file_path"]] if result.get("full_file_path") else [])
+                SearchEngine(config).index_paths(paths, removed=result.get("removed_paths"))
+            stats["saves"] += 1
+        except Exception:
+            stats["errors"].append(traceback.format_exc(limit=3))
+        stats["seconds"] += time.perf_counter() - started
+    return stats
+
+
+def _indexer(config: dict, rounds: int, start_at: float) -> dict:
+    from search_engine import SearchEngine
+
+    time.sleep(max(0.0, start_at - time.time()))
+    stats = {"saves": 0, "errors": [], "seconds": 0.0}
+    for _ in range(rounds):
+        started = time.perf_counter()
+        try:
+            SearchEngine(config).index()
+        except Exception:
+            stats["errors"].append(traceback.format_exc(limit=3))
+        stats["seconds"] += time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent save/index stress test for Claudememv2")
+    parser.add_argument("--savers", type=int, default=8, help="Concurrent saver processes (default: 8)")
+    parser.add_argument("--sessions", type=int, help="Distinct sessions shared by the savers (default: one per saver)")
+    parser.add_argument("--projects", type=int, default=2, help="Projects the sessions are spread over (default: 2)")
+    parser.add_argument("--indexers", type=int, default=2, help="Concurrent full index() processes (default: 2)")
+    parser.add_argument("--rounds", type=int, default=3, help="Saves or index passes per process (default: 3)")
+    parser.add_argument("--home", help="Home directory to use (default: a new temporary directory)")
+    parser.add_argument("--api", action="store_true", help="Call the Claude API for slugs and summaries")
+    parser.add_argument("--chunk-storage", choices=["inline", "reference"], default="inline",
+                        help="search.chunkStorage of the test archive (default: inline)")
+    args = parser.parse_args()
+
+    home = Path(args.home or tempfile.mkdtemp(prefix="claudememv2-stress-"))
+    # Logs and session lookups of the workers stay inside the test home
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+    sys.path.insert(0, str(Path(__file__).parent))
+
+    config = _make_config(home, args.chunk_storage)
+    session_count = max(1, min(args.sessions or args.savers, args.savers))
+    sessions = []
+    for i in range(session_count):
+        cwd = str(home / "work" / f"project-{i % max(1, args.projects)}")
+        session_id = str(uuid.uuid4())
+        session_dir = home / ".claude" / "projects" / cwd.replace(os.sep, "-")
+        session_dir.mkdir(parents=True, exist_ok=True)
+        session_path = session_dir / f"{session_id}.jsonl"
+        _append_turns(session_path, cwd, session_id, 3, "init")
+        sessions.append({"id": session_id, "cwd": cwd, "path": str(session_path)})
+
+    print(f"[STRESS] {args.savers} savers on {session_count} sessions, {args.indexers} indexers, "
+          f"{args.rounds} rounds in {home}")
+
+    start_at = time.time() + 1.0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.savers + args.indexers) as pool:
+        futures = [pool.submit(_saver, config, sessions[i % session_count], i, args.rounds, start_at, args.api)
+                   for i in range(args.savers)]
+        futures += [pool.submit(_indexer, config, args.rounds, start_at) for _ in range(args.indexers)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started - 1.0
+
+    from search_engine import SearchEngine
+    from session_state import SessionRegistry
+
+    errors = [error for result in results for error in result["errors"]]
+    saves = sum(result["saves"] for result in results)
+
+    memory_dir = Path(config["memory"]["dataDir"]) / "memory"
+    summaries = sorted(memory_dir.glob("*/*.md"))
+    empty = [path for path in summaries if path.stat().st_size == 0]
+    registry = SessionRegistry(Path(config["memory"]["dataDir"]))
+    recorded = [registry.load(session["id"]) for session in sessions]
+    recorded_files = [record["file_path"] for record in recorded if record]
+    report = SearchEngine(config).verify()
+
+    checks = [
+        ("no errors", not errors),
+        ("one summary per session", len(summaries) == session_count),
+        ("no empty placeholder files", not empty),
+        ("every session recorded once", len(set(recorded_files)) == len(recorded_files) == session_count),
+        ("no unindexed files", report["unindexed"] == 0),
+        ("no orphaned index rows", report["orphaned"] == 0),
+        ("aggregates consistent", not report["drifted"]),
+        ("FTS integrity", report["fts_ok"]),
+    ]
+
+    print(f"  Saves: {saves} in {elapsed:.1f} s")
+    print(f"  Summary files: {len(summaries)}")
+    for name, ok in checks:
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+    for error in errors[:5]:
+        print(error, file=sys.stderr)
+
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
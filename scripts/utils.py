@@ -4,9 +4,13 @@ Claudememv2 Utilities
 Shared utility functions for path handling and model configuration
 """
 
+import importlib.util
 import json
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
@@ -24,6 +28,24 @@ def get_home_dir() -> Path:
     return Path.home()
 
 
+def has_anthropic() -> bool:
+    """Check whether the anthropic package is installed, without importing it."""
+    return importlib.util.find_spec("anthropic") is not None
+
+
+def get_anthropic_client():
+    """Create an Anthropic API client.
+
+    The anthropic package is imported here rather than at module load,
+    since importing it dominates CLI startup time for commands that never
+    call the API.
+    """
+    from profiler import profiler
+    with profiler.span("api.client"):
+        import anthropic
+        return anthropic.Anthropic()
+
+
 def get_model(model_config: dict) -> str:
     """Get the model to use from config.
 
@@ -69,3 +91,93 @@ def get_model(model_config: dict) -> str:
         pass
 
     return model_config.get("fallback", "claude-3-haiku-20240307")
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = "w"):
+    """Open a file for writing so that it only appears once fully written.
+
+    Content goes to a temporary file in the same directory, which is renamed
+    over the target when the block exits without error and removed otherwise.
+
+    Args:
+        path: Target file path
+        mode: "w" for UTF-8 text or "wb" for bytes
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: Path, content: str):
+    """Write text to a file atomically.
+
+    Args:
+        path: Target file path
+        content: Text to write (UTF-8)
+    """
+    with atomic_open(path, "w") as f:
+        f.write(content)
+
+
+def _try_lock(f, blocking: bool):
+    """Take an exclusive lock on an open file; raises OSError if it is held elsewhere."""
+    if sys.platform == "win32":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock(f):
+    if sys.platform == "win32":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path: Path, timeout: Optional[float] = None):
+    """Hold an exclusive advisory lock on a lock file for the duration of the block.
+
+    The lock is tied to the open file, so it is released by the OS if the
+    process dies while holding it.
+
+    Args:
+        path: Lock file (created if missing)
+        timeout: Seconds to wait; None waits indefinitely, 0 tries once
+
+    Raises:
+        TimeoutError: If the lock could not be acquired in time
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                _try_lock(f, blocking=deadline is None and sys.platform != "win32")
+                break
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Lock is held by another process: {path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _unlock(f)
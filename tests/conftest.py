@@ -0,0 +1,61 @@
+"""Shared fixtures: an isolated home directory, a config pointing into it, synthetic sessions."""
+
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+
+def append_turns(session: dict, turns: int, tag: str):
+    """Append user/assistant turns to a synthetic session file."""
+    with open(session["path"], "a", encoding="utf-8") as f:
+        for i in range(turns):
+            for role, text in (("user", f"question {tag}-{i} about module_{i}.py"),
+                               ("assistant", f"answer {tag}-{i}: changed module_{i}.py and ran the tests")):
+                f.write(json.dumps({
+                    "type": role, "cwd": session["cwd"], "sessionId": session["id"],
+                    "timestamp": f"2026-10-01T10:{i % 60:02d}:00Z",
+                    "message": {"role": role, "content": text},
+                }) + "\n")
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def config(home):
+    return {
+        "model": {"source": "inherit", "customModelId": None, "fallback": "claude-3-haiku-20240307"},
+        "memory": {"dataDir": str(home / ".claude" / "Claudememv2-data"), "maxMessages": 25, "searchScope": "both"},
+        "summary": {"enabled": True, "format": "structured", "timing": "on_save"},
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_api(monkeypatch):
+    """Keep every test off the network: slugs and summaries fall back locally."""
+    import search_engine
+    import session_parser
+
+    monkeypatch.setattr(session_parser, "HAS_ANTHROPIC", False)
+    monkeypatch.setattr(search_engine, "HAS_ANTHROPIC", False)
+
+
+@pytest.fixture
+def session(home):
+    cwd = str(home / "work" / "demo")
+    session_id = str(uuid.uuid4())
+    session_dir = home / ".claude" / "projects" / cwd.replace(os.sep, "-")
+    session_dir.mkdir(parents=True)
+    session = {"id": session_id, "cwd": cwd, "path": session_dir / f"{session_id}.jsonl"}
+    append_turns(session, 5, "init")
+    return session
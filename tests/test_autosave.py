@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+
+from autosave import AutoSaver
+from utils import atomic_write_text
+
+
+def test_worker_saves_request_queued_during_save(config, session, monkeypatch):
+    config["hooks"] = {"autoSave": {"debounceSeconds": 0}}
+    saver = AutoSaver(config)
+    spawned, saved = [], []
+    monkeypatch.setattr(saver, "_spawn_worker", spawned.append)
+
+    hook_input = {"session_id": session["id"], "transcript_path": str(session["path"]), "cwd": session["cwd"]}
+    saver.request(hook_input)
+    pending_path = saver._paths(session["id"])[0]
+    queued = json.loads(pending_path.read_text(encoding="utf-8"))
+
+    def save(request):
+        saved.append(request)
+        if len(saved) == 1:
+            # A Stop event that read the pending request before the worker
+            # claimed it writes a new one and starts no worker
+            atomic_write_text(pending_path, json.dumps(dict(queued, requested_at=time.time())))
+        return {"status": "updated"}
+
+    monkeypatch.setattr(saver, "_save", save)
+    assert saver.run_worker(session["id"]) == {"status": "updated"}
+    assert len(saved) == 2
+    assert spawned == [session["id"]]
+    assert not pending_path.exists()
+
+
+def test_request_read_before_claim_is_not_orphaned(config, session, monkeypatch):
+    config["hooks"] = {"autoSave": {"debounceSeconds": 0}}
+    hook, worker = AutoSaver(config), AutoSaver(config)
+    spawned, saved = [], []
+    monkeypatch.setattr(hook, "_spawn_worker", spawned.append)
+    monkeypatch.setattr(worker, "_save", lambda request: saved.append(request) or {"status": "updated"})
+
+    hook_input = {"session_id": session["id"], "transcript_path": str(session["path"]), "cwd": session["cwd"]}
+    hook.request(hook_input)
+    pending_path = hook._paths(session["id"])[0]
+
+    # Pause the next Stop event right after it found the pending request
+    read, resume = threading.Event(), threading.Event()
+    load = hook._load
+
+    def paused_load(path):
+        previous = load(path)
+        read.set()
+        resume.wait(5)
+        return previous
+
+    monkeypatch.setattr(hook, "_load", paused_load)
+    stop_event = threading.Thread(target=hook.request, args=(hook_input,))
+    stop_event.start()
+    assert read.wait(5)
+
+    # The worker runs to completion while the Stop event is paused
+    result = []
+    run = threading.Thread(target=lambda: result.append(worker.run_worker(session["id"])))
+    run.start()
+    run.join(0.5)
+    resume.set()
+    stop_event.join(5)
+    run.join(5)
+    assert result == [{"status": "updated"}]
+
+    # Either the worker saved the new request, or the Stop event started a worker for it
+    assert not pending_path.exists() or len(spawned) == 2
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import pytest
+
+from backfill import Backfiller, _prepare_session
+
+
+def test_failed_save_removes_staged_transcript(config, session, monkeypatch):
+    backfiller = Backfiller(config, workers=1, api_rate=0)
+    prepared = _prepare_session(config, str(session["path"]))
+    staging = Path(prepared["full_staging"])
+    assert staging.exists()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    generate_markdown = backfiller.parser._generate_markdown
+    monkeypatch.setattr(backfiller.parser, "_generate_markdown", fail)
+    with pytest.raises(OSError):
+        backfiller._save_prepared(prepared)
+    assert not staging.exists()
+    assert list(staging.parent.iterdir()) == []
+
+    # A successful save moves the staged transcript into place
+    monkeypatch.setattr(backfiller.parser, "_generate_markdown", generate_markdown)
+    prepared = _prepare_session(config, str(session["path"]))
+    backfiller._save_prepared(prepared)
+    assert list(Path(prepared["full_staging"]).parent.iterdir()) == []
+    assert backfiller.parser.sessions.load(session["id"])["full_file_path"]
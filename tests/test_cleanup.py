@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from search_engine import SearchEngine
+
+DAY = 24 * 60 * 60
+
+
+def _write_memory(memory_dir: Path, name: str, age_days: float, size: int = 1000, summary: bool = True):
+    """A summary and its full transcript, `size` bytes each, last modified `age_days` ago."""
+    mtime = time.time() - age_days * DAY
+    paths = [memory_dir / "proj" / "full" / name]
+    if summary:
+        paths.append(memory_dir / "proj" / name)
+    for path in paths:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"# {name}\n" + "x" * (size - len(name) - 3), encoding="utf-8")
+        os.utime(path, (mtime, mtime))
+
+
+def test_age_and_quota_delete_only_what_the_quota_needs(config):
+    engine = SearchEngine(config)
+    for name, age in (("a.md", 40), ("b.md", 3), ("c.md", 2), ("d.md", 1)):
+        _write_memory(engine.memory_dir, name, age)
+    # Gone summary: the memory is as old as its full transcript
+    _write_memory(engine.memory_dir, "e.md", 50, summary=False)
+    engine.index()
+
+    # The aged memory was searched recently, so it ranks first under --lru
+    conn = sqlite3.connect(engine.db_path)
+    conn.execute("UPDATE catalog SET last_hit = ? WHERE name = 'a.md'", (time.time(),))
+    conn.commit()
+    conn.close()
+
+    # a and e go by age; of b, c and d (6000 bytes) only b must go to fit 4500
+    victims = engine.select_cleanup(days=30, max_total_bytes=4500, by_search=True)
+    assert sorted(victim["name"] for victim in victims) == ["a.md", "b.md", "e.md"]
+    victims = engine.select_cleanup(days=30, max_project_bytes=4500, by_search=True)
+    assert sorted(victim["name"] for victim in victims) == ["a.md", "b.md", "e.md"]
+
+    assert sorted(victim["name"] for victim in engine.select_cleanup(days=30)) == ["a.md", "e.md"]
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+MEMORY_CORE = Path(__file__).resolve().parent.parent / "scripts" / "memory_core.py"
+
+
+def _cli(home: Path, *args) -> None:
+    env = dict(os.environ, HOME=str(home), USERPROFILE=str(home))
+    subprocess.run([sys.executable, str(MEMORY_CORE), *args], env=env, check=True, capture_output=True)
+
+
+def _exported_projects(path: Path) -> set:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    return {record["project"] for record in records if record["type"] == "file"}
+
+
+def _write_memory(home: Path, project: str, name: str):
+    project_dir = home / ".claude" / "Claudememv2-data" / "memory" / project
+    project_dir.mkdir(parents=True, exist_ok=True)
+    (project_dir / name).write_text(f"# {project}\n\nnotes of {project}\n", encoding="utf-8")
+
+
+def test_filtered_export_keeps_unfiltered_watermark(home, tmp_path):
+    _write_memory(home, "alpha", "2026-10-01-a.md")
+    _write_memory(home, "beta", "2026-10-01-b.md")
+
+    _cli(home, "export", "--since", "last", "--project", "alpha", "-o", str(tmp_path / "alpha.ndjson"))
+    assert _exported_projects(tmp_path / "alpha.ndjson") == {"alpha"}
+
+    # beta changed before the filtered export's watermark and was never exported
+    _cli(home, "export", "--since", "last", "-o", str(tmp_path / "all.ndjson"))
+    assert _exported_projects(tmp_path / "all.ndjson") == {"alpha", "beta"}
+
+    # Each watermark moves on independently
+    _write_memory(home, "beta", "2026-10-02-b.md")
+    _cli(home, "export", "--since", "last", "--project", "alpha", "-o", str(tmp_path / "alpha2.ndjson"))
+    assert _exported_projects(tmp_path / "alpha2.ndjson") == set()
+    _cli(home, "export", "--since", "last", "-o", str(tmp_path / "all2.ndjson"))
+    assert _exported_projects(tmp_path / "all2.ndjson") == {"beta"}
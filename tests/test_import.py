@@ -0,0 +1,52 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from importer import Importer
+
+NAME = "proj/2026-10-01-notes.md"
+
+
+def _export(path: Path, *records) -> Path:
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def _file(content: str, rel_path: str = NAME) -> dict:
+    return {"type": "file", "project": rel_path.split("/")[0], "path": rel_path, "content": content,
+            "modified": "2026-10-01T12:00:00"}
+
+
+def test_import_keeps_local_changes_made_since_the_last_import(config, tmp_path):
+    importer = Importer(config)
+    local = importer.memory_dir / NAME
+
+    # A file that only ever came from imports is updated by the next one
+    assert importer.run(_export(tmp_path / "1.ndjson", _file("# v1\n")))["imported"] == 1
+    stats = Importer(config).run(_export(tmp_path / "2.ndjson", _file("# v2\n")))
+    assert (stats["imported"], stats["conflicts"]) == (1, 0)
+    assert local.read_text(encoding="utf-8") == "# v2\n"
+
+    # Changed here after that import: neither overwritten nor deleted
+    local.write_text("# edited locally\n", encoding="utf-8")
+    later = time.time() + 5
+    os.utime(local, (later, later))
+    stats = Importer(config).run(_export(tmp_path / "3.ndjson", _file("# v3\n")))
+    assert (stats["imported"], stats["conflicts"]) == (0, 1)
+    stats = Importer(config).run(_export(tmp_path / "4.ndjson", {"type": "delete", "project": "proj", "path": NAME}))
+    assert (stats["deleted"], stats["conflicts"]) == (0, 1)
+    assert local.read_text(encoding="utf-8") == "# edited locally\n"
+
+
+def test_first_import_does_not_overwrite_a_local_memory_of_the_same_name(config, tmp_path):
+    importer = Importer(config)
+    local = importer.memory_dir / NAME
+    local.parent.mkdir(parents=True)
+    local.write_text("# another session saved here\n", encoding="utf-8")
+
+    stats = importer.run(_export(tmp_path / "1.ndjson", _file("# remote\n"), _file("# new\n", "proj/2026-10-02-other.md")))
+    assert (stats["imported"], stats["conflicts"]) == (1, 1)
+    assert local.read_text(encoding="utf-8") == "# another session saved here\n"
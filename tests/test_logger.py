@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent.parent / "scripts"
+
+WRITER = """
+import sys
+sys.path.insert(0, {scripts!r})
+from logger import configure_logging, setup_logger
+configure_logging({{"logging": {{"maxBytes": 4096, "backupCount": 1000}}}})
+log = setup_logger("claudememv2.test")
+for i in range({records}):
+    log.info("proc-%s record %d", sys.argv[1], i)
+"""
+
+
+def test_concurrent_writers_lose_no_records_across_rollovers(home):
+    processes, records = 4, 400
+    script = WRITER.format(scripts=str(SCRIPTS), records=records)
+    env = dict(os.environ, HOME=str(home), USERPROFILE=str(home))
+    writers = [subprocess.Popen([sys.executable, "-c", script, str(n)], env=env) for n in range(processes)]
+    assert all(writer.wait(timeout=60) == 0 for writer in writers)
+
+    log_dir = home / ".claude" / "Claudememv2-data" / "logs"
+    lines = []
+    for path in log_dir.glob("memory.log*"):
+        if not path.name.endswith(".lock"):
+            lines += [line for line in path.read_text(encoding="utf-8").splitlines() if "proc-" in line]
+    assert len(lines) == processes * records
+    assert len(set(lines)) == len(lines)
+    # Rotation still happened, and no file grew far past the limit
+    assert len(list(log_dir.glob("memory.log.*"))) > 1
+    assert max(path.stat().st_size for path in log_dir.glob("memory.log*")) < 4096 * 2
+
+
+def _log_records(worker: int, records: int) -> tuple:
+    from logger import _writer, setup_logger
+    log = setup_logger("claudememv2.test")
+    for i in range(records):
+        log.info("pool-%d record %d", worker, i)
+    # Written synchronously, nothing left in a queue when the pool ends the worker
+    return _writer._started, _writer._direct_handler is not None
+
+
+def test_spawned_pool_workers_write_directly(home):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from logger import write_directly
+
+    workers, records = 3, 200
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=write_directly) as pool:
+        modes = list(pool.map(_log_records, range(workers), [records] * workers))
+    assert modes == [(False, True)] * workers
+
+    log_path = home / ".claude" / "Claudememv2-data" / "logs" / "memory.log"
+    lines = [line for line in log_path.read_text(encoding="utf-8").splitlines() if "pool-" in line]
+    assert len(lines) == workers * records
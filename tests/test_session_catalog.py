@@ -0,0 +1,31 @@
+import os
+import time
+
+from session_state import SessionCatalog
+
+
+def _touch(path, age: float):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "user"}\n')
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_append_to_older_session_makes_it_latest(home):
+    projects_dir = home / ".claude" / "projects"
+    older = projects_dir / "-work-a" / "older.jsonl"
+    newer = projects_dir / "-work-a" / "newer.jsonl"
+    other = projects_dir / "-work-b" / "other.jsonl"
+    _touch(older, 300)
+    _touch(newer, 200)
+    _touch(other, 100)
+    dir_mtimes = {path.parent: path.parent.stat().st_mtime_ns for path in (older, other)}
+
+    catalog = SessionCatalog(home / ".claude" / "Claudememv2-data")
+    assert catalog.latest_session(projects_dir) == other
+
+    # Going back to an older session only changes that file's mtime
+    _touch(older, 0)
+    assert {path: path.stat().st_mtime_ns for path in dir_mtimes} == dir_mtimes
+    assert catalog.latest_session(projects_dir) == older
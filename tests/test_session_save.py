@@ -0,0 +1,129 @@
+import base64
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from conftest import append_turns
+from search_engine import SearchEngine
+from session_parser import SessionParser
+from storage import COLD_DIR_NAME, find_full_files, read_memory_text
+
+
+def _indexed_full_files(engine: SearchEngine) -> list:
+    conn = sqlite3.connect(engine.db_path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT path FROM files WHERE path LIKE '%/full/%'"))
+    finally:
+        conn.close()
+
+
+def test_resave_replaces_cold_tiered_transcript(config, session):
+    parser = SessionParser(config)
+    first = parser.save_session(session_path=session["path"], working_dir=session["cwd"])
+    SearchEngine(config).index()
+
+    # Age the transcript past the cold tier threshold and let index() move it
+    hot = Path(first["full_file_path"])
+    old = time.time() - 40 * 24 * 60 * 60
+    os.utime(hot, (old, old))
+    config["memory"]["coldTierDays"] = 30
+    SearchEngine(config).index()
+    assert not hot.exists()
+    full_dir = hot.parent
+    assert [path.parent.name for path in find_full_files(full_dir, Path(first["file_path"]).name)] == [COLD_DIR_NAME]
+
+    append_turns(session, 3, "more")
+    second = parser.save_session(session_path=session["path"], working_dir=session["cwd"])
+    assert second["status"] == "updated"
+    engine = SearchEngine(config)
+    engine.index_paths([second["file_path"], second["full_file_path"]], removed=second.get("removed_paths"))
+
+    remaining = find_full_files(full_dir, Path(second["file_path"]).name)
+    assert remaining == [Path(second["full_file_path"])]
+    expected = [str(Path(second["full_file_path"]).relative_to(engine.memory_dir))]
+    assert _indexed_full_files(engine) == expected
+
+    engine.index()
+    assert _indexed_full_files(engine) == expected
+
+
+def test_malformed_base64_block_does_not_abort_save(config, session):
+    valid = base64.b64encode(b"\x89PNG fake image bytes").decode()
+    with open(session["path"], "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "type": "assistant", "cwd": session["cwd"], "sessionId": session["id"],
+            "message": {"role": "assistant", "content": [
+                {"type": "tool_use", "id": "t-img", "name": "Read", "input": {"file_path": "/repo/shot.png"}},
+            ]},
+        }) + "\n")
+        f.write(json.dumps({
+            "type": "user", "cwd": session["cwd"], "sessionId": session["id"],
+            "message": {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t-img", "content": [
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": valid}},
+                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "iVBORw0K!!truncated"}},
+            ]}]},
+        }) + "\n")
+
+    result = SessionParser(config).save_session(session_path=session["path"], working_dir=session["cwd"])
+
+    transcript = read_memory_text(Path(result["full_file_path"]))
+    assert transcript.count("sha256:") == 1
+    assert "iVBORw0K!!truncated" in transcript
+
+
+def test_failed_summary_keeps_previous_summary_state(config, session, monkeypatch):
+    import session_parser
+    from prompt_cache import StandInClient
+
+    client = StandInClient(lambda request: "## 会话主题\n第一次摘要")
+    monkeypatch.setattr(session_parser, "HAS_ANTHROPIC", True)
+    monkeypatch.setattr(session_parser, "get_anthropic_client", lambda: client)
+    parser = SessionParser(config)
+    parser.save_session(session_path=session["path"], working_dir=session["cwd"])
+    saved = parser.sessions.load(session["id"])
+    assert saved["summary"] == "## 会话主题\n第一次摘要"
+
+    def fail(**request):
+        raise RuntimeError("API unavailable")
+
+    monkeypatch.setattr(client.messages, "create", fail)
+    append_turns(session, 2, "more")
+    assert parser.save_session(session_path=session["path"], working_dir=session["cwd"])["status"] == "updated"
+    kept = parser.sessions.load(session["id"])
+    assert {key: kept.get(key) for key in session_parser.SUMMARY_STATE_KEYS} == \
+        {key: saved[key] for key in session_parser.SUMMARY_STATE_KEYS}
+
+    # The next save updates the kept summary with every turn added since
+    client = StandInClient(lambda request: "## 会话主题\n更新后的摘要")
+    append_turns(session, 2, "last")
+    parser.save_session(session_path=session["path"], working_dir=session["cwd"])
+    prompt = client.calls[0]["request"]["messages"][0]["content"]
+    prompt = prompt if isinstance(prompt, str) else "".join(block["text"] for block in prompt)
+    assert "第一次摘要" in prompt and "more-0" in prompt and "last-1" in prompt
+    assert parser.sessions.load(session["id"])["summary"] == "## 会话主题\n更新后的摘要"
+
+
+def _window_state(parser: SessionParser, messages: list) -> dict:
+    return {"summary": "## 会话主题\n旧摘要", "summary_digests": parser._message_digests(messages),
+            "summary_signature": parser._summary_signature()}
+
+
+def test_slid_window_must_overlap_the_summarized_messages(config):
+    from models import Message
+
+    config["memory"]["maxMessages"] = 6
+    parser = SessionParser(config)
+    msgs = [Message("user" if i % 2 == 0 else "assistant", f"message {i}") for i in range(12)]
+    yes = Message("user", "yes")
+
+    # A real slide keeps most of the old window
+    previous = _window_state(parser, msgs[0:6])
+    assert parser._unsummarized_messages(msgs[2:8], previous) == msgs[6:8]
+
+    # One repeated short message at the seam is not an overlap
+    previous = _window_state(parser, msgs[0:5] + [yes])
+    assert parser._unsummarized_messages([yes] + msgs[6:11], previous) is None
+    previous = _window_state(parser, msgs[0:4] + [yes, msgs[9]])
+    assert parser._unsummarized_messages([yes, msgs[9]] + msgs[6:10], previous) is None